@@ -0,0 +1,68 @@
+from collections import deque
+
+import numpy as np
+
+
+TRIGGERED = "triggered"  # Rising edge: the sensor started seeing an intruder
+CLEARED = "cleared"  # Falling edge: it no longer sees any
+
+
+class AlarmEvent:
+    def __init__(self, kind, sensor, time, index=None):
+        self.kind = kind
+        self.sensor = sensor
+        self.time = time  # Simulated seconds
+        self.index = index  # Row of the sensor in the detection arrays
+
+    def __repr__(self):
+        return f"AlarmEvent({self.kind!r}, {self.sensor.name!r}, {self.time:.3f})"
+
+
+class AlarmPipeline:
+    def __init__(self):
+        # Detection only diffs trigger masks and queues edges; subscribers run later, when
+        # dispatch() is called from outside the detection loop
+        self.queue = deque()
+        self.subscribers = []  # (kinds, callback)
+
+    def subscribe(self, callback, kinds=(TRIGGERED, CLEARED)):
+        # callback(events) receives each dispatched batch, filtered to kinds
+        self.subscribers.append((frozenset(kinds), callback))
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers = [(kinds, c) for kinds, c in self.subscribers if c != callback]
+
+    def update(self, sensors, mask, time=0.0, previous=None):
+        # Compare the new trigger mask with Sensor.triggered (or the previous mask, for a
+        # SensorTable whose sensors aren't all objects), write back only the sensors that
+        # changed and queue one event per edge. Returns the number of edges.
+        if previous is None:
+            previous = np.fromiter((sensor.triggered for sensor in sensors), dtype=bool, count=len(sensors))
+        changed = np.flatnonzero(previous != mask)
+        for index in changed.tolist():
+            sensor = sensors[index]
+            sensor.triggered = bool(mask[index])
+            self.queue.append(AlarmEvent(TRIGGERED if sensor.triggered else CLEARED, sensor, time, index))
+        return len(changed)
+
+    def dispatch(self):
+        # Hand every queued event to the subscribers as one batch, so e.g. several sensors
+        # tripping in the same tick get a single drone route
+        if not self.queue:
+            return []
+        events = list(self.queue)
+        self.queue.clear()
+        for kinds, callback in self.subscribers:
+            batch = [event for event in events if event.kind in kinds]
+            if batch:
+                callback(batch)
+        return events
+
+
+def print_events(events):
+    for event in events:
+        if event.kind == TRIGGERED:
+            print(f"Sensor {event.sensor.name} triggered!")
+        else:
+            print(f"Sensor {event.sensor.name} cleared.")
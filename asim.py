@@ -1,46 +1,30 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox,Toplevel, Button
+from tkinter import filedialog, messagebox, simpledialog, Toplevel, Button
 from PIL import Image, ImageTk
 import random
 import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-
-class Sensor:
-    def __init__(self, x, y, angle=0, detection_range=0, detection_angle=0, is_enabled=False, name=''):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.detection_range = self.convert_meters_to_pixels(detection_range)
-        self.detection_angle = detection_angle
-        self.is_enabled = is_enabled
-        self.name = name
-        self.triggered = False  # Tracks if the sensor is triggered
-        
-
-    def convert_meters_to_pixels(self, meters):
-        return meters * 50  # 1 meter = 50 pixels
-
-    def set_detection_range(self, range_in_meters):
-        self.detection_range = self.convert_meters_to_pixels(range_in_meters)
-
-class Panel:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+from simulation import Sensor, Panel, Intruder, Drone, Simulator
+from renderer import CanvasRenderer
+from blueprint import BlueprintCache
+from pyramid import TilePyramid, PYRAMID_MIN_PIXELS, open_large_image
+from scheduler import FixedStepScheduler
+from trajectories import RandomWalk
+from coverage import analyse_coverage
+from heatmap import CoverageRaster
+from placement import optimise_placement
+from missions import POLL_INTERVAL
+from occupancy import SUBSAMPLES
+from persistence import save_scene, load_scene
+from replay import EventRecorder
+from profiler import FrameProfiler
 
 
-class Intruder:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+DRAG_FRAME_MS = 16  # Minimum time between two applied drag positions, about one display frame
 
-class Drone:
-    def __init__(self, x=0, y=0):
-        self.gps_points = []
-        self.current_location = (x, y)  # Set the initial location of the drone
-        self.scanning = False
 
-        
 class SensorSimulationApp:
     def __init__(self, root):
         self.root = root
@@ -99,6 +83,10 @@ class SensorSimulationApp:
 
 
         self.current_image = None  # Initialize current_image to None
+        self.blueprint_cache = BlueprintCache()  # Resized blueprint layers, reused across redraws
+        self.blueprint_pyramid = None  # Tile pyramid used instead of current_image for very large blueprints
+        self.tile_cache = BlueprintCache(max_entries=512)  # Resized pyramid tiles
+        self.tile_placeholder = Image.new("RGB", (1, 1), "#d9d9d9")  # Shown for tiles that aren't built yet
         
         self.delete_panel_button = tk.Button(self.toolbar, text="Delete Panel", command=self.delete_panel)
         self.delete_panel_button.pack(pady=5)
@@ -111,6 +99,43 @@ class SensorSimulationApp:
 
         self.delete_drone_button = tk.Button(self.toolbar, text="Delete Drone", command=self.delete_drone)
         self.delete_drone_button.pack(pady=5)
+
+        self.simulate_button = tk.Button(self.toolbar, text="Start Simulation", command=self.toggle_simulation)
+        self.simulate_button.pack(pady=5)
+
+        self.coverage_button = tk.Button(self.toolbar, text="Analyse Coverage", command=self.show_coverage)
+        self.coverage_button.pack(pady=5)
+
+        self.heatmap_button = tk.Button(self.toolbar, text="Show Heatmap", command=self.toggle_heatmap)
+        self.heatmap_button.pack(pady=5)
+
+        self.walls_button = tk.Button(self.toolbar, text="Draw Walls", command=self.toggle_wall_drawing)
+        self.walls_button.pack(pady=5)
+
+        self.optimise_button = tk.Button(self.toolbar, text="Optimise Placement", command=self.optimise_placement)
+        self.optimise_button.pack(pady=5)
+
+        self.recall_button = tk.Button(self.toolbar, text="Recall Drone", command=self.recall_drone)
+        self.recall_button.pack(pady=5)
+
+        self.save_scene_button = tk.Button(self.toolbar, text="Save Scene", command=self.save_scene)
+        self.save_scene_button.pack(pady=5)
+
+        self.load_scene_button = tk.Button(self.toolbar, text="Load Scene", command=self.load_scene)
+        self.load_scene_button.pack(pady=5)
+
+        self.record_button = tk.Button(self.toolbar, text="Record Run", command=self.toggle_recording)
+        self.record_button.pack(pady=5)
+        self.recorder = None  # EventRecorder while a run is being recorded
+
+        self.profile_button = tk.Button(self.toolbar, text="Profile", command=self.toggle_profiling)
+        self.profile_button.pack(pady=5)
+
+        # Also trigger sensors whose field of view a dragged intruder crossed between two frames
+        self.sweep_detection = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.toolbar, text="Sweep Detection", variable=self.sweep_detection).pack(pady=5)
+        self.profiler = None  # FrameProfiler while profiling
+        self.profile_overlay_time = 0.0
         
 
 
@@ -133,29 +158,35 @@ class SensorSimulationApp:
         self.drone_image = self.load_sensor_image(self.drone_image_path, (30, 30))  # Load drone image
         self.panel_image = self.load_sensor_image(self.panel_image_path, (30, 40))  # Load drone image
 
-        # Initialize sensor, intruder, drone, and panel
-        self.sensors = []
+        # The simulation core owns the sensors, intruder, drone and panel; this app is a view over it
+        self.simulator = Simulator()
+        self.scene = self.simulator.scene
+        # 60 Hz simulation ticks, canvas refreshed at 30 Hz
+        self.scheduler = FixedStepScheduler(self.simulator, tick_rate=60, frame_rate=30)
         self.selected_sensor = None
+        self.selected_intruder = None
         self.dragging_sensor = False  # Track if a sensor is being dragged
-        self.intruder = None  
         self.dragging_intruder = False  # Track if an intruder is being dragged
-        self.drone = None  # Track the drone
         self.dragging_drone = False  # Track if the drone is being dragged
-        self.panel = None  # Initialize panel
         self.dragging_panel = False  # Track if the panel is being dragged
-        self.gps_points = {}
 
         # Bind mouse events
         self.canvas.bind("<ButtonPress-1>", self.on_canvas_click)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_release)
         self.canvas.bind("<Double-Button-1>", self.open_sensor_config)
+        self.canvas.bind("<Motion>", self.on_mouse_hover)
+        self.drag_position = None  # Latest pointer position of a drag, not yet applied
+        self.drag_after_id = None  # Pending apply_drag() callback
+        self.drag_applied = 0.0  # perf_counter() when a drag position was last applied
+        self.drag_sweep = []  # Intruder positions passed through since then, if sweep detection is on
 
         
 
         # Blueprint-related attributes
         self.blueprint_position = (0, 0)
         self.blueprint_size = (1980, 1080)
+        self.blueprint_path = None  # File of the current blueprint, saved with the scene
         self.dragging = False
         self.resizing = False
         self.prev_x = 0
@@ -163,12 +194,62 @@ class SensorSimulationApp:
         self.corner_offset = 10
         self.selected_corner = None
         self.grid_spacing = 50
+        self.heatmap = None  # CoverageRaster while the coverage heatmap is shown
+        self.heatmap_cell_size = self.grid_spacing  # Lower for a finer heatmap, e.g. 10
+        self.heatmap_image = None
+        self.analysis = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")  # Coverage and placement runs
+        self.drawing_walls = False
+        self.wall_points = []  # Points of the wall polyline being drawn
 
 
         
-        # Draw grid
-        self.draw_grid()
+        # Retained-mode renderer; draws the grid once and keeps persistent items for everything else
+        self.renderer = CanvasRenderer(self.canvas, {
+            "sensor_on": self.sensor_on_image,
+            "sensor_off": self.sensor_off_image,
+            "intruder": self.intruder_image,
+            "drone": self.drone_image,
+            "panel": self.panel_image,
+        }, grid_spacing=self.grid_spacing)
+        self.simulator.alarms.subscribe(self.renderer.recolour)
+        self.simulator.missions.attach(self.root)
+        self.simulator.missions.on_start = self.on_mission_start
+        self.simulator.missions.on_fail = self.on_mission_fail
+        self.alarm_dispatch_pending = False
         
+    # Scene accessors so the view code can keep using self.sensors, self.intruder, ...
+    @property
+    def sensors(self):
+        return self.scene.sensors
+
+    @property
+    def intruder(self):
+        return self.scene.intruder
+
+    @intruder.setter
+    def intruder(self, intruder):
+        self.scene.intruder = intruder
+
+    @property
+    def drone(self):
+        return self.scene.drone
+
+    @drone.setter
+    def drone(self, drone):
+        self.scene.set_drone(drone)
+
+    @property
+    def panel(self):
+        return self.scene.panel
+
+    @panel.setter
+    def panel(self, panel):
+        self.scene.set_panel(panel)
+
+    @property
+    def gps_points(self):
+        return self.scene.gps_points
+
     def check_for_corner_selection(self, x, y):
         corners = [
             (self.blueprint_position[0], self.blueprint_position[1]),  # Top-left
@@ -200,61 +281,106 @@ class SensorSimulationApp:
             dx = event.x - self.prev_x
             dy = event.y - self.prev_y
             self.blueprint_position = (self.blueprint_position[0] + dx, self.blueprint_position[1] + dy)
-            self.redraw_blueprint()
+            self.pan_blueprint()
             self.prev_x = event.x
             self.prev_y = event.y
             
-    def draw_grid(self):
-        # Draw a grid every 50 pixels (1 meter)
-        for x in range(0, 1980, self.grid_spacing):
-            self.canvas.create_line(x, 0, x, 1080, fill='lightgray', dash=(2, 2))  # Vertical lines
-        for y in range(0, 1080, self.grid_spacing):
-            self.canvas.create_line(0, y, 1980, y, fill='lightgray', dash=(2, 2))  # Horizontal lines
-
-        # Draw scale indicator in the top-left corner
-        scale_text = "1 Block = 1 Meter"
-        self.canvas.create_text(20, 20, text=scale_text, anchor=tk.NW, fill='black', font=('Arial', 12, 'bold'))
-
     def load_blueprint(self):
         file_path = filedialog.askopenfilename(title="Select Blueprint Image", filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp")])
         if file_path:
-            self.current_image = Image.open(file_path)
-            self.blueprint_size = (self.current_image.width, self.current_image.height)
-            self.blueprint_position = (0, 0)  # Reset position or set to desired default
+            self.open_blueprint(file_path)
             self.display_blueprint()
+            self.update_occupancy()
+
+    def open_blueprint(self, file_path):
+        self.cancel_pyramid()
+        self.blueprint_path = file_path
+        self.blueprint_cache.clear()  # Layers of the previous blueprint are no longer needed
+        self.tile_cache.clear()
+        self.current_image = open_large_image(file_path)  # Only reads the header
+        self.blueprint_size = (self.current_image.width, self.current_image.height)
+
+        # Huge scans are shown through a tiled pyramid so only visible tiles get decoded
+        if self.current_image.width * self.current_image.height >= PYRAMID_MIN_PIXELS:
+            self.current_image.close()
+            self.current_image = None
+            self.blueprint_pyramid = TilePyramid(file_path)
+            if not self.blueprint_pyramid.complete:
+                self.build_pyramid(self.blueprint_pyramid)
+        else:
+            self.blueprint_pyramid = None
+        self.blueprint_position = (0, 0)  # Reset position or set to desired default
+
+    def build_pyramid(self, pyramid):
+        # Tiles are cut on the analysis thread; until they are on disk the blueprint shows
+        # placeholders and the load button shows the progress
+        future = self.analysis.submit(pyramid.build)
+        self.root.after(POLL_INTERVAL, self.poll_pyramid, pyramid, future, 0.0)
+
+    def poll_pyramid(self, pyramid, future, shown):
+        if not future.done():
+            if pyramid.progress != shown and pyramid is self.blueprint_pyramid:
+                self.load_button.config(text=f"Building tiles {pyramid.progress:.0%}")
+                self.display_blueprint_tiles()
+            self.root.after(POLL_INTERVAL, self.poll_pyramid, pyramid, future, pyramid.progress)
+            return
+        if pyramid is not self.blueprint_pyramid:
+            return  # Replaced or deleted meanwhile
+        self.load_button.config(text="Load Blueprint")
+        error = future.exception()
+        if error is not None:
+            messagebox.showerror("Load Blueprint", str(error))
+            return
+        self.display_blueprint_tiles()
+        self.update_occupancy()
+
+    def cancel_pyramid(self):
+        # Stop building the tiles of a blueprint that is being replaced or deleted
+        if self.blueprint_pyramid:
+            self.blueprint_pyramid.cancel()
+            self.load_button.config(text="Load Blueprint")
             
     #alles blueprint related
-    def display_blueprint(self):
-        self.blueprint_image = ImageTk.PhotoImage(self.current_image.resize(self.blueprint_size, Image.LANCZOS))
-        self.canvas.create_image(self.blueprint_position[0], self.blueprint_position[1], image=self.blueprint_image, anchor=tk.NW)
-
-        # Draw resize corners
-        self.draw_resize_corners()
-        # Draw grid with updated spacing
-        self.draw_grid()
-
-    def draw_resize_corners(self):
-        # Clear previous corners
-        self.canvas.delete("resize_corner")
-        
-        # Define corner positions
-        x, y = self.blueprint_position
-        width, height = self.blueprint_size
-
-        # Draw corners
-        corners = [
-            (x, y),  # Top-left
-            (x + width, y),  # Top-right
-            (x, y + height),  # Bottom-left
-            (x + width, y + height)  # Bottom-right
-        ]
-
-        for corner in corners:
-            self.canvas.create_rectangle(corner[0] - self.corner_offset, corner[1] - self.corner_offset,
-                                          corner[0] + self.corner_offset, corner[1] + self.corner_offset,
-                                          fill="red", outline="red", tags="resize_corner")
+    def display_blueprint(self, resample=Image.LANCZOS):
+        if self.blueprint_pyramid:
+            self.display_blueprint_tiles(resample)
+            return
+        self.blueprint_image = self.blueprint_cache.get(self.current_image, self.blueprint_size, resample)
+        self.renderer.show_blueprint(self.blueprint_image, self.blueprint_position, self.blueprint_size, self.corner_offset)
+
+    def display_blueprint_tiles(self, resample=Image.LANCZOS):
+        # Only decode and show the pyramid tiles that intersect the visible canvas region
+        viewport = self.viewport()
+        tiles = []
+        for level, col, row, box in self.blueprint_pyramid.visible_tiles(self.blueprint_position, self.blueprint_size, viewport):
+            tile = self.blueprint_pyramid.get_tile(level, col, row, build=False)
+            if tile is None:
+                tile = self.tile_placeholder  # Still being built
+            photo = self.tile_cache.get(tile, (box[2] - box[0], box[3] - box[1]), resample)
+            tiles.append(((level, col, row), photo, box[0], box[1]))
+        self.renderer.show_blueprint_tiles(tiles, self.blueprint_position, self.blueprint_size, self.corner_offset)
+
+    def viewport(self):
+        return (0, 0, max(self.canvas.winfo_width(), 1), max(self.canvas.winfo_height(), 1))
+
+    def update_occupancy(self):
+        # Let the drone plan around the dark lines of the blueprint where it is drawn now
+        occupancy = self.scene.occupancy
+        if self.blueprint_pyramid and self.blueprint_pyramid.complete:
+            scale = min(self.blueprint_size[0] / self.blueprint_pyramid.width,
+                        self.blueprint_size[1] / self.blueprint_pyramid.height)
+            level = self.blueprint_pyramid.level_for_scale(scale * SUBSAMPLES / occupancy.cell_size)
+            image = self.blueprint_pyramid.level_image(level)
+        else:
+            image = self.current_image  # None while a pyramid is still being built
+        occupancy.load_blueprint(image, self.blueprint_position, self.blueprint_size)
 
-    
+    def pan_blueprint(self):
+        # A single blueprint image is just moved; a pyramid also needs the newly visible tiles
+        if self.blueprint_pyramid:
+            self.display_blueprint_tiles()
+        else:
+            self.renderer.move_blueprint(self.blueprint_position, self.blueprint_size, self.corner_offset)
 
     def on_button_press(self, event):
         print(f"Mouse click coordinates: ({event.x}, {event.y})")  # Debug
@@ -339,9 +465,9 @@ class SensorSimulationApp:
             new_width = max(x - self.blueprint_position[0], 50)  # Minimum width
             new_height = max(y - self.blueprint_position[1], 50)  # Minimum height
 
-        # Update blueprint size
+        # Update blueprint size; use a cheap resample while the corner is being dragged
         self.blueprint_size = (new_width, new_height)
-        self.redraw_blueprint()
+        self.redraw_blueprint(Image.NEAREST)
 
     def on_button_release(self, event):
         # Reset dragging and resizing states
@@ -352,10 +478,10 @@ class SensorSimulationApp:
         self.dragging_drone = None
         self.dragging_panel = None
 
-    def redraw_blueprint(self):
-        # Clear canvas and redraw the blueprint
-        self.canvas.delete("all")
-        self.display_blueprint()
+    def redraw_blueprint(self, resample=Image.LANCZOS):
+        # Update the existing blueprint item in place
+        if self.current_image or self.blueprint_pyramid:
+            self.display_blueprint(resample)
     #tot hier bluprint
 
     def load_sensor_image(self, path, size):
@@ -368,28 +494,124 @@ class SensorSimulationApp:
             return None
 
     def add_sensor(self):
-        x = random.randint(0, 750)
-        y = random.randint(0, 550)
-        new_sensor = Sensor(x, y)
-        self.sensors.append(new_sensor)
+        # Random placements come from the scene's seeded generator so recorded runs replay exactly
+        x = self.scene.rng.randint(0, 750)
+        y = self.scene.rng.randint(0, 550)
+        self.scene.add_sensor(Sensor(x, y))
         self.redraw_canvas()
 
     def add_random_intruder(self):
-        if not self.intruder:  # Only add one intruder
-            x = random.randint(0, 750)
-            y = random.randint(0, 550)
-            self.intruder = Intruder(x, y)
-            self.redraw_canvas()
+        x = self.scene.rng.randint(0, 750)
+        y = self.scene.rng.randint(0, 550)
+        self.selected_intruder = self.scene.add_intruder(Intruder(x, y))
+        self.redraw_canvas()
     def add_drone(self):
         if not self.drone:  # Only add one drone
-            x = random.randint(0, 750)
-            y = random.randint(0, 550)
+            x = self.scene.rng.randint(0, 750)
+            y = self.scene.rng.randint(0, 550)
             self.drone = Drone(x, y)
             print(f"Drone added at position: {self.drone.current_location}")
             self.redraw_canvas()  # Redraw canvas after adding the drone
 
 
 
+    def toggle_simulation(self):
+        if self.scheduler.running:
+            self.scheduler.stop()
+            self.simulate_button.config(text="Start Simulation")
+            return
+
+        # Intruders without a path of their own wander around the canvas
+        for intruder in self.scene.intruders:
+            if intruder not in self.simulator.trajectories:
+                walk = RandomWalk(bounds=(0, 0, 1920, 1080), rng=random.Random(self.scene.rng.getrandbits(64)))
+                self.simulator.set_trajectory(intruder, walk)
+        self.scheduler.start(self.root, self.render_frame)
+        self.simulate_button.config(text="Stop Simulation")
+
+    def show_coverage(self):
+        # Monte Carlo coverage over the blueprint area (or the default canvas area)
+        x, y = self.blueprint_position
+        width, height = self.blueprint_size
+        self.run_analysis(self.coverage_button, lambda report: messagebox.showinfo("Coverage", report.summary()),
+                          analyse_coverage, list(self.scene.all_sensors()), (x, y, x + width, y + height), samples=1_000_000,
+                          walls=self.scene.walls.copy())
+
+    def optimise_placement(self):
+        # Place sensors like the selected one (or a 5 m, 90 degree default) over the blueprint area
+        goal = simpledialog.askfloat("Optimise Placement", "Number of sensors, or target coverage (e.g. 0.9):",
+                                     parent=self.root, minvalue=0.01)
+        if not goal:
+            return
+        model = self.selected_sensor
+        detection_range = model.detection_range if model and model.detection_range else 5
+        detection_angle = model.detection_angle if model and model.detection_angle else 90
+        x, y = self.blueprint_position
+        width, height = self.blueprint_size
+        self.run_analysis(self.optimise_button,
+                          lambda placement: self.place_sensors(placement, detection_range, detection_angle),
+                          optimise_placement, (x, y, x + width, y + height), detection_range, detection_angle,
+                          int(goal) if goal >= 1 else None, goal if goal < 1 else None, self.scene.walls.copy())
+
+    def place_sensors(self, placement, detection_range, detection_angle):
+        for sensor in placement.sensors(detection_range, detection_angle):
+            self.scene.add_sensor(sensor)
+        self.redraw_canvas()
+        messagebox.showinfo("Optimise Placement", f"Placed {len(placement)} sensors, coverage {placement.fraction:.2%}")
+
+    def run_analysis(self, button, done, work, *args, **kwargs):
+        # Slow analyses run on a worker thread and the main loop polls for the result, so the
+        # UI keeps responding; the button stays disabled until the result is in
+        button.config(state=tk.DISABLED)
+        future = self.analysis.submit(work, *args, **kwargs)
+        self.root.after(POLL_INTERVAL, self.poll_analysis, future, button, done)
+
+    def poll_analysis(self, future, button, done):
+        if not future.done():
+            self.root.after(POLL_INTERVAL, self.poll_analysis, future, button, done)
+            return
+        button.config(state=tk.NORMAL)
+        error = future.exception()
+        if error is not None:
+            messagebox.showerror(button.cget("text"), str(error))
+            return
+        done(future.result())
+
+    def toggle_heatmap(self):
+        if self.heatmap:
+            self.heatmap.attach(None)
+            self.heatmap = None
+            self.heatmap_image = None
+            self.renderer.clear_heatmap()
+            self.heatmap_button.config(text="Show Heatmap")
+            return
+        self.heatmap = CoverageRaster((0, 0, 1980, 1080), self.heatmap_cell_size)
+        self.heatmap_button.config(text="Hide Heatmap")
+        self.update_heatmap()
+
+    def update_heatmap(self):
+        # Only sensors that moved or were reconfigured, or are near an edited wall, are re-burned into the raster
+        if self.heatmap.update(self.sensors, self.scene.walls) or self.heatmap_image is None:
+            self.heatmap_image = ImageTk.PhotoImage(self.heatmap.image())
+            self.renderer.show_heatmap(self.heatmap_image, self.heatmap.bounds[0], self.heatmap.bounds[1])
+
+    def on_mission_start(self, mission):
+        # The drone flies in simulated time, so keep the clock running while it is out
+        if not self.scheduler.running:
+            self.scheduler.start(self.root, self.render_frame)
+            self.simulate_button.config(text="Stop Simulation")
+
+    def on_mission_fail(self, mission):
+        messagebox.showerror("Drone Mission", f"Could not plan the mission for {', '.join(mission.sensor_names)}: {mission.error}")
+
+    def recall_drone(self):
+        self.simulator.missions.cancel()
+
+    def render_frame(self):
+        # Detection already ran in the simulation ticks; only the view needs updating
+        self.scene.set_viewport(self.viewport())
+        self.renderer.update(self.scene)
+
     def on_drone_press(self, event):
         print("Drone clicked!")  # Debugging message
         self.dragging_drone = True  # Set flag to indicate that the drone is being dragged
@@ -413,7 +635,7 @@ class SensorSimulationApp:
         if self.dragging_drone:  # Only update location if the drone was being dragged
             # Get the current coordinates of the drone
             x, y = self.canvas.coords(self.drone_id)[:2]  # Get new position
-            self.drone.current_location = (x + 10, y + 10)  # Update drone's location
+            self.scene.move_drone(x + 10, y + 10)  # Update drone's location
             print(f"Drone released at: {self.drone.current_location}")
         self.dragging_drone = False  # Reset dragging flag
 
@@ -426,25 +648,120 @@ class SensorSimulationApp:
             
     def add_panel(self):
         if not self.panel:  # Only add if panel doesn't exist
-            self.panel = Panel(random.randint(50, 800), random.randint(50, 800))
-            self.canvas.create_image(self.panel.x, self.panel.y, image=self.panel_image, anchor=tk.NW)
+            self.panel = Panel(self.scene.rng.randint(50, 800), self.scene.rng.randint(50, 800))
+            self.redraw_canvas()
 
     
     def delete_blueprint(self):
+        self.cancel_pyramid()
         self.current_image = None  # Remove blueprint image
-        self.canvas.delete("all")  # Clear everything
+        self.blueprint_pyramid = None
+        self.blueprint_path = None
+        self.blueprint_cache.clear()
+        self.tile_cache.clear()
+        self.renderer.clear_blueprint()
+        self.update_occupancy()
         self.redraw_canvas()  # Redraw without the blueprint
         
+    def save_scene(self):
+        # .npz is the fast binary format, .json the setup.json format
+        file_path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=[("Scene files", "*.npz"), ("JSON files", "*.json")])
+        if file_path:
+            blueprint = None
+            if self.blueprint_path:
+                blueprint = {"path": self.blueprint_path, "x": self.blueprint_position[0], "y": self.blueprint_position[1],
+                             "width": self.blueprint_size[0], "height": self.blueprint_size[1]}
+            save_scene(file_path, self.scene, blueprint)
+
+    def load_scene(self):
+        file_path = filedialog.askopenfilename(title="Select Scene", filetypes=[("Scene files", "*.npz;*.json"), ("Sensor tables", "table.json")])
+        if not file_path:
+            return
+        scene, blueprint = load_scene(file_path)
+        self.simulator.load(scene)
+        self.scene = scene
+        self.selected_sensor = None
+        self.selected_intruder = None
+        if blueprint:
+            self.open_blueprint(blueprint["path"])
+            self.blueprint_position = (blueprint["x"], blueprint["y"])
+            self.blueprint_size = (blueprint["width"], blueprint["height"])
+            self.display_blueprint()
+        else:
+            self.delete_blueprint()
+        self.update_occupancy()
+        self.redraw_canvas()
+
+    def toggle_recording(self):
+        # Log every edit, tick and alarm edge of the run; python replay.py <file> replays it
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+            self.record_button.config(text="Record Run")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".simlog", filetypes=[("Replay logs", "*.simlog")])
+        if file_path:
+            self.recorder = EventRecorder(file_path, self.simulator)
+            self.record_button.config(text="Stop Recording")
+
+    def toggle_profiling(self):
+        # Time every frame and its phases plus drag handling, shown in an overlay; stopping
+        # saves a trace for chrome://tracing or ui.perfetto.dev. The grid is drawn once and
+        # so isn't a phase of any frame.
+        if self.profiler:
+            profiler, self.profiler = self.profiler, None
+            profiler.restore()
+            self.bind_profiled_handlers()
+            self.renderer.clear_overlay()
+            self.profile_button.config(text="Profile")
+            file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome traces", "*.json")])
+            if file_path:
+                profiler.export(file_path)
+            return
+        profiler = self.profiler = FrameProfiler()
+        for owner, name, label, kind in (
+                (self, "redraw_canvas", None, "frame"), (self, "render_frame", None, "frame"),
+                (self, "check_alarm", None, "phase"), (self, "update_heatmap", "heatmap", "phase"),
+                (self, "display_blueprint", "blueprint", "phase"), (self, "pan_blueprint", "blueprint", "phase"),
+                (self.renderer, "update_walls", "walls", "phase"), (self.renderer, "update_sensors", "sensors", "phase"),
+                (self.renderer, "update_intruders", "intruders", "phase"),
+                (self.renderer.fov_cache, "polygon", "fov", "total"),
+                (self, "on_mouse_drag", None, "handler"), (self, "apply_drag", None, "handler")):
+            profiler.instrument(owner, name, label, kind)
+        profiler.counters = lambda: dict(self.renderer.layer_counts)
+        profiler.on_frame = self.update_profile_overlay
+        self.bind_profiled_handlers()
+        self.profile_button.config(text="Stop Profiling")
+
+    def bind_profiled_handlers(self):
+        # Tk and the scheduler hold on to the bound methods, so hand them the current ones
+        self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
+        if self.scheduler.running:
+            self.scheduler.render = self.render_frame
+
+    def update_profile_overlay(self):
+        # Refreshed at most twice a second so the overlay doesn't cost a canvas edit per frame
+        now = time.perf_counter()
+        if self.profiler and now - self.profile_overlay_time >= 0.5:
+            self.profile_overlay_time = now
+            self.renderer.show_overlay(self.profiler.summary())
+
     def delete_selected_sensor(self):
             if self.selected_sensor:
-                self.sensors.remove(self.selected_sensor)
+                self.scene.remove_sensor(self.selected_sensor)
                 self.selected_sensor = None
                 self.redraw_canvas()
             else:
                 messagebox.showinfo("No Selection", "Please select a sensor to delete.")
 
     def delete_intruder(self):
-        self.intruder = None
+        # Delete the last clicked intruder, or the most recently added one
+        intruder = self.selected_intruder
+        if intruder is None or intruder.group is not self.scene.intruders:
+            intruder = self.scene.intruders[-1] if len(self.scene.intruders) else None
+        if intruder:
+            self.scene.remove_intruder(intruder)
+        self.selected_intruder = None
         self.redraw_canvas()
 
     def delete_drone(self):
@@ -457,43 +774,21 @@ class SensorSimulationApp:
             self.redraw_canvas()  # Redraw the canvas
 
 
-    def redraw_canvas(self):
-        self.canvas.delete("all")  # Clear the canvas
-        self.draw_grid()  # Draw the grid
-
-        # Draw the blueprint if it exists
-        if hasattr(self, 'current_image') and self.current_image:
-            self.redraw_blueprint()
+    def redraw_canvas(self, sweep=None):
+        # Scenes with a sensor table only get Sensor objects for what is on screen
+        self.scene.set_viewport(self.viewport())
 
-        # Draw sensors and their fields of view
-        for sensor in self.sensors:
-            self.draw_sensor(sensor)
-            self.draw_field_of_view(sensor)
+        # Check for alarms first so the FOV colours reflect the current trigger state
+        self.check_alarm(sweep)
 
-        # Draw intruder if it exists
-        if self.intruder:
-            self.canvas.create_image(self.intruder.x + 25, self.intruder.y + 45, image=self.intruder_image, anchor=tk.CENTER)
+        if self.heatmap:
+            self.update_heatmap()
 
-        # Draw drone if it exists
-        if self.drone:
-            drone_x, drone_y = self.drone.current_location  # Access the current location of the drone
-            self.canvas.create_image(drone_x + 15, drone_y + 15, image=self.drone_image, anchor=tk.CENTER)
-
-        # Draw panel if it exists
-        if self.panel:
-            self.canvas.create_image(self.panel.x + 30, self.panel.y + 40, image=self.panel_image, anchor=tk.CENTER)
+        # Only the canvas items whose object changed are updated
+        self.renderer.update(self.scene)
 
-        self.check_alarm()  # Check for alarms after redrawing
 
 
-
-    def draw_sensor(self, sensor):
-        image_to_draw = self.sensor_on_image if sensor.is_enabled else self.sensor_off_image
-        x = sensor.x + 12.5
-        y = sensor.y + 12.5
-        self.canvas.create_image(x, y, image=image_to_draw, anchor=tk.CENTER)
-        self.canvas.create_text(x, y - 25, text=sensor.name, fill="black", font=("Arial", 10))
-
     def is_intruder_detected(self, sensor, intruder):
         # Calculate detection range in pixels
         detection_range_pixels = sensor.detection_range * 50  # Convert meters to pixels
@@ -530,65 +825,6 @@ class SensorSimulationApp:
 
 
 
-    def draw_field_of_view(self, sensor):
-        if not sensor.is_enabled:
-            return
-
-        detection_range_pixels = sensor.detection_range * 50  # 50 pixels per meter
-        angle_rad = math.radians(sensor.angle)
-
-        # Calculate start and end angles based on detection_angle
-        start_angle = angle_rad - math.radians(sensor.detection_angle / 2)
-        end_angle = angle_rad + math.radians(sensor.detection_angle / 2)
-
-        # Sensor position (bottom center)
-        sensor_center_x = sensor.x + 12.5
-        sensor_center_y = sensor.y + 25  # Bottom of the sensor image
-
-        # Create points for the arc
-        points = [sensor_center_x, sensor_center_y]
-        num_points = 100  # Number of points to define the arc
-        for i in range(num_points + 1):
-            t = i / num_points  # Normalize t to [0, 1]
-            theta = start_angle + t * (end_angle - start_angle)
-            x = sensor_center_x + detection_range_pixels * math.cos(theta)
-            y = sensor_center_y + detection_range_pixels * math.sin(theta)
-            points.extend((x, y))
-
-        # Set the color based on the trigger status
-        color = 'red' if sensor.triggered else 'lightgreen'
-
-        # Draw the FOV polygon
-        self.canvas.create_polygon(points, fill=color, outline='', stipple='gray25')  # Adjust stipple as needed
-
-
-
-        
-      
-
-    def check_alarm(self):
-        for sensor in self.sensors:
-            if sensor.is_enabled:
-                detection_range_pixels = sensor.detection_range * 50  # 50 pixels per meter
-                sensor_center_x = sensor.x + 12.5
-                sensor_center_y = sensor.y + 25  # Bottom of the sensor image
-
-                # Only check for intruder detection if intruder exists
-                if self.intruder:
-                    # Calculate the distance to the intruder
-                    distance_to_intruder = math.sqrt((self.intruder.x + 25 - sensor_center_x) ** 2 + (self.intruder.y + 45 - sensor_center_y) ** 2)
-
-                    # Check if the distance is within the detection range and within the detection angle
-                    if distance_to_intruder <= detection_range_pixels and self.is_within_angle(sensor, self.intruder):
-                        sensor.triggered = True  # Intruder detected
-                    else:
-                        sensor.triggered = False  # No intruder detected
-                else:
-                    sensor.triggered = False  # No intruder present
-            else:
-                sensor.triggered = False  # Sensor is not enabled
-
-
     def is_within_angle(self, sensor, intruder):
         # Convert sensor's angle to radians
         angle_rad = math.radians(sensor.angle)
@@ -608,7 +844,23 @@ class SensorSimulationApp:
 
     
 
+    def toggle_wall_drawing(self):
+        # Each click adds a polyline point; toggling off ends the polyline
+        self.drawing_walls = not self.drawing_walls
+        self.wall_points = []
+        self.walls_button.config(text="Stop Drawing Walls" if self.drawing_walls else "Draw Walls")
+
+    def add_wall_point(self, x, y):
+        if self.wall_points:
+            self.scene.walls.add_segment(*self.wall_points[-1], x, y)
+        self.wall_points.append((x, y))
+        self.redraw_canvas()
+
     def on_canvas_click(self, event):
+        if self.drawing_walls:
+            self.add_wall_point(event.x, event.y)
+            return
+
         # Reset previous coordinates
         self.prev_x = event.x
         self.prev_y = event.y
@@ -625,8 +877,10 @@ class SensorSimulationApp:
             return  # Exit the method after resizing check
 
         # Check if clicking on the intruder
-        if self.intruder and self.intruder.x <= event.x <= self.intruder.x + 50 and self.intruder.y <= event.y <= self.intruder.y + 90:
-            self.dragging_intruder = self.intruder  # Set the dragging state
+        intruder = self.scene.intruders.find(event.x, event.y)
+        if intruder:
+            self.selected_intruder = intruder
+            self.dragging_intruder = intruder  # Set the dragging state
             return
 
         # Check if clicking on the drone
@@ -644,84 +898,128 @@ class SensorSimulationApp:
             return
 
         # Check if clicking on a sensor
-        for sensor in self.sensors:
-            if sensor.x <= event.x <= sensor.x + 25 and sensor.y <= event.y <= sensor.y + 25:
-                self.selected_sensor = sensor
-                self.dragging_sensor = sensor
-                return  # Exit if a sensor is selected
+        sensor = self.scene.sensor_at(event.x, event.y)
+        if sensor:
+            self.selected_sensor = sensor
+            self.dragging_sensor = sensor
+            return  # Exit if a sensor is selected
 
         # If no sensor, intruder, or drone is clicked, allow dragging the blueprint
         self.dragging = True
 
 
+    def on_mouse_hover(self, event):
+        # Show a hand cursor over sensors; the spatial index keeps this cheap on large plans
+        cursor = "hand2" if self.scene.sensor_at(event.x, event.y) else ""
+        if cursor != self.canvas.cget("cursor"):
+            self.canvas.config(cursor=cursor)
+
     def on_mouse_drag(self, event):
+        # Tk sends motion events faster than the canvas can be redrawn, so only the latest
+        # pointer position is kept and applied at most once per display frame
+        if self.dragging_intruder and self.sweep_detection.get():
+            # Where the intruder is at this event, for the sweep passed to check_alarm
+            self.drag_sweep.append((self.dragging_intruder.x + event.x - self.prev_x,
+                                    self.dragging_intruder.y + event.y - self.prev_y))
+        self.drag_position = (event.x, event.y)
+        if self.drag_after_id is None:
+            delay = DRAG_FRAME_MS - (time.perf_counter() - self.drag_applied) * 1000
+            if delay > 0:
+                self.drag_after_id = self.root.after(int(math.ceil(delay)), self.apply_drag)
+            else:
+                self.drag_after_id = self.root.after_idle(self.apply_drag)
+
+    def apply_drag(self):
+        self.drag_after_id = None
+        if self.drag_position is None:
+            return
+        x, y = self.drag_position
+        self.drag_position = None
+        self.drag_applied = time.perf_counter()
+        sweep = self.drag_sweep
+        self.drag_sweep = []
+
         # Check if dragging a sensor
         if self.dragging_sensor:
-            dx = event.x - self.prev_x
-            dy = event.y - self.prev_y
-            self.dragging_sensor.x += dx
-            self.dragging_sensor.y += dy
+            dx = x - self.prev_x
+            dy = y - self.prev_y
+            self.scene.move_sensor(self.dragging_sensor, dx, dy)
             self.redraw_canvas()  # Redraw canvas after moving sensor
 
         # Check if dragging an intruder
         elif self.dragging_intruder:
-            dx = event.x - self.prev_x
-            dy = event.y - self.prev_y
-            self.dragging_intruder.x += dx
-            self.dragging_intruder.y += dy
-            self.redraw_canvas()  # Redraw canvas after moving intruder
+            dx = x - self.prev_x
+            dy = y - self.prev_y
+            self.scene.move_intruder(self.dragging_intruder, dx, dy)
+            # Sensors whose field of view the intruder crossed between frames still trigger
+            self.redraw_canvas(tuple(zip(*sweep)) if len(sweep) > 1 else None)
 
         # Check if dragging a drone
         elif self.dragging_drone:
             current_x, current_y = self.dragging_drone.current_location  
-            dx = event.x - self.prev_x
-            dy = event.y - self.prev_y
+            dx = x - self.prev_x
+            dy = y - self.prev_y
             new_x = current_x + dx
             new_y = current_y + dy
-            self.dragging_drone.current_location = (new_x, new_y)  # Update the current location tuple
+            self.scene.move_drone(new_x, new_y)  # Update the current location tuple
             self.redraw_canvas()  # Redraw canvas after moving drone
 
         # Check if dragging a panel
         elif self.dragging_panel:
-            dx = event.x - self.prev_x
-            dy = event.y - self.prev_y
-            self.dragging_panel.x += dx
-            self.dragging_panel.y += dy
+            dx = x - self.prev_x
+            dy = y - self.prev_y
+            self.scene.move_panel(self.dragging_panel.x + dx, self.dragging_panel.y + dy)
             self.redraw_canvas()  # Redraw canvas after moving panel
 
         # Check if resizing the blueprint
         elif self.resizing:
-            self.resize_blueprint(event.x, event.y)
+            self.resize_blueprint(x, y)
 
         # Check if dragging the blueprint
         elif self.dragging:  
-            dx = event.x - self.prev_x
-            dy = event.y - self.prev_y
+            dx = x - self.prev_x
+            dy = y - self.prev_y
             # Update blueprint position without affecting other images
             self.blueprint_position = (self.blueprint_position[0] + dx, self.blueprint_position[1] + dy)
-            self.redraw_canvas()  # Redraw canvas to reflect blueprint movement
+            self.pan_blueprint()
 
         # Always update prev_x and prev_y after handling the event
-        self.prev_x = event.x
-        self.prev_y = event.y
+        self.prev_x = x
+        self.prev_y = y
 
 
 
     def on_mouse_release(self, event):
+        # Apply the last pointer position before the drag ends
+        if self.drag_after_id is not None:
+            self.root.after_cancel(self.drag_after_id)
+            self.apply_drag()
+
         # Only reset dragging_panel if necessary
         if self.dragging_panel:
             self.dragging_panel = None  # Reset panel dragging
         self.dragging_sensor = None
         self.dragging_intruder = None  
         self.dragging_drone = None  
+        moved_blueprint = (self.dragging or self.resizing) and (self.current_image or self.blueprint_pyramid)
         self.dragging = False
-        self.resizing = False
+
+        # Run the full-quality LANCZOS pass once the corner is released
+        if self.resizing:
+            self.resizing = False
+            self.redraw_blueprint()
+        if moved_blueprint:
+            self.update_occupancy()
 
         # Final redraw to ensure proper positioning
         self.redraw_canvas()
 
 
     def open_sensor_config(self, event):
+        # Prefer the sensor under the cursor; fall back to the current selection
+        sensor_under_cursor = self.scene.sensor_at(event.x, event.y)
+        if sensor_under_cursor:
+            self.selected_sensor = sensor_under_cursor
         if not self.selected_sensor:
             return
 
@@ -748,10 +1046,8 @@ class SensorSimulationApp:
         tk.Checkbutton(dialog, text="Enable Sensor", variable=enabled_var).pack()
 
         def save_config():
-            sensor.name = name_entry.get()
-            sensor.detection_range = float(range_entry.get())
-            sensor.detection_angle = float(angle_entry.get())
-            sensor.is_enabled = enabled_var.get()
+            self.scene.configure_sensor(sensor, name=name_entry.get(), detection_range=float(range_entry.get()),
+                                        detection_angle=float(angle_entry.get()), is_enabled=enabled_var.get())
             dialog.destroy()
             self.redraw_canvas()
 
@@ -761,7 +1057,7 @@ class SensorSimulationApp:
     def update_sensor_rotation(self, angle):
             if self.selected_sensor:
                 # Update the selected sensor's angle and redraw the canvas
-                self.selected_sensor.angle = float(angle)
+                self.scene.configure_sensor(self.selected_sensor, angle=float(angle))
                 self.redraw_canvas()
 
     def open_panel_menu(self):
@@ -797,8 +1093,7 @@ class SensorSimulationApp:
         y_entry.insert(0, str(self.panel.y))
 
         def save_config():
-            self.panel.x = int(x_entry.get())
-            self.panel.y = int(y_entry.get())
+            self.scene.move_panel(int(x_entry.get()), int(y_entry.get()))
             dialog.destroy()
             self.redraw_canvas()  # Redraw to reflect changes
 
@@ -924,6 +1219,7 @@ class SensorSimulationApp:
     
     def save_gps_points(self, sensor):
         # Save the GPS points for the sensor
+        self.scene.set_gps_points(sensor.name, self.gps_points[sensor.name])
         print(f"GPS Points saved for {sensor.name}: {self.gps_points[sensor.name]}")
         messagebox.showinfo("GPS Points Saved", f"GPS points for {sensor.name} have been saved.")
 
@@ -938,82 +1234,18 @@ class SensorSimulationApp:
                 
     
         
-    def receive_gps_points(self, gps_points):
-        # Simulate receiving GPS points (drone acknowledges receipt)
-        print("Drone: GPS points received.")
-        self.gps_points = gps_points
-        self.scanning = True  # Enter listening mode
-
-    def fly_to_sensor(self, sensor_gps_points):
-        # Fly to each point associated with the triggered sensor
-        for point in sensor_gps_points:
-            self.current_location = point
-            print(f"Drone flying to: {point}")
-            self.scan_area()
-
-    def scan_area(self):
-        # Simulate scanning in a 6-meter radius
-        radius = 6 * 50  # Convert meters to pixels (50 pixels per meter)
-        print(f"Scanning area within {radius} pixels")
-
-        # If intruder is within range, sound alarm
-        if self.detect_intruder(radius):  # Pass the radius to detect_intruder method
-            print("Intruder detected! Sounding alarm!")
-            self.change_color()  # Change color to simulate alert
-        else:
-            print("No intruder detected.")
-
-
-    def detect_intruder(self, scan_radius):
-        if self.intruder:  # Check if there is an intruder to detect
-            # Calculate distance between drone and intruder
-            distance_to_intruder = math.sqrt(
-                (self.intruder.x + 25 - self.current_location[0]) ** 2 + 
-                (self.intruder.y + 45 - self.current_location[1]) ** 2
-            )
-
-            # Check if the distance is within the scan radius
-            return distance_to_intruder <= scan_radius
-        return False  # No intruder present or outside scan range
-
-
-    def change_color(self):
-        # Simulate the drone changing color to signal an alert
-        print("Drone changing color to signal alarm.")
-        
-    def check_alarm(self):
-        for sensor in self.sensors:
-            if sensor.is_enabled:
-                # Calculate detection range in pixels
-                detection_range_pixels = sensor.detection_range * 50  # 50 pixels per meter
-                sensor_center_x = sensor.x + 12.5
-                sensor_center_y = sensor.y + 25  # Bottom of the sensor image
-
-                if self.intruder:
-                    # Log intruder position before calculation
-                    print(f"Checking intruder position: ({self.intruder.x}, {self.intruder.y})")
-
-                    # Calculate the distance to the intruder
-                    distance_to_intruder = math.sqrt(
-                        (self.intruder.x + 25 - sensor_center_x) ** 2 + 
-                        (self.intruder.y + 45 - sensor_center_y) ** 2
-                    )
-
-                    # Log distance for debugging
-                    print(f"Distance to intruder: {distance_to_intruder} pixels")
-
-                    # Check if the intruder is within the sensor's FOV and range
-                    if (distance_to_intruder <= detection_range_pixels and 
-                        self.is_within_angle(sensor, self.intruder) and 
-                        not sensor.triggered):  # Trigger only if not already triggered
-                        sensor.triggered = True
-                        print(f"Sensor {sensor.name} triggered! Distance: {distance_to_intruder}")
-                        self.drone.fly_to_sensor(self.gps_points[sensor.name])
-                    elif (distance_to_intruder > detection_range_pixels or 
-                        not self.is_within_angle(sensor, self.intruder)):
-                        sensor.triggered = False  # Reset trigger if out of range or angle
-                else:
-                    sensor.triggered = False  # Reset trigger if no intruder
+    def check_alarm(self, sweep=None):
+        # Detection runs in the headless simulation core; the trigger edges it queued are
+        # handled once the GUI is idle, so a drag doesn't log or dispatch on every motion event.
+        # sweep is (xs, ys) of intruder positions a drag passed through since the last check.
+        self.simulator.evaluate(sweep)
+        if self.simulator.alarms.queue and not self.alarm_dispatch_pending:
+            self.alarm_dispatch_pending = True
+            self.root.after_idle(self.dispatch_alarms)
+
+    def dispatch_alarms(self):
+        self.alarm_dispatch_pending = False
+        self.simulator.alarms.dispatch()
 
     def simulate_intruder_detection(self):
         for sensor in self.sensors:
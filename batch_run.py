@@ -0,0 +1,201 @@
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from alarms import TRIGGERED, print_events
+from coverage import analyse_coverage
+from persistence import load_scene, table_directory
+from simulation import Intruder, Simulator
+from trajectories import RandomWalk, WaypointPath
+
+
+SCENE_EXTENSIONS = (".json", ".npz")
+FIELDS = ["scene", "spec", "sensors", "trials", "detection_rate", "mean_time_to_detect", "mean_alarms",
+          "coverage", "seconds", "error"]
+
+# Scenario spec keys and their defaults. "paths" are intruder routes walked in every trial,
+# as {"waypoints": [[x, y], ...], "speed": 1.4, "loop": false}; "walkers" intruders start at
+# random points and wander around.
+DEFAULT_SPEC = {
+    "trials": 20,
+    "duration": 60.0,  # Simulated seconds per trial
+    "tick_rate": 20,  # Simulation ticks per simulated second
+    "bounds": [0, 0, 1980, 1080],
+    "paths": [],
+    "walkers": 1,
+    "coverage_samples": 200_000,
+    "seed": 0,
+}
+
+
+def load_spec(path):
+    with open(path) as f:
+        spec = dict(DEFAULT_SPEC, **json.load(f))
+    # Rows carry a hash of the spec so a rerun with a different spec isn't skipped as done
+    spec_hash = hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    check_paths(spec["paths"])
+    return spec, spec_hash
+
+
+def check_paths(paths):
+    # Raise ValueError for a path no trial can walk, before any scene is submitted
+    for index, path in enumerate(paths):
+        waypoints = [tuple(point) for point in path.get("waypoints", [])]
+        if not waypoints:
+            raise ValueError(f"Path {index} of the spec has no waypoints")
+        if path.get("loop", False) and len(set(waypoints)) < 2:
+            raise ValueError(f"Looping path {index} of the spec needs at least two distinct waypoints")
+
+
+def scene_files(directory, exclude=()):
+    # Scene files and SensorTable directories in directory
+    excluded = {os.path.abspath(path) for path in exclude}
+    paths = (os.path.join(directory, name) for name in os.listdir(directory))
+    return sorted(path for path in paths if os.path.abspath(path) not in excluded
+                  and (path.lower().endswith(SCENE_EXTENSIONS) and os.path.isfile(path) or table_directory(path)))
+
+
+def run_trial(scene, spec, seed):
+    # One Monte Carlo trial: (first detection time or None, number of trigger edges)
+    rng = random.Random(seed)
+    x0, y0, x1, y1 = spec["bounds"]
+    for intruder in list(scene.intruders):
+        scene.intruders.remove(intruder)
+    for sensor in scene.all_sensors():
+        sensor.triggered = False
+
+    simulator = Simulator(scene)
+    simulator.alarms.unsubscribe(print_events)
+    simulator.alarms.unsubscribe(simulator.dispatch_drone)  # Only detection is measured
+    triggers = []
+    simulator.alarms.subscribe(lambda events: triggers.extend(event.time for event in events), (TRIGGERED,))
+
+    for path in spec["paths"]:
+        waypoints = [tuple(point) for point in path["waypoints"]]
+        loop = path.get("loop", False)
+        intruder = scene.intruders.add(Intruder(*waypoints[0]))
+        # The intruder starts on the first waypoint; a loop walks back to it
+        route = waypoints[1:] + waypoints[:1] if loop else waypoints[1:]
+        simulator.set_trajectory(intruder, WaypointPath(route, path.get("speed", 1.4), loop))
+    for _ in range(spec["walkers"]):
+        intruder = scene.intruders.add(Intruder(rng.uniform(x0, x1), rng.uniform(y0, y1)))
+        simulator.set_trajectory(intruder, RandomWalk(bounds=(x0, y0, x1, y1), rng=random.Random(rng.getrandbits(64))))
+
+    dt = 1.0 / spec["tick_rate"]
+    simulator.evaluate()
+    for _ in range(int(round(spec["duration"] * spec["tick_rate"]))):
+        simulator.step(dt)
+    simulator.alarms.dispatch()
+    return (min(triggers) if triggers else None), len(triggers)
+
+
+def evaluate_scene(path, spec, spec_hash):
+    # Worker process: every trial of one scene plus its coverage, as one result row. Trials
+    # use the same seeds for every scene so layouts are compared on the same intruders.
+    started = time.perf_counter()
+    row = {"scene": os.path.basename(path), "spec": spec_hash}
+    try:
+        scene, _ = load_scene(path)
+        seeds = np.random.SeedSequence(spec["seed"]).generate_state(spec["trials"]).tolist()
+        results = [run_trial(scene, spec, seed) for seed in seeds]
+        detected = [first for first, _ in results if first is not None]
+        report = analyse_coverage(list(scene.all_sensors()), tuple(spec["bounds"]),
+                                  samples=spec["coverage_samples"], seed=spec["seed"], walls=scene.walls)
+        row.update({
+            "sensors": scene.sensor_count(),
+            "trials": spec["trials"],
+            "detection_rate": len(detected) / spec["trials"] if spec["trials"] else 0.0,
+            "mean_time_to_detect": sum(detected) / len(detected) if detected else None,
+            "mean_alarms": sum(alarms for _, alarms in results) / spec["trials"] if spec["trials"] else 0.0,
+            "coverage": report.fraction,
+        })
+    except Exception as error:
+        row["error"] = f"{type(error).__name__}: {error}"
+    row["seconds"] = round(time.perf_counter() - started, 3)
+    return row
+
+
+class ResultWriter:
+    def __init__(self, path):
+        # Appends result rows to a .csv or .jsonl file, flushed row by row so an interrupted
+        # batch loses at most the row being written
+        self.path = path
+        self.jsonl = path.lower().endswith(".jsonl")
+        self.truncate_partial_line()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.csv = None if self.jsonl else csv.DictWriter(self.file, FIELDS)
+        if new and self.csv:
+            self.csv.writeheader()
+
+    def truncate_partial_line(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def completed(self, spec_hash):
+        # Scenes that already have an error-free row for this spec
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="") as f:
+            rows = [json.loads(line) for line in f if line.strip()] if self.jsonl else list(csv.DictReader(f))
+        return {row["scene"] for row in rows if row.get("spec") == spec_hash and not row.get("error")}
+
+    def write(self, row):
+        if self.jsonl:
+            self.file.write(json.dumps({field: row.get(field) for field in FIELDS}) + "\n")
+        else:
+            self.csv.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_batch(directory, spec_path, output, workers=None):
+    # Fans the scenes out over a process pool, one task per scene, and streams each row as
+    # soon as its scene is done. Scenes already in output for this spec are skipped.
+    spec, spec_hash = load_spec(spec_path)
+    writer = ResultWriter(output)
+    done = writer.completed(spec_hash)
+    paths = [path for path in scene_files(directory, exclude=(spec_path, output)) if os.path.basename(path) not in done]
+    total = len(paths)
+    print(f"{total} scene(s) to run, {len(done)} already done", file=sys.stderr)
+
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(evaluate_scene, path, spec, spec_hash) for path in paths]
+        for finished, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            writer.write(row)
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / finished * (total - finished)
+            status = f"error: {row['error']}" if row.get("error") else f"{row['seconds']:.1f} s"
+            print(f"[{finished}/{total}] {row['scene']} ({status}), {elapsed:.0f} s elapsed, ~{remaining:.0f} s left",
+                  file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown()
+        writer.close()
+
+
+if __name__ == "__main__":
+    # python batch_run.py scenes_dir spec.json results.csv|results.jsonl [workers]
+    if len(sys.argv) < 4:
+        print("usage: python batch_run.py scenes_dir spec.json results.csv|results.jsonl [workers]", file=sys.stderr)
+        sys.exit(2)
+    run_batch(sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else None)
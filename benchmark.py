@@ -0,0 +1,383 @@
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from alarms import print_events
+from blueprint import BlueprintCache
+from geometry import fov_polygon
+from pyramid import PYRAMID_MIN_PIXELS, TilePyramid, open_large_image
+from renderer import LAYERS, CanvasRenderer
+from simulation import Scene, Sensor, Simulator
+from visibility import VisibilityCache
+
+
+CANVAS_SIZE = (1980, 1080)
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "images")
+# Marker images at the sizes asim.py loads them
+MARKER_IMAGES = {
+    "sensor_on": ("sensor_on.png", (18, 18)),
+    "sensor_off": ("sensor_off.png", (18, 18)),
+    "intruder": ("intruder.png", (20, 45)),
+    "drone": ("drone.png", (30, 30)),
+    "panel": ("panel.png", (30, 40)),
+}
+
+# Scene sizes per suite; blueprints are in megapixels
+SUITES = {
+    "quick": {"sensors": [10, 1000], "intruders": [1, 100], "blueprints": [1, 16]},
+    "full": {"sensors": [10, 1000, 100_000], "intruders": [1, 100, 10_000], "blueprints": [1, 16, 64, 300]},
+}
+WALLS = 40  # Wall segments per canvas-sized area of a synthetic scene
+SENSOR_DENSITY = 1000  # Sensors per canvas-sized area; bigger scenes cover a bigger site
+SEED = 1234
+REPEATS = 5  # Timed runs per case; the fastest one is kept
+REPEAT_BUDGET = 2.0  # Seconds after which a case stops repeating
+
+DEFAULT_HISTORY = "bench_history.json"
+BASELINE_RUNS = 5  # Earlier runs of the same suite whose median is the baseline
+DEFAULT_THRESHOLD = 1.25  # A case regressed if it is this many times slower than its baseline
+
+
+class OffscreenCanvas:
+    def __init__(self, width, height):
+        # Stand-in for the Tk canvas so CanvasRenderer runs without a display. Items are kept
+        # like Tk keeps them and render() paints them into a PIL image, bottom layer first.
+        self.width = width
+        self.height = height
+        self.items = {}  # Item id -> [kind, coords, options, tags]
+        self.next_id = 1
+
+    def create(self, kind, coords, options):
+        item = self.next_id
+        self.next_id += 1
+        self.items[item] = [kind, self.flatten(coords), options, set()]
+        return item
+
+    def flatten(self, coords):
+        if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+            coords = coords[0]
+        return list(coords)
+
+    def create_line(self, *coords, **options):
+        return self.create("line", coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        return self.create("rectangle", coords, options)
+
+    def create_polygon(self, *coords, **options):
+        return self.create("polygon", coords, options)
+
+    def create_text(self, *coords, **options):
+        return self.create("text", coords, options)
+
+    def create_image(self, *coords, **options):
+        return self.create("image", coords, options)
+
+    def coords(self, item, *coords):
+        self.items[item][1] = self.flatten(coords)
+
+    def itemconfig(self, item, **options):
+        self.items[item][2].update(options)
+
+    def move(self, item, dx, dy):
+        coords = self.items[item][1]
+        coords[0::2] = [x + dx for x in coords[0::2]]
+        coords[1::2] = [y + dy for y in coords[1::2]]
+
+    def delete(self, item):
+        self.items.pop(item, None)
+
+    def addtag_withtag(self, tag, item):
+        self.items[item][3].add(tag)
+
+    def tag_raise(self, item, above=None):
+        # Stacking follows the layer tags, see render()
+        pass
+
+    def tag_lower(self, item, below=None):
+        pass
+
+    def render(self):
+        # Repaint everything, like Tk does after a full redraw
+        image = Image.new("RGB", (self.width, self.height), "white")
+        draw = ImageDraw.Draw(image, "RGBA")
+        order = {layer: index for index, layer in enumerate(LAYERS)}
+        items = sorted(self.items.items(), key=lambda entry: (min((order.get(tag, len(order)) for tag in entry[1][3]),
+                                                                  default=len(order)), entry[0]))
+        for _, (kind, coords, options, _) in items:
+            if kind == "line":
+                draw.line(coords, fill=options.get("fill", "black"), width=options.get("width", 1))
+            elif kind == "rectangle":
+                draw.rectangle(coords, fill=options.get("fill"), outline=options.get("outline"))
+            elif kind == "polygon" and len(coords) >= 6:
+                fill = options.get("fill")
+                if fill and options.get("stipple"):
+                    fill = ImageColor.getrgb(fill) + (64,)  # gray25 stipple shows a quarter of the colour
+                draw.polygon(coords, fill=fill or None, outline=options.get("outline") or None)
+            elif kind == "text" and options.get("text"):
+                draw.text(coords, options["text"], fill=options.get("fill", "black"))
+            elif kind == "image" and options.get("image") is not None:
+                photo = options["image"]
+                x, y = coords
+                if options.get("anchor", "center") == "center":
+                    x, y = x - photo.width / 2, y - photo.height / 2
+                image.paste(photo, (int(x), int(y)), photo if photo.mode == "RGBA" else None)
+        return image
+
+
+def marker_images():
+    # PIL images in place of the PhotoImages CanvasRenderer normally gets
+    return {name: Image.open(os.path.join(IMAGES_DIR, file_name)).convert("RGBA").resize(size, Image.LANCZOS)
+            for name, (file_name, size) in MARKER_IMAGES.items()}
+
+
+def synthetic_scene(sensor_count, intruder_count, seed=SEED):
+    # Sensors, intruders and walls scattered over a site that grows with the sensor count,
+    # the same for every run
+    rng = np.random.default_rng(seed)
+    areas = max(1.0, sensor_count / SENSOR_DENSITY)
+    width, height = (size * math.sqrt(areas) for size in CANVAS_SIZE)
+    scene = Scene(seed)
+    xs, ys = rng.uniform(0, width - 25, sensor_count), rng.uniform(0, height - 50, sensor_count)
+    angles, fovs = rng.uniform(0, 360, sensor_count), rng.uniform(30, 120, sensor_count)
+    ranges = rng.uniform(1, 5, sensor_count)
+    for index, (x, y, angle, detection_angle, detection_range) in enumerate(
+            zip(xs.tolist(), ys.tolist(), angles.tolist(), fovs.tolist(), ranges.tolist())):
+        sensor = Sensor(x, y, angle=angle, detection_angle=detection_angle, is_enabled=True, name=f"S{index}")
+        sensor.detection_range = detection_range  # Meters
+        scene.add_sensor(sensor)
+    scene.intruders.add_many(rng.uniform(0, width - 50, intruder_count), rng.uniform(0, height - 90, intruder_count))
+
+    # Axis-aligned walls of 100-400 pixels
+    for _ in range(round(WALLS * areas)):
+        x, y, length = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(100, 400)
+        if rng.random() < 0.5:
+            scene.walls.add_segment(x, y, min(width, x + length), y)
+        else:
+            scene.walls.add_segment(x, y, x, min(height, y + length))
+    return scene
+
+
+def synthetic_blueprint(megapixels, directory):
+    # A floor plan of room outlines at roughly 4:3, written once and reused by later runs
+    path = os.path.join(directory, f"blueprint_{megapixels}mp.png")
+    if os.path.exists(path):
+        return path
+    width = round(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = round(megapixels * 1e6 / width)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    line = max(2, width // 1000)
+    room = max(50, width // 12)
+    for x in range(0, width, room):
+        draw.line((x, 0, x, height), fill=0, width=line)
+    for y in range(0, height, room):
+        draw.line((0, y, width, y), fill=0, width=line)
+    image.save(path + ".tmp.png", compress_level=1)
+    os.replace(path + ".tmp.png", path)
+    return path
+
+
+def fit_size(size, bounds=CANVAS_SIZE):
+    scale = min(bounds[0] / size[0], bounds[1] / size[1])
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+def measure(run, setup=None, warmup=False):
+    # Fastest of up to REPEATS timed calls of run(state), where state = setup() is built
+    # outside the timing
+    if warmup:
+        run(setup() if setup else None)
+    best = math.inf
+    spent = 0.0
+    for _ in range(REPEATS):
+        state = setup() if setup else None
+        started = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        spent += elapsed
+        if spent > REPEAT_BUDGET:
+            break
+    return best
+
+
+def quiet_simulator(scene):
+    simulator = Simulator(scene)
+    simulator.alarms.unsubscribe(print_events)
+    simulator.alarms.unsubscribe(simulator.dispatch_drone)
+    return simulator
+
+
+def bench_detection(scene):
+    # One Simulator.evaluate(): batched range/FOV test plus wall line of sight and alarm edges
+    simulator = quiet_simulator(scene)
+    return measure(lambda _: simulator.evaluate(), warmup=True)
+
+
+def bench_fov(scene):
+    # Plain wedges, and wedges clipped by the walls, for every sensor with a cold cache
+    sensors = scene.sensors
+    wedges = measure(lambda _: [fov_polygon(sensor) for sensor in sensors])
+    visibility = measure(lambda cache: [cache.polygon(sensor, scene.walls) for sensor in sensors], VisibilityCache)
+    return wedges, visibility
+
+
+def bench_redraw(scene, images):
+    # Cold: a new renderer builds every item of the scene. Frame: intruders take a step and
+    # the warm renderer only updates what moved. Paint: the canvas is painted offscreen,
+    # standing in for the repaint Tk does after either of them.
+    def new_renderer():
+        return CanvasRenderer(OffscreenCanvas(*CANVAS_SIZE), images, *CANVAS_SIZE)
+
+    cold = measure(lambda renderer: renderer.update(scene), new_renderer)
+    renderer = new_renderer()
+    renderer.update(scene)
+    rng = np.random.default_rng(SEED)
+
+    def frame(_):
+        count = len(scene.intruders)
+        scene.intruders.xs[:count] += rng.uniform(-2, 2, count)
+        scene.intruders.ys[:count] += rng.uniform(-2, 2, count)
+        renderer.update(scene)
+
+    return cold, measure(frame), measure(lambda _: renderer.canvas.render())
+
+
+def bench_blueprint(path):
+    # Time to get a blueprint file on screen, fitted to the canvas: decode + resize for a
+    # single image, tile cutting + visible tile resizes for a pyramid (cold, then with the
+    # tiles already on disk)
+    with open_large_image(path) as image:
+        size = image.size
+    if size[0] * size[1] < PYRAMID_MIN_PIXELS:
+        def display(_):
+            with open_large_image(path) as image:
+                BlueprintCache(make_photo=lambda resized: resized).get(image, fit_size(size))
+        return {"": measure(display)}
+
+    def display_tiles(_):
+        pyramid = TilePyramid(path)
+        cache = BlueprintCache(max_entries=256, make_photo=lambda resized: resized)
+        for level, col, row, box in pyramid.visible_tiles((0, 0), fit_size(size), (0, 0) + CANVAS_SIZE):
+            cache.get(pyramid.get_tile(level, col, row), (box[2] - box[0], box[3] - box[1]))
+
+    def clear_tiles():
+        shutil.rmtree(f"{path}.tiles", ignore_errors=True)
+
+    return {"/cold": measure(display_tiles, clear_tiles), "/tiled": measure(display_tiles)}
+
+
+def run_suite(name, work_dir):
+    suite = SUITES[name]
+    results = {}
+
+    def record(case, seconds):
+        results[case] = round(seconds, 6)
+        print(f"{case:<32} {seconds * 1000:10.2f} ms", file=sys.stderr)
+
+    images = marker_images()
+    for sensor_count in suite["sensors"]:
+        for intruder_count in suite["intruders"]:
+            scene = synthetic_scene(sensor_count, intruder_count)
+            label = f"{sensor_count}x{intruder_count}"
+            record(f"detect/{label}", bench_detection(scene))
+            cold, frame, paint = bench_redraw(scene, images)
+            record(f"redraw/{label}", cold)
+            record(f"frame/{label}", frame)
+            record(f"paint/{label}", paint)
+        wedges, visibility = bench_fov(scene)
+        record(f"fov/{sensor_count}", wedges)
+        record(f"visibility/{sensor_count}", visibility)
+
+    for megapixels in suite["blueprints"]:
+        path = synthetic_blueprint(megapixels, work_dir)
+        for suffix, seconds in bench_blueprint(path).items():
+            record(f"blueprint/{megapixels}MP{suffix}", seconds)
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    # {"thresholds": {"default": 1.25, case: ratio, ...}, "runs": [run, ...]}
+    if not os.path.exists(path):
+        return {"thresholds": {"default": DEFAULT_THRESHOLD}, "runs": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(history, suite, results):
+    # (case, seconds, baseline or None, ratio or None, regressed) against the median of
+    # the last BASELINE_RUNS runs of the suite that have the case
+    thresholds = history.get("thresholds", {})
+    earlier = [run for run in history["runs"] if run["suite"] == suite]
+    rows = []
+    for case, seconds in results.items():
+        previous = [run["results"][case] for run in earlier if case in run["results"]][-BASELINE_RUNS:]
+        if not previous:
+            rows.append((case, seconds, None, None, False))
+            continue
+        baseline = statistics.median(previous)
+        ratio = seconds / baseline if baseline else None
+        limit = thresholds.get(case, thresholds.get("default", DEFAULT_THRESHOLD))
+        rows.append((case, seconds, baseline, ratio, ratio is not None and ratio > limit))
+    return rows
+
+
+def save_history(path, history):
+    with open(path + ".tmp", "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def main(suite="quick", history_path=DEFAULT_HISTORY):
+    if suite not in SUITES:
+        raise ValueError(f"Unknown suite {suite!r}, expected one of {', '.join(SUITES)}")
+    work_dir = os.path.join(tempfile.gettempdir(), "asim_bench")
+    os.makedirs(work_dir, exist_ok=True)
+    results = run_suite(suite, work_dir)
+
+    history = load_history(history_path)
+    rows = compare(history, suite, results)
+    regressions = [case for case, _, _, _, regressed in rows if regressed]
+    print(f"\n{'case':<32} {'ms':>10} {'baseline':>10} {'ratio':>7}")
+    for case, seconds, baseline, ratio, regressed in rows:
+        baseline_text = f"{baseline * 1000:10.2f}" if baseline is not None else f"{'-':>10}"
+        ratio_text = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{case:<32} {seconds * 1000:10.2f} {baseline_text} {ratio_text}{'  REGRESSION' if regressed else ''}")
+
+    history["runs"].append({
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": current_commit(),
+        "suite": suite,
+        "machine": f"{platform.node()} {platform.machine()} python {platform.python_version()}",
+        "results": results,
+        "regressions": regressions,
+    })
+    save_history(history_path, history)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+    return not regressions
+
+
+if __name__ == "__main__":
+    # python benchmark.py [quick|full] [history.json]
+    ok = main(sys.argv[1] if len(sys.argv) > 1 else "quick", sys.argv[2] if len(sys.argv) > 2 else DEFAULT_HISTORY)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+
+# Resampling filters ordered from cheapest to best quality
+RESAMPLE_QUALITY = {Image.NEAREST: 0, Image.BILINEAR: 1, Image.BICUBIC: 2, Image.LANCZOS: 3}
+
+
+class BlueprintCache:
+    def __init__(self, max_entries=8, make_photo=ImageTk.PhotoImage):
+        # (id(image), size) -> (image, resample, PhotoImage), least recently used first.
+        # The entry keeps a reference to the source image so its id can't be reused.
+        # make_photo turns the resized PIL image into what the canvas shows.
+        self.max_entries = max_entries
+        self.make_photo = make_photo
+        self.entries = OrderedDict()
+
+    def get(self, image, size, resample=Image.LANCZOS):
+        key = (id(image), tuple(size))
+        entry = self.entries.get(key)
+
+        # A cached entry is good enough if it was resampled at least as well as requested
+        if entry is not None and RESAMPLE_QUALITY[entry[1]] >= RESAMPLE_QUALITY[resample]:
+            self.entries.move_to_end(key)
+            return entry[2]
+
+        photo = self.make_photo(image.resize(size, resample))
+        self.entries[key] = (image, resample, photo)
+        self.entries.move_to_end(key)
+
+        # Evict the least recently used layers
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return photo
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,151 @@
+import json
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection import DetectionEngine
+from walls import WallSet
+
+
+CHUNK_SAMPLES = 1 << 20  # Random points evaluated per chunk
+CELL_SIZE = 100  # Pixels per bucket when sorting sample points spatially
+
+
+class CoverageReport:
+    def __init__(self, names, samples, detected, exclusive, overlap):
+        self.names = names  # Sensor names, same order as exclusive
+        self.samples = samples
+        self.detected = detected  # Points seen by at least one sensor
+        self.exclusive = exclusive  # Per sensor: points seen by that sensor only
+        self.overlap = overlap  # overlap[k]: points seen by exactly k sensors
+
+    @property
+    def fraction(self):
+        return self.detected / self.samples if self.samples else 0.0
+
+    def exclusive_fraction(self):
+        return self.exclusive / max(self.samples, 1)
+
+    def summary(self, max_sensors=20):
+        lines = [f"Samples: {self.samples}", f"Detected: {self.fraction:.2%}", "Exclusive coverage:"]
+        fractions = self.exclusive_fraction()
+        for index in np.argsort(-fractions, kind="stable")[:max_sensors].tolist():
+            lines.append(f"  {self.names[index] or '(unnamed)'}: {fractions[index]:.2%}")
+        for count, points in enumerate(self.overlap.tolist()):
+            if points:
+                lines.append(f"Seen by {count} sensor(s): {points / self.samples:.2%}")
+        return "\n".join(lines)
+
+
+def count_chunk(columns, bounds, samples, seed, segments=()):
+    # Samples uniform random points in bounds and counts, per point, how many enabled
+    # sensors see it. Points are bucketed on a grid so each sensor only tests the
+    # points near it instead of the whole chunk; points behind a wall segment aren't seen.
+    walls = None
+    if segments:
+        walls = WallSet()
+        for segment in segments:
+            walls.add_segment(*segment)
+    rng = np.random.default_rng(seed)
+    x0, y0, x1, y1 = bounds
+    px = rng.uniform(x0, x1, samples)
+    py = rng.uniform(y0, y1, samples)
+
+    cols = max(1, math.ceil((x1 - x0) / CELL_SIZE))
+    rows = max(1, math.ceil((y1 - y0) / CELL_SIZE))
+    cell = (np.minimum(((py - y0) // CELL_SIZE).astype(np.intp), rows - 1) * cols
+            + np.minimum(((px - x0) // CELL_SIZE).astype(np.intp), cols - 1))
+    order = np.argsort(cell, kind="stable")
+    px, py, cell = px[order], py[order], cell[order]
+    starts = np.searchsorted(cell, np.arange(rows * cols + 1))
+
+    counts = np.zeros(samples, dtype=np.int32)
+    owner = np.full(samples, -1, dtype=np.int32)  # Last sensor that saw the point
+
+    enabled = np.flatnonzero(columns["enabled"] & (columns["range"] > 0))
+    for index in enabled.tolist():
+        sx, sy = columns["x"][index], columns["y"][index]
+        radius = columns["range"][index]
+        col_start = max(0, int((sx - radius - x0) // CELL_SIZE))
+        col_end = min(cols - 1, int((sx + radius - x0) // CELL_SIZE))
+        row_start = max(0, int((sy - radius - y0) // CELL_SIZE))
+        row_end = min(rows - 1, int((sy + radius - y0) // CELL_SIZE))
+        if col_start > col_end or row_start > row_end:
+            continue
+
+        hits = []
+        for row in range(row_start, row_end + 1):
+            # The cells of one grid row are contiguous in the sorted points
+            lo = starts[row * cols + col_start]
+            hi = starts[row * cols + col_end + 1]
+            if lo == hi:
+                continue
+            dx = px[lo:hi] - sx
+            dy = py[lo:hi] - sy
+            seen = np.sqrt(dx * dx + dy * dy) <= radius
+            # Same wedge normalisation as DetectionEngine.detect
+            angle_difference = np.abs(columns["heading"][index] - np.arctan2(dy, dx)) % (2 * math.pi)
+            seen &= angle_difference <= columns["half_angle"][index]
+            hits.append(np.flatnonzero(seen) + lo)
+        hits = np.concatenate(hits) if hits else np.zeros(0, dtype=np.intp)
+        if walls is not None and len(hits):
+            hits = hits[np.isinf(walls.ray_hits(sx, sy, px[hits], py[hits]))]
+        counts[hits] += 1
+        owner[hits] = index
+
+    sensor_count = len(columns["x"])
+    single = counts == 1
+    exclusive = np.bincount(owner[single], minlength=sensor_count)
+    overlap = np.bincount(counts, minlength=len(enabled) + 1)
+    return int(np.count_nonzero(counts)), exclusive, overlap
+
+
+def analyse_coverage(sensors, bounds, samples=1_000_000, chunk_size=CHUNK_SAMPLES, workers=None, seed=None,
+                     walls=None):
+    # Monte Carlo coverage of a sensor layout over bounds (x0, y0, x1, y1) in canvas pixels,
+    # with sight lines blocked by walls (a WallSet) if given.
+    # Memory stays flat at one chunk per worker; workers > 1 spreads chunks over a process pool.
+    engine = DetectionEngine()
+    engine.load_sensors(sensors)
+    columns = engine.columns()
+    names = [sensor.name for sensor in sensors]
+    segments = [segment for _, segment in walls.segments()] if walls is not None else []
+
+    sizes = [chunk_size] * (samples // chunk_size)
+    if samples % chunk_size:
+        sizes.append(samples % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    detected = 0
+    exclusive = np.zeros(len(sensors), dtype=np.int64)
+    overlap = np.zeros(np.count_nonzero(columns["enabled"] & (columns["range"] > 0)) + 1, dtype=np.int64)
+
+    count = len(sizes)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 and count > 1 else None
+    chunk_map = pool.map if pool else map
+    try:
+        for chunk_detected, chunk_exclusive, chunk_overlap in chunk_map(count_chunk, [columns] * count, [bounds] * count,
+                                                                        sizes, seeds, [segments] * count):
+            detected += chunk_detected
+            exclusive += chunk_exclusive
+            overlap += chunk_overlap
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return CoverageReport(names, samples, detected, exclusive, overlap)
+
+
+if __name__ == "__main__":
+    from simulation import Scene
+
+    # python coverage.py setup.json [samples] [workers]
+    path = sys.argv[1] if len(sys.argv) > 1 else "setup.json"
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    with open(path) as f:
+        scene = Scene.from_dict(json.load(f))
+    report = analyse_coverage(scene.sensors, (0, 0, 1980, 1080), samples=samples, workers=workers, walls=scene.walls)
+    print(report.summary())
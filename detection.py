@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+
+
+PIXELS_PER_METER = 50  # 1 meter = 50 pixels
+
+# Offsets from the top-left of the images to the points used for detection
+SENSOR_OFFSET = (12.5, 25)  # Bottom center of the sensor image
+INTRUDER_OFFSET = (25, 45)  # Feet of the intruder image
+
+CHUNK_CELLS = 1 << 20  # Sensor/intruder pairs evaluated per batch
+
+
+class DetectionEngine:
+    def __init__(self):
+        # Sensor columns, one entry per sensor in the order they were synced
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.heading = np.zeros(0)  # Radians
+        self.range = np.zeros(0)  # Pixels
+        self.half_angle = np.zeros(0)  # Radians
+        self.enabled = np.zeros(0, dtype=bool)
+        # Loaded from a SensorTable the columns are its mapped files, in its units: x, y are
+        # the sensor image corner, heading and the full field of view are in degrees and the
+        # range in meters. These say how to get from those to the values above; detect()
+        # converts its distances and bearings into the columns' units instead.
+        self.offset = (0.0, 0.0)  # Added to x, y to get the detection point
+        self.units = None  # (radians per heading unit, pixels per range unit, radians per half_angle unit)
+
+    def __len__(self):
+        return len(self.x)
+
+    def load_sensors(self, sensors):
+        # Copy the sensor attributes into contiguous arrays
+        count = len(sensors)
+        self.x = np.fromiter((s.x + SENSOR_OFFSET[0] for s in sensors), dtype=float, count=count)
+        self.y = np.fromiter((s.y + SENSOR_OFFSET[1] for s in sensors), dtype=float, count=count)
+        self.heading = np.fromiter((math.radians(s.angle) for s in sensors), dtype=float, count=count)
+        self.range = np.fromiter((s.detection_range * PIXELS_PER_METER for s in sensors), dtype=float, count=count)
+        self.half_angle = np.fromiter((math.radians(s.detection_angle / 2) for s in sensors), dtype=float, count=count)
+        self.enabled = np.fromiter((bool(s.is_enabled) for s in sensors), dtype=bool, count=count)
+        self.offset = (0.0, 0.0)
+        self.units = None
+
+    def load_table(self, table):
+        # Read a SensorTable's columns in place, without building Sensor objects
+        columns = table.detection_columns()
+        self.x, self.y = columns["x"], columns["y"]
+        self.heading, self.range, self.half_angle = columns["angle"], columns["range"], columns["fov"]
+        self.enabled = columns["enabled"]
+        self.offset = SENSOR_OFFSET
+        self.units = (math.pi / 180, PIXELS_PER_METER, math.pi / 360)
+
+    def scaled(self):
+        # (heading, range, half_angle) in radians and pixels, as copies for table columns
+        if self.units is None:
+            return self.heading, self.range, self.half_angle
+        return self.heading * self.units[0], self.range * self.units[1], self.half_angle * self.units[2]
+
+    def points(self, indices=slice(None)):
+        # Detection points of the sensors at indices
+        return self.x[indices] + self.offset[0], self.y[indices] + self.offset[1]
+
+    def columns(self):
+        # The sensor arrays as a plain dict, e.g. to ship to worker processes
+        x, y = self.points()
+        heading, reach, half_angle = self.scaled()
+        return {"x": x, "y": y, "heading": heading, "range": reach,
+                "half_angle": half_angle, "enabled": self.enabled}
+
+    def load_columns(self, columns):
+        self.x = np.asarray(columns["x"], dtype=float)
+        self.y = np.asarray(columns["y"], dtype=float)
+        self.heading = np.asarray(columns["heading"], dtype=float)
+        self.range = np.asarray(columns["range"], dtype=float)
+        self.half_angle = np.asarray(columns["half_angle"], dtype=float)
+        self.enabled = np.asarray(columns["enabled"], dtype=bool)
+        self.offset = (0.0, 0.0)
+        self.units = None
+
+    def detect(self, intruder_x, intruder_y):
+        # Returns a (sensors, intruders) boolean matrix of hits.
+        # The sensor offset is taken off the intruder points instead of being added to every
+        # sensor, and distances and bearings are put in the columns' units, so table columns
+        # are read in place.
+        ix = np.asarray(intruder_x, dtype=float).reshape(1, -1) - self.offset[0]
+        iy = np.asarray(intruder_y, dtype=float).reshape(1, -1) - self.offset[1]
+        heading_unit, range_unit, half_angle_unit = self.units or (1.0, 1.0, 1.0)
+
+        dx = ix - self.x[:, None]
+        dy = iy - self.y[:, None]
+
+        # Range test
+        distance = np.sqrt(dx * dx + dy * dy)
+        if range_unit != 1:
+            distance /= range_unit
+        in_range = distance <= self.range[:, None]
+
+        # Wedge test, same normalisation as SensorSimulationApp.is_within_angle
+        bearing = np.arctan2(dy, dx)
+        if heading_unit != 1:
+            bearing /= heading_unit
+        angle_difference = np.abs(self.heading[:, None] - bearing) % (2 * math.pi / heading_unit)
+        if heading_unit != half_angle_unit:
+            angle_difference *= heading_unit / half_angle_unit
+        in_wedge = angle_difference <= self.half_angle[:, None]
+
+        return in_range & in_wedge & self.enabled[:, None]
+
+    def detect_chunks(self, intruder_x, intruder_y):
+        # Yields (first intruder index, hit matrix) over column blocks of at most
+        # CHUNK_CELLS sensor/intruder pairs so crowds don't allocate huge temporaries
+        intruder_x = np.asarray(intruder_x, dtype=float)
+        intruder_y = np.asarray(intruder_y, dtype=float)
+        chunk = max(1, CHUNK_CELLS // max(len(self), 1))
+        for start in range(0, len(intruder_x), chunk):
+            yield start, self.detect(intruder_x[start:start + chunk], intruder_y[start:start + chunk])
+
+    def triggered_mask(self, intruder_x, intruder_y):
+        # One flag per sensor, True if any intruder point is detected by it
+        mask = np.zeros(len(self), dtype=bool)
+        if len(self) == 0:
+            return mask
+        for _, hits in self.detect_chunks(intruder_x, intruder_y):
+            mask |= hits.any(axis=1)
+        return mask
+
+    def hit_pairs(self, intruder_x, intruder_y):
+        # (sensor indices, intruder indices) of every detection
+        sensor_indices = [np.zeros(0, dtype=np.intp)]
+        intruder_indices = [np.zeros(0, dtype=np.intp)]
+        if len(self):
+            for start, hits in self.detect_chunks(intruder_x, intruder_y):
+                rows, cols = np.nonzero(hits)
+                sensor_indices.append(rows)
+                intruder_indices.append(cols + start)
+        return np.concatenate(sensor_indices), np.concatenate(intruder_indices)
+
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+from detection import PIXELS_PER_METER, SENSOR_OFFSET
+
+
+ARC_TOLERANCE = 0.5  # Max distance in pixels between the true arc and its polygon edges
+MIN_CIRCLE_SEGMENTS = 8
+MAX_CIRCLE_SEGMENTS = 4096
+
+unit_circle_tables = {}  # Segment count -> (cos, sin) arrays shared by every sensor
+
+
+def circle_segments(radius):
+    # Power of two segment count for a full circle of this on-screen radius, chosen so the
+    # polygon never strays more than ARC_TOLERANCE pixels from the arc
+    if radius <= ARC_TOLERANCE:
+        return MIN_CIRCLE_SEGMENTS
+    step = 2 * math.acos(1 - ARC_TOLERANCE / radius)
+    segments = 2 ** math.ceil(math.log2(2 * math.pi / step))
+    return max(MIN_CIRCLE_SEGMENTS, min(MAX_CIRCLE_SEGMENTS, segments))
+
+
+def unit_circle(segments):
+    table = unit_circle_tables.get(segments)
+    if table is None:
+        theta = np.arange(segments) * (2 * math.pi / segments)
+        table = unit_circle_tables[segments] = (np.cos(theta), np.sin(theta))
+    return table
+
+
+def wedge_polygon(center_x, center_y, radius, start_angle, end_angle):
+    # Flat [x0, y0, x1, y1, ...] list: the center, then the arc from start_angle to end_angle
+    # (radians). Interior arc vertices come from the shared unit-circle table.
+    segments = circle_segments(radius)
+    cos_table, sin_table = unit_circle(segments)
+    step = 2 * math.pi / segments
+
+    first = math.floor(start_angle / step) + 1
+    last = math.ceil(end_angle / step) - 1
+    indices = np.arange(first, last + 1) % segments if last >= first else np.zeros(0, dtype=int)
+
+    xs = np.empty(len(indices) + 3)
+    ys = np.empty(len(indices) + 3)
+    xs[0], ys[0] = center_x, center_y
+    xs[1], ys[1] = center_x + radius * math.cos(start_angle), center_y + radius * math.sin(start_angle)
+    xs[2:-1] = center_x + radius * cos_table[indices]
+    ys[2:-1] = center_y + radius * sin_table[indices]
+    xs[-1], ys[-1] = center_x + radius * math.cos(end_angle), center_y + radius * math.sin(end_angle)
+
+    points = np.empty(2 * len(xs))
+    points[0::2] = xs
+    points[1::2] = ys
+    return points.tolist()
+
+
+def fov_key(sensor):
+    return (sensor.x, sensor.y, sensor.angle, sensor.detection_range, sensor.detection_angle)
+
+
+def fov_polygon(sensor):
+    # FOV wedge anchored at the bottom center of the sensor image
+    angle_rad = math.radians(sensor.angle)
+    half_angle = math.radians(sensor.detection_angle / 2)
+    return wedge_polygon(sensor.x + SENSOR_OFFSET[0], sensor.y + SENSOR_OFFSET[1],
+                         sensor.detection_range * PIXELS_PER_METER,
+                         angle_rad - half_angle, angle_rad + half_angle)
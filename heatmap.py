@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+from detection import PIXELS_PER_METER, SENSOR_OFFSET
+from geometry import fov_key
+from walls import segment_distance
+
+
+# RGBA per coverage count: blind spots red, single coverage yellow, overlap green
+HEATMAP_COLORS = np.array([
+    (220, 30, 30, 110),
+    (240, 200, 40, 90),
+    (60, 180, 60, 90),
+    (20, 120, 40, 110),
+], dtype=np.uint8)
+
+
+class CoverageRaster:
+    def __init__(self, bounds=(0, 0, 1980, 1080), cell_size=PIXELS_PER_METER):
+        # counts[row, col] is the number of enabled sensors that see the center of that cell.
+        # Each sensor's wedge is remembered as a stamp so a moved sensor can be subtracted
+        # and re-added without recomputing the whole raster. Cells behind a wall of the
+        # attached WallSet aren't counted.
+        self.bounds = bounds
+        self.cell_size = cell_size
+        self.cols = max(1, math.ceil((bounds[2] - bounds[0]) / cell_size))
+        self.rows = max(1, math.ceil((bounds[3] - bounds[1]) / cell_size))
+        self.counts = np.zeros((self.rows, self.cols), dtype=np.int32)
+        self.stamps = {}  # Sensor -> (key, row slice, col slice, mask)
+        self.walls = None
+
+    def attach(self, walls):
+        # Follow a WallSet (or None); every sensor is burned again against the new walls
+        if self.walls is not None:
+            self.walls.listeners.remove(self.wall_changed)
+        self.walls = walls
+        self.stamps.clear()
+        self.counts[:] = 0
+        if walls is not None:
+            walls.listeners.append(self.wall_changed)
+
+    def wall_changed(self, segment_id, segment, added):
+        # Take out only the sensors whose range circle reaches the edited wall; the next
+        # update() burns them again
+        for sensor, (key, _) in list(self.stamps.items()):
+            x, y, _, detection_range, _, _ = key
+            if segment_distance(x + SENSOR_OFFSET[0], y + SENSOR_OFFSET[1], *segment) <= detection_range * PIXELS_PER_METER:
+                self.remove(sensor)
+
+    def stamp(self, sensor):
+        # Boolean mask of the cells inside the sensor's FOV wedge, restricted to its range box
+        radius = sensor.detection_range * PIXELS_PER_METER
+        if not sensor.is_enabled or radius <= 0:
+            return None
+        sx, sy = sensor.x + SENSOR_OFFSET[0], sensor.y + SENSOR_OFFSET[1]
+        x0, y0 = self.bounds[0], self.bounds[1]
+        col_start = max(0, int((sx - radius - x0) // self.cell_size))
+        col_end = min(self.cols, int((sx + radius - x0) // self.cell_size) + 1)
+        row_start = max(0, int((sy - radius - y0) // self.cell_size))
+        row_end = min(self.rows, int((sy + radius - y0) // self.cell_size) + 1)
+        if col_start >= col_end or row_start >= row_end:
+            return None
+
+        # Cell centers relative to the sensor
+        dx = (x0 + (np.arange(col_start, col_end) + 0.5) * self.cell_size - sx)[None, :]
+        dy = (y0 + (np.arange(row_start, row_end) + 0.5) * self.cell_size - sy)[:, None]
+        mask = np.sqrt(dx * dx + dy * dy) <= radius
+        # Same wedge normalisation as DetectionEngine.detect
+        angle_difference = np.abs(math.radians(sensor.angle) - np.arctan2(dy, dx)) % (2 * math.pi)
+        mask &= angle_difference <= math.radians(sensor.detection_angle / 2)
+        if self.walls is not None and len(self.walls):
+            rows, cols = np.nonzero(mask)
+            mask[rows, cols] = np.isinf(self.walls.ray_hits(sx, sy, sx + dx[0, cols], sy + dy[rows, 0]))
+        return slice(row_start, row_end), slice(col_start, col_end), mask
+
+    def update(self, sensors, walls=None):
+        # Re-burn only the sensors whose geometry or enabled state changed, or that are near
+        # an edited wall; returns True if the raster changed
+        changed = False
+        if walls is not self.walls:
+            self.attach(walls)
+            changed = True
+        live = set(sensors)
+        for sensor in [s for s in self.stamps if s not in live]:
+            self.remove(sensor)
+            changed = True
+
+        for sensor in sensors:
+            key = fov_key(sensor) + (sensor.is_enabled,)
+            entry = self.stamps.get(sensor)
+            if entry is not None and entry[0] == key:
+                continue
+            if entry is not None:
+                self.remove(sensor)
+            stamp = self.stamp(sensor)
+            if stamp is not None:
+                rows, cols, mask = stamp
+                self.counts[rows, cols] += mask
+            self.stamps[sensor] = (key, stamp)
+            changed = True
+        return changed
+
+    def remove(self, sensor):
+        _, stamp = self.stamps.pop(sensor)
+        if stamp is not None:
+            rows, cols, mask = stamp
+            self.counts[rows, cols] -= mask
+
+    def image(self):
+        # Semi-transparent RGBA overlay at canvas scale
+        rgba = HEATMAP_COLORS[np.minimum(self.counts, len(HEATMAP_COLORS) - 1)]
+        image = Image.fromarray(rgba)
+        size = (int(round(self.cols * self.cell_size)), int(round(self.rows * self.cell_size)))
+        return image.resize(size, Image.NEAREST)
@@ -0,0 +1,180 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+POLL_INTERVAL = 15  # Milliseconds between checks for finished plans in Tk mode
+
+PLANNING = "planning"
+FLYING = "flying"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class Mission:
+    def __init__(self, sensor_names, priority=0):
+        self.sensor_names = list(sensor_names)
+        self.priority = priority
+        self.state = PLANNING
+        self.route = None  # GPS points in flying order
+        self.paths = None  # Waypoints of each leg, None for unreachable points
+        self.cancelled = threading.Event()  # Checked by the planner between legs
+        self.future = None  # The planner's result in Tk mode
+        self.drone = None  # Drone the route is planned for
+        self.error = None  # Why planning failed
+
+    def cancel(self):
+        self.cancelled.set()
+        self.state = CANCELLED
+
+
+class MissionRunner:
+    def __init__(self, simulator):
+        # Drone missions for the triggered sensors. Planning (route plus the A* path of every
+        # leg) is the slow part; with a Tk root attached it runs on a worker thread and the
+        # finished plan is picked up by the main loop, so the UI never waits on it. The flight
+        # itself is advanced by the simulation ticks.
+        self.simulator = simulator
+        self.current = None
+        self.pending = []  # Missions waiting for the drone, highest priority first
+        self.root = None
+        self.executor = None
+        self.polling = False
+        self.on_start = None  # Called with the mission when the drone sets off
+        self.on_fail = None  # Called with the mission when its plan raised
+
+    def attach(self, root):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drone-mission")
+
+    def submit(self, sensor_names, priority=0):
+        # A mission with a higher priority than the one in flight pre-empts it; the pre-empted
+        # one goes back in the queue and is replanned from wherever the drone is when it resumes
+        mission = Mission(sensor_names, priority)
+        current = self.current
+        if current is None:
+            self.launch(mission)
+        elif priority > current.priority:
+            current.cancel()
+            self.queue(Mission(current.sensor_names, current.priority))
+            self.launch(mission)
+        else:
+            self.queue(mission)
+        return mission
+
+    def queue(self, mission):
+        index = next((i for i, waiting in enumerate(self.pending) if waiting.priority < mission.priority), len(self.pending))
+        self.pending.insert(index, mission)
+
+    def cancel(self):
+        # Drop every mission and stop the drone where it is
+        for mission in [self.current] + self.pending:
+            if mission is not None:
+                mission.cancel()
+        self.current = None
+        self.pending = []
+        if self.simulator.scene.drone:
+            self.simulator.scene.drone.stop()
+
+    def launch(self, mission):
+        self.current = mission
+        drone = mission.drone = self.simulator.scene.drone
+        if drone is None:
+            # Without a drone nothing can fly; the missions behind it are dropped the same way
+            mission.cancel()
+            self.finish(mission)
+            return
+        if drone.route or drone.path:
+            drone.stop()
+        scene = self.simulator.scene
+        if self.executor is None:
+            try:
+                self.plan(mission, drone.current_location, scene.gps_points, scene.occupancy)
+            except Exception as error:
+                self.fail(mission, error)
+                return
+            self.fly(mission)
+            return
+        # The worker gets its own copy of the GPS points and the occupancy grid, since the
+        # main thread keeps editing the scene while it plans
+        gps_points = {name: list(scene.gps_points.get(name, ())) for name in mission.sensor_names}
+        mission.future = self.executor.submit(self.plan, mission, drone.current_location, gps_points,
+                                              scene.occupancy.snapshot())
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_INTERVAL, self.poll)
+
+    def plan(self, mission, start, gps_points, occupancy):
+        # Worker thread: fills in the mission from the points and grid it was given and
+        # returns the grid, whose path cache now holds the legs
+        route = self.simulator.route_planner.route(gps_points, mission.sensor_names, start)
+        paths = []
+        position = start
+        for point in route:
+            if mission.cancelled.is_set():
+                return occupancy
+            path = occupancy.find_path(position, point)
+            paths.append(path)
+            if path is not None:
+                position = point
+        mission.route, mission.paths = route, paths
+        return occupancy
+
+    def poll(self):
+        # Main thread: start the drone once the current mission's plan is finished, or move
+        # on to the next mission if planning raised
+        mission = self.current
+        if mission is not None and mission.state == PLANNING and mission.future.done():
+            error = mission.future.exception()
+            if error is not None:
+                self.fail(mission, error)
+            else:
+                self.simulator.scene.occupancy.merge_paths(mission.future.result())
+                self.fly(mission)
+        if self.current is not None and self.current.state == PLANNING:
+            self.root.after(POLL_INTERVAL, self.poll)
+        else:
+            self.polling = False
+
+    def finish(self, mission):
+        # Take a mission that is done, failed or cancelled off the drone and start the next one
+        if mission is self.current:
+            self.current = None
+        if self.current is None and self.pending:
+            self.launch(self.pending.pop(0))
+
+    def fail(self, mission, error):
+        mission.state = FAILED
+        mission.error = error
+        if self.on_fail:
+            self.on_fail(mission)
+        self.finish(mission)
+
+    def fly(self, mission):
+        if mission.cancelled.is_set():
+            return
+        drone = self.simulator.scene.drone
+        if drone is None:
+            # The drone was deleted while the route was planned
+            mission.cancel()
+            self.finish(mission)
+            return
+        if drone is not mission.drone:
+            # A different drone was added meanwhile; plan again from where it is
+            mission.cancel()
+            self.launch(Mission(mission.sensor_names, mission.priority))
+            return
+        mission.state = FLYING
+        self.simulator.scene.drone.start_route(mission.route, self.simulator.scene.intruders, mission.paths)
+        if self.on_start:
+            self.on_start(mission)
+
+    def advance(self, dt):
+        # Simulation tick: move the drone and start the next mission when this one is flown
+        drone = self.simulator.scene.drone
+        if drone is None:
+            return
+        drone.advance(dt, self.simulator.scene.occupancy)
+        if self.current is not None and self.current.state == FLYING and drone.idle:
+            self.current.state = DONE
+            self.finish(self.current)
@@ -0,0 +1,216 @@
+import heapq
+import math
+
+import numpy as np
+from PIL import Image
+
+from walls import segment_distance
+
+
+CELL_SIZE = 10  # Pixels per occupancy cell
+WALL_CLEARANCE = 10  # Pixels the drone keeps away from walls
+SUBSAMPLES = 4  # Blueprint pixels sampled per cell side
+DARK_THRESHOLD = 96  # 0-255 darkness above which a blueprint pixel counts as a wall line
+
+NEIGHBOURS = [(-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+              (-1, -1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (1, 1, math.sqrt(2))]
+
+
+class OccupancyGrid:
+    def __init__(self, bounds=(0, 0, 1980, 1080), cell_size=CELL_SIZE, clearance=WALL_CLEARANCE):
+        # blocked[row, col] is True where the drone can't fly: dark blueprint lines, or cells
+        # within clearance of a wall. Walls are counted per cell so a removed wall only
+        # clears the cells no other wall still covers.
+        self.bounds = bounds
+        self.cell_size = cell_size
+        self.clearance = clearance
+        self.cols = max(1, math.ceil((bounds[2] - bounds[0]) / cell_size))
+        self.rows = max(1, math.ceil((bounds[3] - bounds[1]) / cell_size))
+        self.wall_counts = np.zeros((self.rows, self.cols), dtype=np.int32)
+        self.blueprint = np.zeros((self.rows, self.cols), dtype=bool)
+        self.blocked = np.zeros((self.rows, self.cols), dtype=bool)
+        self.wall_stamps = {}  # Segment id -> flat indices of the cells it blocks
+        self.paths = {}  # (start cell, goal cell) -> (cells the path crosses, waypoint cells)
+        self.walls = None
+        self.version = 0  # Bumped whenever blocked changes
+
+    def attach(self, walls):
+        # Follow a WallSet, stamping its current walls and every later edit
+        if self.walls is not None:
+            self.walls.listeners.remove(self.wall_changed)
+            for segment_id in list(self.wall_stamps):
+                self.wall_changed(segment_id, None, False)
+        self.walls = walls
+        walls.listeners.append(self.wall_changed)
+        for segment_id, segment in walls.segments():
+            self.wall_changed(segment_id, segment, True)
+
+    def wall_changed(self, segment_id, segment, added):
+        if added:
+            cells = self.wall_stamps[segment_id] = self.segment_cells(*segment)
+            np.add.at(self.wall_counts.ravel(), cells, 1)
+            # Only paths through the new wall's cells are affected
+            touched = set(cells.tolist())
+            for key in [key for key, (crossed, _) in self.paths.items() if not touched.isdisjoint(crossed)]:
+                self.paths.pop(key, None)
+        else:
+            cells = self.wall_stamps.pop(segment_id)
+            np.subtract.at(self.wall_counts.ravel(), cells, 1)
+            self.paths.clear()  # Removing a wall can open a shorter path anywhere
+        self.blocked.ravel()[cells] = (self.wall_counts.ravel()[cells] > 0) | self.blueprint.ravel()[cells]
+        self.version += 1
+
+    def segment_cells(self, x0, y0, x1, y1):
+        # Flat indices of the cells within clearance of the segment, counting any cell it touches
+        reach = self.clearance + self.cell_size * math.sqrt(0.5)
+        col_start = max(0, int((min(x0, x1) - reach - self.bounds[0]) // self.cell_size))
+        col_end = min(self.cols - 1, int((max(x0, x1) + reach - self.bounds[0]) // self.cell_size))
+        row_start = max(0, int((min(y0, y1) - reach - self.bounds[1]) // self.cell_size))
+        row_end = min(self.rows - 1, int((max(y0, y1) + reach - self.bounds[1]) // self.cell_size))
+        if col_start > col_end or row_start > row_end:
+            return np.zeros(0, dtype=np.intp)
+        cols = np.arange(col_start, col_end + 1)
+        rows = np.arange(row_start, row_end + 1)
+        center_x = (self.bounds[0] + (cols + 0.5) * self.cell_size)[None, :]
+        center_y = (self.bounds[1] + (rows + 0.5) * self.cell_size)[:, None]
+        near = segment_distance(center_x, center_y, x0, y0, x1, y1) <= reach
+        row_index, col_index = np.nonzero(near)
+        return (rows[row_index] * self.cols + cols[col_index]).astype(np.intp)
+
+    def load_blueprint(self, image, position=(0, 0), size=None):
+        # Mark the cells holding dark lines of the blueprint as drawn at position and size on
+        # the canvas. Each cell keeps the darkest of its SUBSAMPLES x SUBSAMPLES samples so thin
+        # wall lines survive the downscale.
+        self.blueprint[:] = False
+        if image is not None:
+            size = size or image.size
+            sample_width = max(1, round(size[0] / self.cell_size * SUBSAMPLES))
+            sample_height = max(1, round(size[1] / self.cell_size * SUBSAMPLES))
+            gray = image.convert("L").resize((sample_width, sample_height), Image.BOX)
+            darkness = 255 - np.asarray(gray, dtype=np.int16)
+
+            sample_x = position[0] + (np.arange(sample_width) + 0.5) * size[0] / sample_width
+            sample_y = position[1] + (np.arange(sample_height) + 0.5) * size[1] / sample_height
+            cols = ((sample_x - self.bounds[0]) // self.cell_size).astype(np.intp)
+            rows = ((sample_y - self.bounds[1]) // self.cell_size).astype(np.intp)
+            col_keep = (cols >= 0) & (cols < self.cols)
+            row_keep = (rows >= 0) & (rows < self.rows)
+            cell_darkness = np.zeros((self.rows, self.cols), dtype=np.int16)
+            np.maximum.at(cell_darkness, (rows[row_keep][:, None], cols[col_keep][None, :]),
+                          darkness[np.ix_(row_keep, col_keep)])
+            self.blueprint = cell_darkness > DARK_THRESHOLD
+        self.blocked = (self.wall_counts > 0) | self.blueprint
+        self.paths.clear()
+        self.version += 1
+
+    def snapshot(self):
+        # Copy of the blocked cells and path cache for a planner thread, which can search it
+        # while the main thread goes on editing walls
+        grid = OccupancyGrid(self.bounds, self.cell_size, self.clearance)
+        grid.blocked = self.blocked.copy()
+        grid.paths = dict(self.paths)
+        grid.version = self.version
+        return grid
+
+    def merge_paths(self, grid):
+        # Keep the paths searched on a snapshot, unless the grid changed since it was taken
+        if grid.version == self.version:
+            self.paths.update(grid.paths)
+
+    def cell_of(self, x, y):
+        col = min(self.cols - 1, max(0, int((x - self.bounds[0]) // self.cell_size)))
+        row = min(self.rows - 1, max(0, int((y - self.bounds[1]) // self.cell_size)))
+        return row * self.cols + col
+
+    def cell_center(self, cell):
+        row, col = divmod(cell, self.cols)
+        return (self.bounds[0] + (col + 0.5) * self.cell_size, self.bounds[1] + (row + 0.5) * self.cell_size)
+
+    def find_path(self, start, goal):
+        # Canvas waypoints from start to goal around blocked cells, or None if unreachable.
+        # Searches are cached per (start cell, goal cell).
+        key = (self.cell_of(*start), self.cell_of(*goal))
+        entry = self.paths.get(key)
+        if entry is None:
+            cells = self.search(*key)
+            if cells is None:
+                return None
+            waypoints = self.smooth(cells)
+            crossed = frozenset(cell for a, b in zip(waypoints, waypoints[1:]) for cell in self.line_cells(a, b).tolist())
+            entry = self.paths[key] = (crossed, waypoints)
+        waypoints = [self.cell_center(cell) for cell in entry[1][1:-1]]
+        return waypoints + [tuple(goal)]
+
+    def search(self, start, goal):
+        # A* over 8-connected cells with an octile heuristic; diagonal steps may not cut
+        # the corner of a blocked cell. Start and goal are always passable.
+        blocked = self.blocked.ravel().tolist()
+        blocked[start] = blocked[goal] = False
+        cols, rows = self.cols, self.rows
+        goal_row, goal_col = divmod(goal, cols)
+
+        def heuristic(cell):
+            row, col = divmod(cell, cols)
+            dx, dy = abs(col - goal_col), abs(row - goal_row)
+            return max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)
+
+        cost = {start: 0.0}
+        came_from = {start: None}
+        closed = set()
+        frontier = [(heuristic(start), start)]
+        while frontier:
+            _, cell = heapq.heappop(frontier)
+            if cell in closed:
+                continue
+            closed.add(cell)
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = came_from[cell]
+                return path[::-1]
+            row, col = divmod(cell, cols)
+            for dx, dy, step in NEIGHBOURS:
+                next_col, next_row = col + dx, row + dy
+                if not (0 <= next_col < cols and 0 <= next_row < rows):
+                    continue
+                neighbour = next_row * cols + next_col
+                if blocked[neighbour]:
+                    continue
+                if dx and dy and (blocked[row * cols + next_col] or blocked[next_row * cols + col]):
+                    continue
+                new_cost = cost[cell] + step
+                if new_cost < cost.get(neighbour, math.inf):
+                    cost[neighbour] = new_cost
+                    came_from[neighbour] = cell
+                    heapq.heappush(frontier, (new_cost + heuristic(neighbour), neighbour))
+        return None
+
+    def line_cells(self, a, b):
+        # Flat indices of the cells the straight line between the centers of cells a and b
+        # passes through, sampled at quarter-cell steps
+        (ax, ay), (bx, by) = self.cell_center(a), self.cell_center(b)
+        steps = max(1, int(math.ceil(math.hypot(bx - ax, by - ay) / (self.cell_size / 4))))
+        t = np.linspace(0, 1, steps + 1)
+        cols = ((ax + (bx - ax) * t - self.bounds[0]) // self.cell_size).astype(np.intp)
+        rows = ((ay + (by - ay) * t - self.bounds[1]) // self.cell_size).astype(np.intp)
+        return np.unique(rows * self.cols + cols)
+
+    def line_clear(self, a, b):
+        # True if the line between cells a and b only crosses free cells (a and b themselves
+        # may be blocked, like the start and goal of a search)
+        cells = self.line_cells(a, b)
+        cells = cells[(cells != a) & (cells != b)]
+        return not self.blocked.ravel()[cells].any()
+
+    def smooth(self, cells):
+        # String pulling: from each waypoint skip ahead while the next cell is still in straight sight
+        waypoints = [cells[0]]
+        index = 0
+        while index < len(cells) - 1:
+            furthest = index + 1
+            while furthest + 1 < len(cells) and self.line_clear(cells[index], cells[furthest + 1]):
+                furthest += 1
+            waypoints.append(cells[furthest])
+            index = furthest
+        return waypoints
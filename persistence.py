@@ -0,0 +1,310 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from sensortable import ROW_COLUMNS, SensorTable
+from simulation import Drone, Panel, Scene, Sensor
+
+
+FORMAT_VERSION = 1
+SENSOR_BATCH = 65536  # Sensors materialised per batch by iter_sensors()
+TABLE_MIN_SENSORS = 10_000  # Loaded scenes with this many sensors keep them in an in-memory SensorTable
+JSON_CHUNK = 1 << 20  # Characters read at a time when streaming a JSON scene
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+SEPARATOR = re.compile(r"[ \t\r\n]*([,\]])[ \t\r\n]*")
+
+
+class SceneFile:
+    def __init__(self, path):
+        # Binary scene saved by save_scene(). Arrays are only read from the archive when
+        # first accessed, so e.g. the blueprint transform can be read without the sensors.
+        self.path = path
+        self.archive = np.load(path, allow_pickle=False)
+        if int(self.archive["version"]) > FORMAT_VERSION:
+            raise ValueError(f"{path} was written by a newer version (format {int(self.archive['version'])})")
+
+    def __getitem__(self, name):
+        return self.archive[name]
+
+    def __contains__(self, name):
+        return name in self.archive.files
+
+    def close(self):
+        self.archive.close()
+
+    @property
+    def sensor_count(self):
+        return len(self.archive["sensor_x"])
+
+    def blueprint(self):
+        # {"path", "x", "y", "width", "height"} or None
+        if "blueprint_path" not in self:
+            return None
+        x, y, width, height = self.archive["blueprint_transform"].tolist()
+        return {"path": str(self.archive["blueprint_path"]), "x": x, "y": y, "width": width, "height": height}
+
+    def scene(self):
+        scene = Scene(int(self.archive["seed"]) if "seed" in self else None)
+        if "sensor_table" in self:
+            # Sensors live in a memory-mapped table next to the scene
+            scene.attach_table(SensorTable(str(self.archive["sensor_table"])))
+        else:
+            add_sensors(scene, {name: self.archive[f"sensor_{name}"] for name in ROW_COLUMNS},
+                        self.archive["sensor_name"].tolist())
+        scene.intruders.add_many(self.archive["intruder_x"], self.archive["intruder_y"])
+        if "drone" in self:
+            scene.drone = Drone(*self.archive["drone"].tolist())
+        if "panel" in self:
+            scene.panel = Panel(*self.archive["panel"].tolist())
+        for segment in self.archive["walls"].tolist():
+            scene.walls.add_segment(*segment)
+
+        points = [tuple(point) for point in self.archive["gps_points"].tolist()]
+        offsets = np.cumsum(self.archive["gps_counts"]).tolist()
+        for name, start, end in zip(self.archive["gps_names"].tolist(), [0] + offsets, offsets):
+            scene.gps_points[name] = points[start:end]
+        return scene
+
+
+def iter_sensors(columns, names, batch=SENSOR_BATCH):
+    # Sensor objects, built batch by batch from column arrays (see ROW_COLUMNS) and names
+    arrays = [columns[name] for name in ROW_COLUMNS]
+    for start in range(0, len(names), batch):
+        for x, y, angle, detection_range, detection_angle, enabled, priority, name in zip(
+                *(array[start:start + batch].tolist() for array in arrays), names[start:start + batch]):
+            sensor = Sensor(x, y, angle=angle, detection_angle=detection_angle, is_enabled=enabled, name=name)
+            sensor.detection_range = detection_range  # Meters, stored as-is
+            sensor.priority = priority
+            yield sensor
+
+
+def add_sensors(scene, columns, names):
+    # Give a loaded scene its sensors. Big ones stay as columns in an in-memory SensorTable,
+    # so Sensor objects (and hit-test entries) are only made for the rows on screen.
+    if len(names) >= TABLE_MIN_SENSORS:
+        scene.attach_table(SensorTable.from_columns(None, columns, names))
+        return
+    for sensor in iter_sensors(columns, names):
+        scene.add_sensor(sensor)
+
+
+def sensor_columns(sensors):
+    # Column arrays (see ROW_COLUMNS) of a list of sensors
+    count = len(sensors)
+    return {
+        "x": np.fromiter((s.x for s in sensors), dtype=float, count=count),
+        "y": np.fromiter((s.y for s in sensors), dtype=float, count=count),
+        "angle": np.fromiter((s.angle for s in sensors), dtype=float, count=count),
+        "range": np.fromiter((s.detection_range for s in sensors), dtype=float, count=count),
+        "fov": np.fromiter((s.detection_angle for s in sensors), dtype=float, count=count),
+        "enabled": np.fromiter((bool(s.is_enabled) for s in sensors), dtype=bool, count=count),
+        "priority": np.fromiter((s.priority for s in sensors), dtype=np.int32, count=count),
+    }
+
+
+def save_binary(path, scene, blueprint=None):
+    # Column arrays in an uncompressed .npz; no pickled objects. A scene backed by a
+    # SensorTable on disk only records the table's path.
+    table = scene.table
+    if table is None:
+        columns, names = sensor_columns(scene.sensors), [s.name for s in scene.sensors]
+    elif table.path is None:
+        table.store_all()
+        columns, names = {name: table.column(name) for name in ROW_COLUMNS}, table.all_names()
+    else:
+        columns, names = sensor_columns([]), []
+    arrays = {
+        "version": np.array(FORMAT_VERSION),
+        "seed": np.array(scene.seed, dtype=np.uint64),
+        "sensor_name": np.array(names, dtype=str) if names else np.zeros(0, dtype="<U1"),
+        "intruder_x": np.array(scene.intruders.x),
+        "intruder_y": np.array(scene.intruders.y),
+        "walls": np.array([segment for _, segment in scene.walls.segments()], dtype=float).reshape(-1, 4),
+        "gps_names": np.array(list(scene.gps_points), dtype=str) if scene.gps_points else np.zeros(0, dtype="<U1"),
+        "gps_counts": np.array([len(points) for points in scene.gps_points.values()], dtype=np.int64),
+        "gps_points": np.array([p for points in scene.gps_points.values() for p in points], dtype=float).reshape(-1, 2),
+    }
+    for name, column in columns.items():
+        arrays[f"sensor_{name}"] = column
+    if table is not None and table.path is not None:
+        table.store_all()
+        table.flush()
+        arrays["sensor_table"] = np.array(os.path.abspath(table.path))
+    if scene.drone:
+        arrays["drone"] = np.array(scene.drone.current_location, dtype=float)
+    if scene.panel:
+        arrays["panel"] = np.array((scene.panel.x, scene.panel.y), dtype=float)
+    if blueprint:
+        arrays["blueprint_path"] = np.array(blueprint["path"])
+        arrays["blueprint_transform"] = np.array((blueprint["x"], blueprint["y"], blueprint["width"], blueprint["height"]), dtype=float)
+    np.savez(path, **arrays)
+
+
+def save_json(path, scene, blueprint=None):
+    # setup.json schema. Sensors are written one line at a time instead of building one
+    # huge string.
+    data = scene.to_dict()
+    sensors = data.pop("sensors")
+    if blueprint:
+        data["blueprint"] = blueprint
+    with open(path, "w") as f:
+        f.write('{"sensors": [')
+        for index, sensor in enumerate(sensors):
+            f.write(",\n" if index else "\n")
+            json.dump(sensor, f)
+        f.write("\n]")
+        for key, value in data.items():
+            f.write(f", {json.dumps(key)}: ")
+            json.dump(value, f)
+        f.write("}\n")
+
+
+def save_scene(path, scene, blueprint=None):
+    # .json writes the setup.json schema, anything else the binary format
+    if os.path.splitext(path)[1].lower() == ".json":
+        save_json(path, scene, blueprint)
+    else:
+        save_binary(path, scene, blueprint)
+
+
+class JsonStream:
+    def __init__(self, f, chunk=JSON_CHUNK):
+        # Decodes a JSON document a value at a time from a buffer refilled from the file as
+        # needed, so a big file is never held in memory whole
+        self.file = f
+        self.chunk = chunk
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        # Drop the consumed text and read more; a value that doesn't fit doubles the read
+        data = self.file.read(max(self.chunk, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        self.eof = not data
+        return bool(data)
+
+    def peek(self):
+        # Next non-whitespace character, "" at the end of the file
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON scene, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        # The value must be followed by more text (or the end of the file), so a number cut
+        # off at the end of the buffer isn't taken as complete
+        if self.pos >= len(self.buffer) or self.buffer[self.pos] in " \t\r\n":
+            self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def items(self):
+        # Values of the array that starts at the next character, one at a time
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            # Fast path: the separator and the start of the next item are already buffered
+            separator = SEPARATOR.match(self.buffer, self.pos)
+            if separator and separator.end() < len(self.buffer):
+                self.pos = separator.end()
+                if separator.group(1) == "]":
+                    return
+                continue
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON scene, found {char!r}")
+
+
+def add_sensor_items(columns, names, items):
+    # setup.json sensor objects onto column lists, with Scene.from_dict's defaults
+    columns["x"].extend([item["x"] for item in items])
+    columns["y"].extend([item["y"] for item in items])
+    for name, field, default in (("angle", "angle", 0), ("range", "detection_range", 0), ("fov", "detection_angle", 0),
+                                 ("enabled", "is_enabled", False), ("priority", "priority", 0)):
+        columns[name].extend([item.get(field, default) for item in items])
+    names.extend([item.get("name", "") for item in items])
+
+
+def load_json(path):
+    # setup.json schema, streamed: each sensor object goes straight into column lists and
+    # the rest of the document is decoded as usual
+    columns = {name: [] for name in ROW_COLUMNS}
+    names = []
+    data = {}
+    with open(path) as f:
+        stream = JsonStream(f)
+        stream.expect("{")
+        while stream.peek() != "}":
+            if data or names:
+                stream.expect(",")
+            key = stream.value()
+            stream.expect(":")
+            if key != "sensors" or stream.peek() != "[":
+                data[key] = stream.value()
+                continue
+            # Columns are filled a batch of sensors at a time
+            batch = []
+            for item in stream.items():
+                batch.append(item)
+                if len(batch) == SENSOR_BATCH:
+                    add_sensor_items(columns, names, batch)
+                    batch = []
+            add_sensor_items(columns, names, batch)
+            data.setdefault("sensors", [])
+        stream.expect("}")
+
+    scene = Scene.from_dict(data)
+    add_sensors(scene, {"x": np.array(columns["x"], dtype=float), "y": np.array(columns["y"], dtype=float),
+                        "angle": np.array(columns["angle"], dtype=float),
+                        "range": np.array(columns["range"], dtype=float),
+                        "fov": np.array(columns["fov"], dtype=float),
+                        "enabled": np.array(columns["enabled"], dtype=bool),
+                        "priority": np.array(columns["priority"], dtype=np.int32)}, names)
+    return scene, data.get("blueprint")
+
+
+def table_directory(path):
+    # The SensorTable directory at path, given as the directory or its table.json, else None
+    directory = os.path.dirname(path) if os.path.basename(path) == "table.json" else path
+    return directory if os.path.isfile(os.path.join(directory, "table.json")) else None
+
+
+def load_scene(path):
+    # Returns (scene, blueprint transform or None). A sensor table directory (or its
+    # table.json) loads as a scene backed by that table, with no other objects.
+    directory = table_directory(path)
+    if directory is not None:
+        scene = Scene()
+        scene.attach_table(SensorTable(directory))
+        return scene, None
+    if os.path.splitext(path)[1].lower() == ".json":
+        return load_json(path)
+    scene_file = SceneFile(path)
+    try:
+        return scene_file.scene(), scene_file.blueprint()
+    finally:
+        scene_file.close()
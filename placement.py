@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection import PIXELS_PER_METER, SENSOR_OFFSET
+from simulation import Scene, Sensor
+from walls import WallSet
+
+
+SAMPLE_SPACING = 25  # Pixels between the demand points coverage is scored on
+POSITION_SPACING = 50  # Pixels between candidate sensor positions
+HEADINGS = 8  # Candidate headings per position
+CHUNK_CANDIDATES = 512  # Candidate poses scored per worker task
+BIT_COUNTS = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)  # Set bits per byte
+
+
+class Placement:
+    def __init__(self, x, y, angles, covered, samples):
+        # Chosen poses; x/y are detection points (bottom center of the sensor image)
+        self.x = x
+        self.y = y
+        self.angles = angles  # Degrees
+        self.covered = covered  # Demand points seen by at least one chosen sensor
+        self.samples = samples
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def fraction(self):
+        return self.covered / self.samples if self.samples else 0.0
+
+    def sensors(self, detection_range, detection_angle):
+        sensors = []
+        for index, (x, y, angle) in enumerate(zip(self.x, self.y, self.angles)):
+            sensor = Sensor(x - SENSOR_OFFSET[0], y - SENSOR_OFFSET[1], angle=angle,
+                            detection_angle=detection_angle, is_enabled=True, name=f"Sensor {index + 1}")
+            sensor.detection_range = detection_range  # Meters, like the config dialog stores it
+            sensors.append(sensor)
+        return sensors
+
+
+def lattice(bounds, spacing):
+    # Cell centers of a regular grid over bounds (x0, y0, x1, y1)
+    x0, y0, x1, y1 = bounds
+    xs = np.arange(x0 + spacing / 2, x1, spacing)
+    ys = np.arange(y0 + spacing / 2, y1, spacing)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return grid_x.ravel(), grid_y.ravel()
+
+
+def candidate_poses(bounds, spacing=POSITION_SPACING, headings=HEADINGS):
+    x, y = lattice(bounds, spacing)
+    angles = np.arange(headings) * (360 / headings)
+    return np.repeat(x, headings), np.repeat(y, headings), np.tile(angles, len(x))
+
+
+def coverage_rows(cx, cy, angles, px, py, radius, half_angle, segments):
+    # Bit-packed (candidates, ceil(points / 8)) matrix: which demand points each candidate pose
+    # sees. The points are in lattice order (py ascending), so only the band of points within
+    # radius of the candidates' rows is tested. Same range and wedge test as
+    # DetectionEngine.detect, then walls block by line of sight.
+    packed = np.zeros((len(cx), (len(px) + 7) // 8), dtype=np.uint8)
+    if not len(cx):
+        return packed
+    lo = int(np.searchsorted(py, cy.min() - radius, side="left")) // 8 * 8
+    hi = int(np.searchsorted(py, cy.max() + radius, side="right"))
+    if lo >= hi:
+        return packed
+    dx = px[None, lo:hi] - cx[:, None]
+    dy = py[None, lo:hi] - cy[:, None]
+    seen = np.sqrt(dx * dx + dy * dy) <= radius
+    angle_difference = np.abs(np.radians(angles)[:, None] - np.arctan2(dy, dx)) % (2 * math.pi)
+    seen &= angle_difference <= half_angle
+
+    if segments:
+        walls = WallSet()
+        for segment in segments:
+            walls.add_segment(*segment)
+        for row in range(len(cx)):
+            hits = np.flatnonzero(seen[row])
+            if len(hits):
+                blocked = np.isfinite(walls.ray_hits(cx[row], cy[row], px[lo + hits], py[lo + hits]))
+                seen[row, hits[blocked]] = False
+    packed[:, lo // 8:(hi + 7) // 8] = np.packbits(seen, axis=1)
+    return packed
+
+
+def coverage_matrix(cx, cy, angles, px, py, radius, half_angle, segments=(), workers=None):
+    # Scores every candidate pose against the demand points near it, in chunks spread over a
+    # process pool
+    starts = list(range(0, len(cx), CHUNK_CANDIDATES))
+    chunks = [slice(start, start + CHUNK_CANDIDATES) for start in starts]
+    count = len(chunks)
+    segments = list(segments)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 and count > 1 else None
+    chunk_map = pool.map if pool else map
+    try:
+        rows = list(chunk_map(coverage_rows, [cx[c] for c in chunks], [cy[c] for c in chunks],
+                              [angles[c] for c in chunks], [px] * count, [py] * count,
+                              [radius] * count, [half_angle] * count, [segments] * count))
+    finally:
+        if pool:
+            pool.shutdown()
+    return np.concatenate(rows) if rows else np.zeros((0, (len(px) + 7) // 8), dtype=np.uint8)
+
+
+def bit_count(packed):
+    # Set bits along the last axis of a packed matrix
+    return BIT_COUNTS[packed].sum(axis=-1, dtype=np.int64)
+
+
+def union(matrix, rows):
+    # Packed points seen by any of the given poses
+    if not len(rows):
+        return np.zeros(matrix.shape[1], dtype=np.uint8)
+    return np.bitwise_or.reduce(matrix[rows], axis=0)
+
+
+def greedy_cover(matrix, samples, count=None, target=None):
+    # Greedy set cover: keep adding the pose that sees the most still-uncovered points until
+    # count poses are placed or the target fraction is reached
+    chosen = []
+    uncovered = np.packbits(np.ones(samples, dtype=bool))
+    goal = math.ceil(target * samples) if target is not None else None
+    while samples:
+        if count is not None and len(chosen) >= count:
+            break
+        if goal is not None and samples - bit_count(uncovered) >= goal:
+            break
+        gains = bit_count(matrix & uncovered)
+        best = int(np.argmax(gains))
+        if gains[best] == 0:
+            break
+        chosen.append(best)
+        uncovered &= ~matrix[best]
+    return chosen
+
+
+def local_search(matrix, chosen, rounds=10):
+    # Swap a placed pose for the candidate that sees the most points the others miss,
+    # for as long as that improves total coverage
+    chosen = list(chosen)
+    for _ in range(rounds):
+        improved = False
+        for slot in range(len(chosen)):
+            others = [index for position, index in enumerate(chosen) if position != slot]
+            gains = bit_count(matrix & ~union(matrix, others))
+            best = int(np.argmax(gains))
+            if gains[best] > gains[chosen[slot]]:
+                chosen[slot] = best
+                improved = True
+        if not improved:
+            break
+    return chosen
+
+
+def prune(matrix, samples, chosen, target):
+    # Drop poses the target coverage doesn't need, least useful first
+    chosen = list(chosen)
+    goal = math.ceil(target * samples)
+    for index in sorted(chosen, key=lambda i: bit_count(matrix[i])):
+        others = [i for i in chosen if i != index]
+        if others and bit_count(union(matrix, others)) >= goal:
+            chosen = others
+    return chosen
+
+
+def optimise_placement(bounds, detection_range, detection_angle, count=None, target=None, walls=None,
+                       sample_spacing=SAMPLE_SPACING, position_spacing=POSITION_SPACING,
+                       headings=HEADINGS, workers=None):
+    # Proposes poses for sensors of one model (detection_range in meters, detection_angle in
+    # degrees) over bounds in canvas pixels. Give count to place that many sensors for the most
+    # coverage, or target (0..1) to place as few as reach that coverage fraction.
+    if count is None and target is None:
+        raise ValueError("Give a sensor count or a target coverage")
+    workers = workers or max(1, (os.cpu_count() or 1) - 1)  # Leave a core for the UI
+    px, py = lattice(bounds, sample_spacing)
+    cx, cy, angles = candidate_poses(bounds, position_spacing, headings)
+    segments = [segment for _, segment in walls.segments()] if walls is not None else []
+    matrix = coverage_matrix(cx, cy, angles, px, py, detection_range * PIXELS_PER_METER,
+                             math.radians(detection_angle / 2), segments, workers)
+
+    chosen = greedy_cover(matrix, len(px), count, target)
+    chosen = local_search(matrix, chosen)
+    if target is not None:
+        chosen = prune(matrix, len(px), chosen, target)
+    covered = int(bit_count(union(matrix, chosen)))
+    return Placement(cx[chosen].tolist(), cy[chosen].tolist(), angles[chosen].tolist(), covered, len(px))
+
+
+if __name__ == "__main__":
+    # python placement.py setup.json count|target range angle, e.g. 6 or 0.9
+    path = sys.argv[1] if len(sys.argv) > 1 else "setup.json"
+    goal = float(sys.argv[2]) if len(sys.argv) > 2 else 0.9
+    detection_range = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    detection_angle = float(sys.argv[4]) if len(sys.argv) > 4 else 90
+    with open(path) as f:
+        scene = Scene.from_dict(json.load(f))
+    placement = optimise_placement((0, 0, 1980, 1080), detection_range, detection_angle,
+                                   count=int(goal) if goal >= 1 else None,
+                                   target=goal if goal < 1 else None, walls=scene.walls)
+    print(f"{len(placement)} sensors, coverage {placement.fraction:.2%}")
+    for x, y, angle in zip(placement.x, placement.y, placement.angles):
+        print(f"  ({x:.0f}, {y:.0f}) heading {angle:.0f}")
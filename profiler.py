@@ -0,0 +1,115 @@
+import json
+import os
+import time
+from collections import deque
+
+
+MAX_EVENTS = 500_000  # Trace events kept in memory, oldest dropped first
+WINDOW = 300  # Frames and handler calls the statistics are computed over
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FrameProfiler:
+    def __init__(self):
+        # Opt-in timing of the redraw path. The app never calls into the profiler itself:
+        # instrument() swaps a timing wrapper in for a method on one object and restore()
+        # takes them all out again, so there is no cost at all while profiling is off.
+        #   "frame"   outermost call is one frame (nested frames are phases of it)
+        #   "phase"   one trace event per call, e.g. check_alarm or the sensor update
+        #   "total"   called many times per frame (FOV polygons); summed into a per-frame counter
+        #   "handler" event handler latency
+        self.events = deque(maxlen=MAX_EVENTS)  # Chrome trace events, timestamps in microseconds
+        self.frame_times = deque(maxlen=WINDOW)  # Seconds
+        self.frame_ends = deque(maxlen=WINDOW)  # perf_counter() when each frame finished
+        self.handler_times = {}  # Handler name -> deque of seconds
+        self.totals = {}  # "total" name -> [seconds, calls] in the current frame
+        self.patched = []  # (object, attribute) pairs holding a wrapper
+        self.frame_depth = 0
+        self.origin = time.perf_counter()
+        self.counters = None  # Returns {name: value}, sampled at the end of every frame
+        self.on_frame = None  # Called after every frame, e.g. to refresh an overlay
+
+    def instrument(self, owner, name, label=None, kind="phase"):
+        original = getattr(owner, name)
+        label = label or name
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            if kind == "frame":
+                self.frame_depth += 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                ended = time.perf_counter()
+                if kind == "frame":
+                    self.frame_depth -= 1
+                self.record(label, kind, started, ended)
+
+        setattr(owner, name, timed)
+        self.patched.append((owner, name))
+        return timed
+
+    def restore(self):
+        # Put the original methods back; the wrappers live in the instances' __dict__
+        for owner, name in reversed(self.patched):
+            delattr(owner, name)
+        self.patched = []
+        self.frame_depth = 0
+        self.totals = {}
+
+    def record(self, label, kind, started, ended):
+        if kind == "total":
+            total = self.totals.setdefault(label, [0.0, 0])
+            total[0] += ended - started
+            total[1] += 1
+            return
+        self.events.append({"name": label, "cat": kind, "ph": "X", "pid": os.getpid(), "tid": 0,
+                            "ts": (started - self.origin) * 1e6, "dur": (ended - started) * 1e6})
+        if kind == "handler":
+            self.handler_times.setdefault(label, deque(maxlen=WINDOW)).append(ended - started)
+        elif kind == "frame" and self.frame_depth == 0:
+            self.end_frame(started, ended)
+
+    def end_frame(self, started, ended):
+        self.frame_times.append(ended - started)
+        self.frame_ends.append(ended)
+        ts = (ended - self.origin) * 1e6
+        for label, (seconds, calls) in self.totals.items():
+            self.events.append({"name": label, "ph": "C", "pid": os.getpid(), "ts": ts,
+                                "args": {"ms": seconds * 1000, "calls": calls}})
+        self.totals = {}
+        if self.counters:
+            self.events.append({"name": "canvas items", "ph": "C", "pid": os.getpid(), "ts": ts, "args": self.counters()})
+        if self.on_frame:
+            self.on_frame()
+
+    def fps(self):
+        # Frames per second over the last WINDOW frames
+        if len(self.frame_ends) < 2:
+            return 0.0
+        span = self.frame_ends[-1] - self.frame_ends[0]
+        return (len(self.frame_ends) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        # Overlay lines: FPS, frame time and handler latency percentiles in ms
+        lines = [f"{self.fps():.1f} FPS   frame p50 {percentile(self.frame_times, 0.5) * 1000:.1f} ms"
+                 f"   p99 {percentile(self.frame_times, 0.99) * 1000:.1f} ms"]
+        for label, times in self.handler_times.items():
+            lines.append(f"{label} p50 {percentile(times, 0.5) * 1000:.1f} ms   p99 {percentile(times, 0.99) * 1000:.1f} ms")
+        if self.counters:
+            counts = self.counters()
+            lines.append(f"{sum(counts.values())} canvas items")
+        return "\n".join(lines)
+
+    def export(self, path):
+        # Chrome trace event format; opens in chrome://tracing or ui.perfetto.dev
+        metadata = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "asim"}},
+                    {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": 0, "args": {"name": "Tk main loop"}}]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}, f)
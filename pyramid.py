@@ -0,0 +1,224 @@
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+# Blueprints with more pixels than this are shown through a TilePyramid
+PYRAMID_MIN_PIXELS = 4096 * 4096
+
+
+def open_large_image(path):
+    # Site plan scans are far beyond PIL's decompression bomb limit
+    max_pixels = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+class TilePyramid:
+    def __init__(self, path, tile_size=256, max_tiles=256):
+        # Multi-resolution tile pyramid for a blueprint image. Level 0 is full resolution and
+        # every next level halves it. Tiles are generated lazily, stored on disk next to the
+        # image and at most max_tiles decoded tiles are kept in memory. build() makes every
+        # tile ahead of time, e.g. on a worker thread while the UI shows placeholders.
+        self.path = path
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()  # (level, col, row) -> PIL image, least recently used first
+        self.lock = threading.Lock()  # Guards tiles, which the UI and a builder thread share
+        self.progress = 0.0  # Fraction of the tiles build() has made
+        self.cancelled = False
+
+        # Only the header is read here; pixel data is decoded when a tile is needed
+        with open_large_image(path) as image:
+            self.width, self.height = image.size
+            self.mode = "RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB"
+
+        self.levels = 1
+        while max(self.level_size(self.levels - 1)) > tile_size:
+            self.levels += 1
+
+        self.tile_count = sum(cols * rows for cols, rows in map(self.grid_size, range(self.levels)))
+        self.cache_dir = f"{path}.tiles"
+        self.prepare_cache_dir()
+        self.complete = os.path.exists(os.path.join(self.cache_dir, "complete"))
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def prepare_cache_dir(self):
+        # Throw away tiles that were cut from a different version of the image
+        stat = os.stat(self.path)
+        info = {"size": [self.width, self.height], "mtime": stat.st_mtime, "bytes": stat.st_size,
+                "tile_size": self.tile_size}
+        info_path = os.path.join(self.cache_dir, "info.json")
+        try:
+            with open(info_path) as f:
+                if json.load(f) == info:
+                    return
+        except (OSError, ValueError):
+            pass
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(info_path, "w") as f:
+            json.dump(info, f)
+
+    def level_size(self, level):
+        scale = 2 ** level
+        return (max(1, math.ceil(self.width / scale)), max(1, math.ceil(self.height / scale)))
+
+    def grid_size(self, level):
+        width, height = self.level_size(level)
+        return (math.ceil(width / self.tile_size), math.ceil(height / self.tile_size))
+
+    def tile_path(self, level, col, row):
+        return os.path.join(self.cache_dir, str(level), f"{col}_{row}.png")
+
+    def get_tile(self, level, col, row, build=True):
+        # The tile, built first if it isn't on disk yet; with build False, None instead
+        key = (level, col, row)
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+
+        path = self.tile_path(level, col, row)
+        if not os.path.exists(path):
+            if not build:
+                return None
+            if level == 0:
+                self.build_base_level()
+            else:
+                self.build_tile(level, col, row)
+        with Image.open(path) as image:
+            tile = image.copy()
+        return self.remember(key, tile)
+
+    def remember(self, key, tile):
+        with self.lock:
+            self.tiles[key] = tile
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return tile
+
+    def save_tile(self, tile, level, col, row):
+        # Written under a temporary name and renamed, so a reader never sees half a tile
+        path = self.tile_path(level, col, row)
+        tile.save(path + ".tmp", format="PNG")
+        os.replace(path + ".tmp", path)
+
+    def build(self):
+        # Make every tile of every level, finest first, updating progress as it goes. Tiles
+        # already on disk are kept; returns early if cancel() is called.
+        cols, rows = self.grid_size(0)
+        if not os.path.exists(self.tile_path(0, cols - 1, rows - 1)):
+            self.build_base_level()
+        done = cols * rows
+        for level in range(1, self.levels):
+            cols, rows = self.grid_size(level)
+            for row in range(rows):
+                for col in range(cols):
+                    if self.cancelled:
+                        return
+                    if not os.path.exists(self.tile_path(level, col, row)):
+                        self.build_tile(level, col, row)
+                    done += 1
+                    self.progress = done / self.tile_count
+        if not self.cancelled:
+            open(os.path.join(self.cache_dir, "complete"), "w").close()
+            self.progress = 1.0
+            self.complete = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def build_base_level(self):
+        # Cut the full-resolution image into tiles in one pass so the source is decoded once;
+        # every coarser level is then built from tiles on disk. The source stays in its own
+        # mode (scans are often grayscale or palette) and only one horizontal strip of tiles
+        # at a time is converted, instead of a converted copy of the whole image.
+        os.makedirs(os.path.join(self.cache_dir, "0"), exist_ok=True)
+        cols, rows = self.grid_size(0)
+        with open_large_image(self.path) as source:
+            source.draft(self.mode, source.size)  # JPEG decodes straight to the tile mode
+            for row in range(rows):
+                if self.cancelled:
+                    return
+                top = row * self.tile_size
+                strip = source.crop((0, top, self.width, min(top + self.tile_size, self.height))).convert(self.mode)
+                for col in range(cols):
+                    box = (col * self.tile_size, 0, min((col + 1) * self.tile_size, self.width), strip.height)
+                    self.save_tile(strip.crop(box), 0, col, row)
+                self.progress = (row + 1) * cols / self.tile_count
+
+    def build_tile(self, level, col, row):
+        # Merge the four child tiles of the previous level and halve the result
+        width, height = self.level_size(level)
+        tile_width = min(self.tile_size, width - col * self.tile_size)
+        tile_height = min(self.tile_size, height - row * self.tile_size)
+        child_cols, child_rows = self.grid_size(level - 1)
+
+        merged = Image.new(self.mode, (tile_width * 2, tile_height * 2))
+        for dy in range(2):
+            for dx in range(2):
+                child_col, child_row = col * 2 + dx, row * 2 + dy
+                if child_col < child_cols and child_row < child_rows:
+                    child = self.get_tile(level - 1, child_col, child_row)
+                    merged.paste(child, (dx * self.tile_size, dy * self.tile_size))
+
+        os.makedirs(os.path.join(self.cache_dir, str(level)), exist_ok=True)
+        self.save_tile(merged.resize((tile_width, tile_height), Image.BOX), level, col, row)
+
+    def level_image(self, level):
+        # The whole of one level pasted together, e.g. a coarse overview of the scan
+        image = Image.new(self.mode, self.level_size(level))
+        cols, rows = self.grid_size(level)
+        for row in range(rows):
+            for col in range(cols):
+                image.paste(self.get_tile(level, col, row), (col * self.tile_size, row * self.tile_size))
+        return image
+
+    def level_for_scale(self, scale):
+        # Coarsest level that still has at least one source pixel per screen pixel
+        if scale <= 0:
+            return self.levels - 1
+        return max(0, min(self.levels - 1, int(math.floor(math.log2(1 / scale)))))
+
+    def visible_tiles(self, position, size, viewport):
+        # Tiles intersecting the viewport (x0, y0, x1, y1) for a blueprint drawn at position
+        # with the given on-screen size. Yields (level, col, row, canvas box).
+        scale_x = size[0] / self.width
+        scale_y = size[1] / self.height
+        level = self.level_for_scale(min(scale_x, scale_y))
+        level_scale = 2 ** level
+
+        # Canvas pixels per tile
+        tile_width = self.tile_size * level_scale * scale_x
+        tile_height = self.tile_size * level_scale * scale_y
+
+        cols, rows = self.grid_size(level)
+        col_start = max(0, int((viewport[0] - position[0]) // tile_width))
+        col_end = min(cols, int(math.ceil((viewport[2] - position[0]) / tile_width)))
+        row_start = max(0, int((viewport[1] - position[1]) // tile_height))
+        row_end = min(rows, int(math.ceil((viewport[3] - position[1]) / tile_height)))
+
+        level_width, level_height = self.level_size(level)
+        for row in range(row_start, row_end):
+            for col in range(col_start, col_end):
+                # Round the tile edges so neighbouring tiles meet without seams
+                x0 = position[0] + round(col * tile_width)
+                y0 = position[1] + round(row * tile_height)
+                x1 = position[0] + round(min((col + 1) * self.tile_size, level_width) * level_scale * scale_x)
+                y1 = position[1] + round(min((row + 1) * self.tile_size, level_height) * level_scale * scale_y)
+                if x1 > x0 and y1 > y0:
+                    yield level, col, row, (x0, y0, x1, y1)
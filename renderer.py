@@ -0,0 +1,261 @@
+import tkinter as tk
+
+from visibility import VisibilityCache
+
+
+# Stacking order of the canvas layers, bottom to top
+LAYERS = ("blueprint", "heatmap", "grid", "wall", "resize_corner", "fov", "sensor", "label", "intruder", "drone", "panel",
+          "overlay")
+
+
+class SensorItems:
+    def __init__(self, image_id, label_id):
+        self.image_id = image_id
+        self.label_id = label_id
+        self.fov_id = None
+        # Last drawn state, used to work out what changed
+        self.position = None
+        self.is_enabled = None
+        self.name = None
+        self.fov_polygon = None
+
+
+class CanvasRenderer:
+    def __init__(self, canvas, images, width=1980, height=1080, grid_spacing=50):
+        # Retained-mode view: every object keeps its canvas items between frames and
+        # only the items whose state changed are touched
+        self.canvas = canvas
+        self.images = images  # Name -> PhotoImage (sensor_on, sensor_off, intruder, drone, panel)
+        self.width = width
+        self.height = height
+        self.grid_spacing = grid_spacing
+
+        self.layer_counts = dict.fromkeys(LAYERS, 0)
+        self.sensor_items = {}  # Sensor -> SensorItems
+        self.marker_items = {}  # "drone"/"panel" -> canvas item id
+        self.intruder_items = {}  # Intruder -> [canvas item id, last drawn position]
+        self.blueprint_items = {}  # Key -> (canvas item id, PhotoImage), one entry per blueprint tile
+        self.corner_ids = []
+        self.heatmap_item = None
+        self.overlay_item = None
+        self.wall_items = {}  # Segment id -> canvas line id
+        self.walls_version = None
+        self.fov_cache = VisibilityCache()  # Wall-clipped FOV polygons, rebuilt only when a sensor or a wall near it changes
+
+        self.draw_grid()
+
+    def add_item(self, item, layer):
+        # Tag a new item with its layer and slot it into the stacking order
+        self.canvas.addtag_withtag(layer, item)
+        index = LAYERS.index(layer)
+        below = [name for name in LAYERS[:index] if self.layer_counts[name]]
+        if below:
+            self.canvas.tag_raise(item, below[-1])
+        else:
+            self.canvas.tag_lower(item)
+        self.layer_counts[layer] += 1
+        return item
+
+    def delete_item(self, item, layer):
+        self.canvas.delete(item)
+        self.layer_counts[layer] -= 1
+
+    def draw_grid(self):
+        # Static grid every 50 pixels (1 meter), drawn once
+        for x in range(0, self.width, self.grid_spacing):
+            self.add_item(self.canvas.create_line(x, 0, x, self.height, fill='lightgray', dash=(2, 2)), "grid")
+        for y in range(0, self.height, self.grid_spacing):
+            self.add_item(self.canvas.create_line(0, y, self.width, y, fill='lightgray', dash=(2, 2)), "grid")
+
+        # Scale indicator in the top-left corner
+        self.add_item(self.canvas.create_text(20, 20, text="1 Block = 1 Meter", anchor=tk.NW, fill='black',
+                                              font=('Arial', 12, 'bold')), "grid")
+
+    # Blueprint
+
+    def show_blueprint(self, photo, position, size, corner_offset):
+        self.show_blueprint_tiles([("full", photo, position[0], position[1])], position, size, corner_offset)
+
+    def show_blueprint_tiles(self, tiles, position, size, corner_offset):
+        # tiles is a list of (key, photo, x, y); items of tiles that are no longer visible are dropped
+        shown = {}
+        for key, photo, x, y in tiles:
+            item, current_photo = self.blueprint_items.pop(key, (None, None))
+            if item is None:
+                item = self.add_item(self.canvas.create_image(x, y, image=photo, anchor=tk.NW), "blueprint")
+            else:
+                if photo is not current_photo:
+                    self.canvas.itemconfig(item, image=photo)
+                self.canvas.coords(item, x, y)
+            shown[key] = (item, photo)
+        for item, _ in self.blueprint_items.values():
+            self.delete_item(item, "blueprint")
+        self.blueprint_items = shown
+        self.move_corners(position, size, corner_offset)
+
+    def move_blueprint(self, position, size, corner_offset):
+        # Panning only moves the existing image item
+        item, _ = self.blueprint_items.get("full", (None, None))
+        if item is not None:
+            self.canvas.coords(item, *position)
+            self.move_corners(position, size, corner_offset)
+
+    def move_corners(self, position, size, corner_offset):
+        x, y = position
+        width, height = size
+        corners = [(x, y), (x + width, y), (x, y + height), (x + width, y + height)]
+        if not self.corner_ids:
+            for _ in corners:
+                item = self.canvas.create_rectangle(0, 0, 0, 0, fill="red", outline="red")
+                self.corner_ids.append(self.add_item(item, "resize_corner"))
+        for item, (cx, cy) in zip(self.corner_ids, corners):
+            self.canvas.coords(item, cx - corner_offset, cy - corner_offset, cx + corner_offset, cy + corner_offset)
+
+    def clear_blueprint(self):
+        for item, _ in self.blueprint_items.values():
+            self.delete_item(item, "blueprint")
+        self.blueprint_items = {}
+        for item in self.corner_ids:
+            self.delete_item(item, "resize_corner")
+        self.corner_ids = []
+
+    # Coverage heatmap
+
+    def show_heatmap(self, photo, x, y):
+        if self.heatmap_item is None:
+            self.heatmap_item = self.add_item(self.canvas.create_image(x, y, image=photo, anchor=tk.NW), "heatmap")
+        else:
+            self.canvas.itemconfig(self.heatmap_item, image=photo)
+            self.canvas.coords(self.heatmap_item, x, y)
+
+    def clear_heatmap(self):
+        if self.heatmap_item is not None:
+            self.delete_item(self.heatmap_item, "heatmap")
+            self.heatmap_item = None
+
+    # Profiling overlay
+
+    def show_overlay(self, text):
+        if self.overlay_item is None:
+            self.overlay_item = self.add_item(self.canvas.create_text(20, 45, text=text, anchor=tk.NW, fill='purple',
+                                                                      font=('Courier', 10, 'bold')), "overlay")
+        else:
+            self.canvas.itemconfig(self.overlay_item, text=text)
+
+    def clear_overlay(self):
+        if self.overlay_item is not None:
+            self.delete_item(self.overlay_item, "overlay")
+            self.overlay_item = None
+
+    # Scene objects
+
+    def update(self, scene):
+        self.update_walls(scene.walls)
+        self.update_sensors(scene.sensors, scene.walls)
+
+        self.update_intruders(scene.intruders)
+        drone = scene.drone
+        self.update_marker("drone", drone and (drone.current_location[0] + 15, drone.current_location[1] + 15))
+        panel = scene.panel
+        self.update_marker("panel", panel and (panel.x + 30, panel.y + 40))
+
+    def update_marker(self, name, position):
+        item = self.marker_items.get(name)
+        if not position:
+            if item is not None:
+                self.delete_item(item, name)
+                del self.marker_items[name]
+        elif item is None:
+            item = self.canvas.create_image(*position, image=self.images[name], anchor=tk.CENTER)
+            self.marker_items[name] = self.add_item(item, name)
+        else:
+            self.canvas.coords(item, *position)
+
+    def update_intruders(self, intruders):
+        live = set(intruders)
+        for intruder in [i for i in self.intruder_items if i not in live]:
+            self.delete_item(self.intruder_items.pop(intruder)[0], "intruder")
+
+        for intruder, x, y in zip(intruders, intruders.x.tolist(), intruders.y.tolist()):
+            position = (x + 25, y + 45)
+            entry = self.intruder_items.get(intruder)
+            if entry is None:
+                item = self.canvas.create_image(*position, image=self.images["intruder"], anchor=tk.CENTER)
+                self.intruder_items[intruder] = [self.add_item(item, "intruder"), position]
+            elif entry[1] != position:
+                self.canvas.coords(entry[0], *position)
+                entry[1] = position
+
+    def update_walls(self, walls):
+        # Keyed on the WallSet too, a loaded scene brings a new one that may be at the same version
+        if (id(walls), walls.version) == self.walls_version:
+            return
+        live = dict(walls.segments())
+        for segment_id in [i for i in self.wall_items if i not in live]:
+            self.delete_item(self.wall_items.pop(segment_id), "wall")
+        for segment_id, segment in live.items():
+            if segment_id not in self.wall_items:
+                item = self.canvas.create_line(*segment, fill='blue', width=2)
+                self.wall_items[segment_id] = self.add_item(item, "wall")
+        self.walls_version = (id(walls), walls.version)
+
+    def update_sensors(self, sensors, walls=None):
+        # Drop the items of sensors that were removed from the scene
+        live = set(sensors)
+        for sensor in [s for s in self.sensor_items if s not in live]:
+            self.remove_sensor(sensor)
+
+        for sensor in sensors:
+            items = self.sensor_items.get(sensor)
+            if items is None:
+                image_id = self.add_item(self.canvas.create_image(0, 0, anchor=tk.CENTER), "sensor")
+                label_id = self.add_item(self.canvas.create_text(0, 0, fill="black", font=("Arial", 10)), "label")
+                items = self.sensor_items[sensor] = SensorItems(image_id, label_id)
+            self.update_sensor(sensor, items, walls)
+
+    def update_sensor(self, sensor, items, walls=None):
+        position = (sensor.x + 12.5, sensor.y + 12.5)
+        if position != items.position:
+            self.canvas.coords(items.image_id, *position)
+            self.canvas.coords(items.label_id, position[0], position[1] - 25)
+            items.position = position
+
+        if sensor.is_enabled != items.is_enabled:
+            image = self.images["sensor_on"] if sensor.is_enabled else self.images["sensor_off"]
+            self.canvas.itemconfig(items.image_id, image=image)
+            items.is_enabled = sensor.is_enabled
+
+        if sensor.name != items.name:
+            self.canvas.itemconfig(items.label_id, text=sensor.name)
+            items.name = sensor.name
+
+        if not sensor.is_enabled:
+            if items.fov_id is not None:
+                self.delete_item(items.fov_id, "fov")
+                items.fov_id = items.fov_polygon = None
+            return
+
+        # The cache hands back the same list until the polygon is recomputed
+        polygon = self.fov_cache.polygon(sensor, walls)
+        if items.fov_id is None:
+            fill = 'red' if sensor.triggered else 'lightgreen'
+            items.fov_id = self.add_item(self.canvas.create_polygon(polygon, fill=fill, outline='', stipple='gray25'), "fov")
+            items.fov_polygon = polygon
+        elif polygon is not items.fov_polygon:
+            self.canvas.coords(items.fov_id, polygon)
+            items.fov_polygon = polygon
+
+    def recolour(self, events):
+        # Alarm subscriber: only sensors with a trigger edge change colour
+        for event in events:
+            items = self.sensor_items.get(event.sensor)
+            if items is not None and items.fov_id is not None:
+                self.canvas.itemconfig(items.fov_id, fill='red' if event.sensor.triggered else 'lightgreen')
+
+    def remove_sensor(self, sensor):
+        items = self.sensor_items.pop(sensor)
+        self.fov_cache.discard(sensor)
+        self.delete_item(items.image_id, "sensor")
+        self.delete_item(items.label_id, "label")
+        if items.fov_id is not None:
+            self.delete_item(items.fov_id, "fov")
@@ -0,0 +1,402 @@
+import bisect
+import json
+import struct
+import zlib
+
+from alarms import TRIGGERED, CLEARED, print_events
+from simulation import Drone, Panel, Scene, Sensor, Simulator, Intruder
+from trajectories import RandomWalk, SpeedProfile, WaypointPath
+
+
+MAGIC = b"ASIMLOG1"
+FORMAT_VERSION = 1
+KEYFRAME_INTERVAL = 60.0  # Simulated seconds between keyframe snapshots
+
+HEADER = struct.Struct("<8sIQ")  # Magic, format version, scene seed
+RECORD = struct.Struct("<dBI")  # Simulated time, kind, payload length
+
+# Record kinds
+STEPS = 1  # count, dt: count simulation ticks of dt seconds
+EVALUATE = 2  # Detection run outside a tick, e.g. after an edit; x, y points of a sweep
+EDGE_TRIGGERED = 3  # Sensor row
+EDGE_CLEARED = 4
+KEYFRAME = 5  # zlib compressed JSON snapshot, see snapshot(); only read when seeking
+TRAJECTORY = 6  # Intruder index + JSON trajectory state, empty for none
+WALL_ADDED = 7
+WALL_REMOVED = 8
+SCENE = 9  # Snapshot like KEYFRAME, written when recording starts or a scene is loaded
+
+# Scene.notify() changes -> (kind, struct of the fixed values); a trailing name string or
+# point list is appended where the change has one
+CHANGES = {
+    "add_sensor": (10, struct.Struct("<5d?i")),
+    "remove_sensor": (11, struct.Struct("<I")),
+    "move_sensor": (12, struct.Struct("<Idd")),
+    "configure_sensor": (13, struct.Struct("<I3d?i")),
+    "add_intruder": (14, struct.Struct("<dd")),
+    "remove_intruder": (15, struct.Struct("<I")),
+    "move_intruder": (16, struct.Struct("<Idd")),
+    "drone": (17, struct.Struct("<dd")),
+    "remove_drone": (18, struct.Struct("<")),
+    "panel": (19, struct.Struct("<dd")),
+    "remove_panel": (20, struct.Struct("<")),
+    "gps_points": (21, struct.Struct("<")),
+}
+CHANGE_NAMES = {kind: (change, fixed) for change, (kind, fixed) in CHANGES.items()}
+STEP = struct.Struct("<Id")
+ROW = struct.Struct("<I")
+SEGMENT = struct.Struct("<4d")
+POINT = struct.Struct("<dd")
+LENGTH = struct.Struct("<I")
+
+
+def pack_values(change, values):
+    kind, fixed = CHANGES[change]
+    count = len(fixed.unpack(bytes(fixed.size)))
+    payload = fixed.pack(*values[:count]) if count else b""
+    for value in values[count:]:
+        if isinstance(value, str):
+            encoded = value.encode("utf-8")
+            payload += LENGTH.pack(len(encoded)) + encoded
+        else:
+            payload += LENGTH.pack(len(value)) + b"".join(POINT.pack(*point) for point in value)
+    return kind, payload
+
+
+def unpack_values(kind, payload):
+    # (change, values) of a Scene edit record
+    change, fixed = CHANGE_NAMES[kind]
+    values = list(fixed.unpack_from(payload))
+    offset = fixed.size
+    while offset < len(payload):
+        (length,) = LENGTH.unpack_from(payload, offset)
+        offset += LENGTH.size
+        if change == "gps_points" and values:
+            values.append([POINT.unpack_from(payload, offset + i * POINT.size) for i in range(length)])
+            offset += length * POINT.size
+        else:
+            values.append(payload[offset:offset + length].decode("utf-8"))
+            offset += length
+    return change, values
+
+
+def trajectory_state(trajectory):
+    # JSON-able state of a per-intruder trajectory, random generator included
+    speed = [trajectory.speed.times, trajectory.speed.speeds]
+    if isinstance(trajectory, RandomWalk):
+        version, state, gauss = trajectory.rng.getstate()
+        return {"kind": "walk", "speed": speed, "turn_rate": trajectory.turn_rate, "bounds": list(trajectory.bounds),
+                "heading": trajectory.heading, "rng": [version, list(state), gauss]}
+    if isinstance(trajectory, WaypointPath):
+        return {"kind": "path", "speed": speed, "waypoints": [list(p) for p in trajectory.waypoints],
+                "loop": trajectory.loop, "target": trajectory.target, "finished": trajectory.finished}
+    raise ValueError(f"Can't record a {type(trajectory).__name__} trajectory")
+
+
+def trajectory_from_state(state):
+    speed = SpeedProfile(list(zip(*state["speed"])))
+    if state["kind"] == "walk":
+        trajectory = RandomWalk(speed, state["turn_rate"], tuple(state["bounds"]))
+        version, rng_state, gauss = state["rng"]
+        trajectory.rng.setstate((version, tuple(rng_state), gauss))
+        trajectory.heading = state["heading"]
+    else:
+        trajectory = WaypointPath([tuple(p) for p in state["waypoints"]], speed, state["loop"])
+        trajectory.target = state["target"]
+        trajectory.finished = state["finished"]
+    return trajectory
+
+
+def snapshot(simulator):
+    # Everything a replay needs to carry on from this point of the run
+    scene = simulator.scene
+    indices = {intruder: index for index, intruder in enumerate(scene.intruders)}
+    version, state, gauss = scene.rng.getstate()
+    return {
+        "time": simulator.time,
+        "scene": scene.to_dict(),
+        "rng": [version, list(state), gauss],
+        "trajectories": [[indices[intruder], trajectory_state(trajectory)]
+                         for intruder, trajectory in simulator.trajectories.items() if intruder in indices],
+    }
+
+
+def restore(simulator, state):
+    scene = Scene.from_dict(state["scene"])
+    for sensor, item in zip(scene.sensors, state["scene"]["sensors"]):
+        sensor.triggered = item.get("triggered", False)
+    version, rng_state, gauss = state["rng"]
+    scene.rng.setstate((version, tuple(rng_state), gauss))
+    recorder, simulator.recorder = simulator.recorder, None
+    simulator.load(scene)
+    simulator.time = state["time"]
+    for index, trajectory in state["trajectories"]:
+        simulator.set_trajectory(scene.intruders[index], trajectory_from_state(trajectory))
+    simulator.recorder = recorder
+
+
+class EventRecorder:
+    def __init__(self, path, simulator, keyframe_interval=KEYFRAME_INTERVAL):
+        # Append-only binary log of a run: every scene edit, trajectory, tick and trigger
+        # edge, plus keyframe snapshots every keyframe_interval simulated seconds. Runs of
+        # ticks are written as one STEPS record.
+        self.simulator = simulator
+        self.keyframe_interval = keyframe_interval
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, simulator.scene.seed))
+        self.steps = 0  # Ticks not yet written
+        self.step_dt = 0.0
+        self.step_time = 0.0  # Simulated time of the first of them
+        self.edited = False  # A scene edit hasn't been followed by a detection run yet
+        self.next_keyframe = 0.0
+        self.scene = None
+        simulator.recorder = self
+        self.attach(simulator.scene)
+
+    def attach(self, scene):
+        # Follow scene, e.g. after Simulator.load(); starts with a keyframe of it
+        self.detach()
+        self.scene = scene
+        scene.listeners.append(self.scene_changed)
+        scene.walls.listeners.append(self.wall_changed)
+        self.keyframe(SCENE)
+
+    def detach(self):
+        if self.scene is not None:
+            self.scene.listeners.remove(self.scene_changed)
+            self.scene.walls.listeners.remove(self.wall_changed)
+            self.scene = None
+
+    def close(self):
+        self.flush_steps()
+        self.detach()
+        self.simulator.recorder = None
+        self.file.close()
+
+    def write(self, kind, payload=b"", time=None):
+        self.flush_steps()
+        time = self.simulator.time if time is None else time
+        self.file.write(RECORD.pack(time, kind, len(payload)))
+        self.file.write(payload)
+
+    def flush_steps(self):
+        if self.steps:
+            steps, self.steps = self.steps, 0
+            self.file.write(RECORD.pack(self.step_time, STEPS, STEP.size))
+            self.file.write(STEP.pack(steps, self.step_dt))
+
+    def keyframe(self, kind=KEYFRAME):
+        self.write(kind, zlib.compress(json.dumps(snapshot(self.simulator)).encode("utf-8")))
+        self.next_keyframe = self.simulator.time + self.keyframe_interval
+        self.edited = False
+
+    # Hooks called by Scene, WallSet and Simulator
+
+    def scene_changed(self, change, values):
+        self.write(*pack_values(change, values))
+        self.edited = True
+
+    def wall_changed(self, segment_id, segment, added):
+        self.write(WALL_ADDED if added else WALL_REMOVED, SEGMENT.pack(*segment))
+        self.edited = True
+
+    def trajectory_set(self, intruder, trajectory):
+        state = json.dumps(trajectory_state(trajectory)).encode("utf-8") if trajectory is not None else b""
+        self.write(TRAJECTORY, ROW.pack(intruder.index) + state)
+
+    def stepped(self, dt):
+        # Called at the start of Simulator.step(), when the previous tick is complete
+        if self.simulator.time >= self.next_keyframe:
+            self.keyframe()
+        if self.steps and dt != self.step_dt:
+            self.flush_steps()
+        if not self.steps:
+            self.step_time = self.simulator.time
+            self.step_dt = dt
+        self.steps += 1
+        self.edited = False  # The tick's own detection run covers earlier edits
+
+    def evaluated(self, events, sweep=None):
+        if self.edited or sweep is not None:
+            self.write(EVALUATE, b"".join(POINT.pack(x, y) for x, y in zip(*sweep)) if sweep is not None else b"")
+            self.edited = False
+        for event in events:
+            self.write(EDGE_TRIGGERED if event.kind == TRIGGERED else EDGE_CLEARED, ROW.pack(event.index), event.time)
+
+
+class Replayer:
+    def __init__(self, path):
+        # Rebuilds a recorded run headlessly. Detection runs exactly as recorded, so every
+        # logged trigger edge is reproduced; mismatches end up in divergences. Drone flights
+        # are replanned synchronously and can differ in timing from the recorded run.
+        with open(path, "rb") as f:
+            self.data = f.read()
+        magic, version, self.seed = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version > FORMAT_VERSION:
+            raise ValueError(f"{path} is not a replay log this version can read")
+        self.keyframes = []  # (time, offset), in file order
+        offset = HEADER.size
+        while offset + RECORD.size <= len(self.data):
+            time, kind, length = RECORD.unpack_from(self.data, offset)
+            if kind in (KEYFRAME, SCENE):
+                self.keyframes.append((time, offset))
+            offset += RECORD.size + length
+        self.simulator = Simulator(Scene(self.seed))
+        self.simulator.alarms.unsubscribe(print_events)
+        self.simulator.alarms.subscribe(self.replayed)
+        self.offset = HEADER.size
+        self.pending_steps = 0  # Ticks of a STEPS record not run yet
+        self.pending_dt = 0.0
+        self.produced = []  # Edges produced by the replay, waiting to be matched with the log
+        self.edges = []  # (time, kind, sensor row) of every logged edge replayed so far
+        self.divergences = []  # (logged edge, produced edge or None)
+
+    @property
+    def time(self):
+        return self.simulator.time
+
+    @property
+    def end_time(self):
+        # Simulated time at the end of the log
+        time, offset = self.keyframes[-1] if self.keyframes else (0.0, HEADER.size)
+        while offset + RECORD.size <= len(self.data):
+            record_time, kind, length = RECORD.unpack_from(self.data, offset)
+            time = record_time
+            if kind == STEPS:
+                steps, dt = STEP.unpack_from(self.data, offset + RECORD.size)
+                time += steps * dt
+            offset += RECORD.size + length
+        return time
+
+    def replayed(self, events):
+        self.produced.extend(events)
+
+    def seek(self, time):
+        # Jump to simulated time, starting from the last keyframe before it unless playing
+        # on from where the replay is now gets there without passing one
+        index = bisect.bisect_right([t for t, _ in self.keyframes], time) - 1
+        if index >= 0 and (time < self.simulator.time or self.keyframes[index][1] > self.offset):
+            self.offset = self.keyframes[index][1]
+            self.pending_steps = 0
+            self.produced = []
+            keyframe_time, _, payload = self.read()
+            restore(self.simulator, json.loads(zlib.decompress(payload)))
+            self.edges = [edge for edge in self.edges if edge[0] <= keyframe_time]
+        return self.play(until=time)
+
+    def play(self, until=None):
+        # Apply records up to simulated time until (the whole log by default); returns the
+        # simulator
+        while True:
+            while self.pending_steps:
+                if until is not None and self.simulator.time + self.pending_dt > until + 1e-9:
+                    return self.simulator
+                self.simulator.step(self.pending_dt)
+                self.pending_steps -= 1
+                if not self.pending_steps:
+                    self.simulator.alarms.dispatch()
+            if self.offset + RECORD.size > len(self.data):
+                self.simulator.alarms.dispatch()
+                self.divergences.extend((None, event) for event in self.produced)
+                self.produced = []
+                return self.simulator
+            time, kind, _ = RECORD.unpack_from(self.data, self.offset)
+            if until is not None and time > until + 1e-9:
+                return self.simulator
+            self.apply(*self.read())
+
+    def read(self):
+        time, kind, length = RECORD.unpack_from(self.data, self.offset)
+        start = self.offset + RECORD.size
+        self.offset = start + length
+        return time, kind, self.data[start:self.offset]
+
+    def apply(self, time, kind, payload):
+        simulator = self.simulator
+        scene = simulator.scene
+        if kind == STEPS:
+            self.pending_steps, self.pending_dt = STEP.unpack(payload)
+        elif kind == EVALUATE:
+            # The payload holds the intruder positions of a sweep, if there was one
+            points = [POINT.unpack_from(payload, offset) for offset in range(0, len(payload), POINT.size)]
+            simulator.evaluate(tuple(zip(*points)) if points else None)
+            simulator.alarms.dispatch()
+        elif kind in (EDGE_TRIGGERED, EDGE_CLEARED):
+            logged = (time, TRIGGERED if kind == EDGE_TRIGGERED else CLEARED, ROW.unpack(payload)[0])
+            self.edges.append(logged)
+            produced = self.produced.pop(0) if self.produced else None
+            if produced is None or (produced.kind, produced.index) != logged[1:] or abs(produced.time - time) > 1e-9:
+                self.divergences.append((logged, produced))
+        elif kind == SCENE:
+            restore(simulator, json.loads(zlib.decompress(payload)))
+        elif kind == KEYFRAME:
+            pass  # Playing on gets to the same state
+        elif kind == TRAJECTORY:
+            index = ROW.unpack_from(payload)[0]
+            state = payload[ROW.size:]
+            simulator.set_trajectory(scene.intruders[index], trajectory_from_state(json.loads(state)) if state else None)
+        elif kind in (WALL_ADDED, WALL_REMOVED):
+            segment = SEGMENT.unpack(payload)
+            if kind == WALL_ADDED:
+                scene.walls.add_segment(*segment)
+            else:
+                scene.walls.remove_segment(next(i for i, s in scene.walls.segments() if s == segment))
+        else:
+            self.edit(scene, *unpack_values(kind, payload))
+
+    def edit(self, scene, change, values):
+        if change == "add_sensor":
+            x, y, angle, detection_range, detection_angle, enabled, priority, name = values
+            sensor = Sensor(x, y, angle=angle, detection_angle=detection_angle, is_enabled=enabled, name=name)
+            sensor.detection_range = detection_range
+            sensor.priority = priority
+            scene.add_sensor(sensor)
+        elif change == "remove_sensor":
+            scene.remove_sensor(scene.sensor_for_row(values[0]))
+        elif change == "move_sensor":
+            scene.move_sensor(scene.sensor_for_row(values[0]), values[1], values[2])
+        elif change == "configure_sensor":
+            row, angle, detection_range, detection_angle, enabled, priority, name = values
+            scene.configure_sensor(scene.sensor_for_row(row), angle=angle, detection_range=detection_range,
+                                   detection_angle=detection_angle, is_enabled=enabled, priority=priority, name=name)
+        elif change == "add_intruder":
+            scene.add_intruder(Intruder(*values))
+        elif change == "remove_intruder":
+            scene.remove_intruder(scene.intruders[values[0]])
+        elif change == "move_intruder":
+            intruder = scene.intruders[values[0]]
+            intruder.x, intruder.y = values[1], values[2]
+        elif change == "drone":
+            if scene.drone is None:
+                scene.set_drone(Drone(*values))
+            else:
+                scene.move_drone(*values)
+        elif change == "remove_drone":
+            scene.set_drone(None)
+        elif change == "panel":
+            if scene.panel is None:
+                scene.set_panel(Panel(*values))
+            else:
+                scene.move_panel(*values)
+        elif change == "remove_panel":
+            scene.set_panel(None)
+        elif change == "gps_points":
+            scene.set_gps_points(*values)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # python replay.py run.simlog [seek seconds]
+    replayer = Replayer(sys.argv[1])
+    started = time.perf_counter()
+    if len(sys.argv) > 2:
+        replayer.seek(float(sys.argv[2]))
+    else:
+        replayer.play()
+    elapsed = time.perf_counter() - started
+    print(f"Replayed to {replayer.time:.3f} s in {elapsed:.2f} s ({len(replayer.keyframes)} keyframes)")
+    for edge_time, kind, row in replayer.edges:
+        print(f"  {edge_time:10.3f}  {kind:9}  sensor {replayer.simulator.scene.sensor_for_row(row).name or row}")
+    print(f"{len(replayer.divergences)} divergence(s) from the recorded run")
@@ -0,0 +1,199 @@
+import threading
+
+import numpy as np
+
+
+IMPROVEMENT_EPSILON = 1e-9  # Smallest route saving worth applying, in pixels
+NEIGHBOURS = 10  # Candidate neighbours per point tried by the local search moves
+
+
+def distance_matrix(points):
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    delta = points[:, None, :] - points[None, :, :]
+    return np.sqrt((delta * delta).sum(axis=2))
+
+
+def nearest_neighbour(distances, start=0):
+    # Greedy tour: always fly to the closest unvisited point
+    count = len(distances)
+    visited = np.zeros(count, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    for _ in range(count - 1):
+        row = np.where(visited, np.inf, distances[tour[-1]])
+        tour.append(int(np.argmin(row)))
+        visited[tour[-1]] = True
+    return tour
+
+
+def tour_length(tour, distances):
+    tour = np.asarray(tour)
+    return float(distances[tour, np.roll(tour, -1)].sum()) if len(tour) > 1 else 0.0
+
+
+def neighbour_lists(distances, count=NEIGHBOURS):
+    # The count nearest other points of every point, nearest first
+    count = min(count, len(distances) - 1)
+    nearest = np.argsort(distances, axis=1, kind="stable")[:, :count + 1]
+    return [[j for j in row if j != i][:count] for i, row in enumerate(nearest.tolist())]
+
+
+def reverse(tour, position, first, last):
+    # Reverse tour[first..last] (positions, wrapping around the end), flipping whichever
+    # side of the tour is shorter
+    count = len(tour)
+    length = (last - first) % count + 1
+    if 2 * length > count:
+        first, last = (last + 1) % count, (first - 1) % count
+        length = count - length
+    for k in range(length // 2):
+        i, j = (first + k) % count, (last - k) % count
+        tour[i], tour[j] = tour[j], tour[i]
+        position[tour[i]] = i
+        position[tour[j]] = j
+
+
+def two_opt(tour, distances, neighbours=None):
+    # Closed tour; replace edges (a, b), (c, d) with (a, c), (b, d) whenever that is shorter.
+    # c only ranges over a's nearest neighbours closer than b, so a pass is O(n * NEIGHBOURS).
+    count = len(tour)
+    if count < 4:
+        return list(tour)
+    tour = list(tour)
+    dist = distances.tolist()
+    neighbours = neighbours or neighbour_lists(distances)
+    position = [0] * count
+    for index, node in enumerate(tour):
+        position[node] = index
+    improved = True
+    while improved:
+        improved = False
+        for a in range(count):
+            for step in (1, -1):
+                # step 1: a's successor b, c's successor d; step -1: predecessors
+                b = tour[(position[a] + step) % count]
+                for c in neighbours[a]:
+                    gain = dist[a][b] - dist[a][c]
+                    if gain <= 0:
+                        break
+                    d = tour[(position[c] + step) % count]
+                    if c == b or d == a:
+                        continue
+                    if gain + dist[c][d] - dist[b][d] > IMPROVEMENT_EPSILON:
+                        if step == 1:
+                            reverse(tour, position, position[b], position[c])
+                        else:
+                            reverse(tour, position, position[a], position[d])
+                        improved = True
+                        b = tour[(position[a] + step) % count]
+    return tour
+
+
+def or_opt(tour, distances, neighbours=None, max_segment=3):
+    # Closed tour; move runs of up to max_segment points, forwards or reversed, next to a
+    # near neighbour of one of their ends wherever that is shorter
+    count = len(tour)
+    if count < 5:
+        return list(tour)
+    tour = list(tour)
+    dist = distances.tolist()
+    neighbours = neighbours or neighbour_lists(distances)
+    position = [0] * count
+    for index, node in enumerate(tour):
+        position[node] = index
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, max_segment + 1):
+            for start in range(count):
+                segment = [tour[(start + k) % count] for k in range(length)]
+                first, last = segment[0], segment[-1]
+                before, after = tour[start - 1], tour[(start + length) % count]
+                removed = dist[before][first] + dist[last][after] - dist[before][after]
+
+                # One new edge joins an end of the run to its neighbour c, so c is only worth
+                # trying while that edge alone is shorter than what removing the run saves
+                best = None
+                for end, other in ((first, last), (last, first)):
+                    for c in neighbours[end]:
+                        if dist[end][c] >= removed:
+                            break
+                        if c in segment:
+                            continue
+                        index = position[c]
+                        # Between c and its successor with end next to c, or between its
+                        # predecessor and c with end next to c
+                        for p, q, head, tail in ((c, tour[(index + 1) % count], end, other),
+                                                 (tour[index - 1], c, other, end)):
+                            if p in segment or q in segment:
+                                continue
+                            added = dist[p][head] + dist[tail][q] - dist[p][q]
+                            if added - removed < -IMPROVEMENT_EPSILON and (best is None or added < best[0]):
+                                best = (added, p, head != first)
+                if best is not None:
+                    _, p, flipped = best
+                    rest = [tour[(start + length + k) % count] for k in range(count - length)]
+                    cut = rest.index(p) + 1
+                    tour = rest[:cut] + (segment[::-1] if flipped else segment) + rest[cut:]
+                    for index, node in enumerate(tour):
+                        position[node] = index
+                    improved = True
+    return tour
+
+
+def plan_tour(points):
+    # Near-optimal closed tour over points, as a list of indices
+    if len(points) < 3:
+        return list(range(len(points)))
+    distances = distance_matrix(points)
+    neighbours = neighbour_lists(distances)
+    tour = nearest_neighbour(distances)
+    while True:
+        length = tour_length(tour, distances)
+        tour = or_opt(two_opt(tour, distances, neighbours), distances, neighbours)
+        if tour_length(tour, distances) >= length - IMPROVEMENT_EPSILON:
+            return tour
+
+
+class RoutePlanner:
+    def __init__(self):
+        # Closed tours over the union of the triggered sensors' GPS points, one per set of
+        # sensors and their points
+        self.tours = {}  # frozenset((sensor name, points)) -> (points, tour)
+        self.lock = threading.Lock()  # The mission planner thread adds tours while the main thread may clear them
+
+    def tour(self, gps_points, sensor_names):
+        # (points, closed tour over them) for the union of the sensors' GPS points
+        key = frozenset((name, tuple(gps_points.get(name, ()))) for name in sensor_names)
+        with self.lock:
+            entry = self.tours.get(key)
+        if entry is None:
+            # Points shared by several sensors are only visited once; planned outside the lock
+            points = list(dict.fromkeys(point for name in sorted(sensor_names) for point in gps_points.get(name, ())))
+            entry = (points, plan_tour(points))
+            with self.lock:
+                self.tours[key] = entry
+        return entry
+
+    def route(self, gps_points, sensor_names, start):
+        # Open route from start over the cached tour: cut the one tour edge (a, b) that makes
+        # the flight shortest, then fly start -> b ... a, or start -> a ... b backwards
+        points, tour = self.tour(gps_points, sensor_names)
+        if len(tour) < 2:
+            return [points[i] for i in tour]
+        ordered = np.asarray([points[i] for i in tour], dtype=float)
+        following = np.roll(ordered, -1, axis=0)
+        edges = np.hypot(*(following - ordered).T)
+        start = np.asarray(start, dtype=float)
+        forward = np.hypot(*(following - start).T) - edges
+        backward = np.hypot(*(ordered - start).T) - edges
+        cut = int(np.argmin(np.minimum(forward, backward)))
+        if forward[cut] <= backward[cut]:
+            tour = tour[cut + 1:] + tour[:cut + 1]
+        else:
+            tour = tour[cut::-1] + tour[:cut:-1]
+        return [points[i] for i in tour]
+
+    def clear(self):
+        with self.lock:
+            self.tours.clear()
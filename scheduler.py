@@ -0,0 +1,89 @@
+import math
+import time
+
+
+MAX_LAG_FRAMES = 4  # Default catch-up limit per frame, in frames' worth of ticks
+
+
+class FixedStepScheduler:
+    def __init__(self, simulator, tick_rate=60, frame_rate=30, time_scale=1.0, max_steps=None):
+        # Runs simulator.step() at a fixed tick rate, independent of how often frames are drawn.
+        # Real time is accumulated and the owed ticks are run, at most max_steps per frame: if
+        # ticks take longer than the time they simulate, the excess is dropped (the simulation
+        # runs slower than real time) instead of piling up until the UI freezes.
+        self.simulator = simulator
+        self.tick_rate = tick_rate
+        self.frame_rate = frame_rate
+        self.time_scale = time_scale  # Simulated seconds per real second
+        self.dt = 1.0 / tick_rate
+        self.max_steps = max_steps or max(1, math.ceil(MAX_LAG_FRAMES * tick_rate / frame_rate))
+        self.dropped = 0.0  # Simulated seconds skipped because a frame hit max_steps
+        self.accumulator = 0.0
+        self.ticks = 0
+        self.frames = 0
+        self.running = False
+        self.root = None
+        self.render = None
+        self.after_id = None
+        self.last_time = None
+
+    def advance(self, elapsed, max_steps=None):
+        # Run the ticks owed for elapsed real seconds, at most max_steps of them, then hand
+        # the alarm edges they queued to the subscribers in one batch; returns how many ticks ran
+        self.accumulator += elapsed * self.time_scale
+        ticks = 0
+        while self.accumulator >= self.dt:
+            if max_steps is not None and ticks >= max_steps:
+                # Falling behind: drop the rest but keep the fraction of a tick
+                skipped = self.accumulator - self.accumulator % self.dt
+                self.dropped += skipped
+                self.accumulator -= skipped
+                break
+            self.simulator.step(self.dt)
+            self.accumulator -= self.dt
+            ticks += 1
+        self.ticks += ticks
+        self.simulator.alarms.dispatch()
+        return ticks
+
+    def run(self, duration):
+        # Free-running headless mode: simulate duration seconds as fast as possible, one
+        # frame's worth of ticks at a time so alarms are still dispatched at the frame rate
+        frame = 1.0 / self.frame_rate
+        ticks = 0
+        remaining = duration / self.time_scale
+        while remaining > 0:
+            ticks += self.advance(min(frame, remaining))
+            remaining -= frame
+        return ticks
+
+    # Tk mode
+
+    def start(self, root, render):
+        # Drive the simulation from root.after, calling render() once per frame
+        if self.running:
+            return
+        self.root = root
+        self.render = render
+        self.running = True
+        self.last_time = time.perf_counter()
+        self.after_id = self.root.after(int(1000 / self.frame_rate), self.frame)
+
+    def stop(self):
+        self.running = False
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def frame(self):
+        if not self.running:
+            return
+        now = time.perf_counter()
+        self.advance(now - self.last_time, self.max_steps)
+        self.last_time = now
+        self.render()
+        self.frames += 1
+
+        # Schedule the next frame relative to when this one started
+        delay = 1.0 / self.frame_rate - (time.perf_counter() - now)
+        self.after_id = self.root.after(max(1, int(delay * 1000)), self.frame)
@@ -0,0 +1,293 @@
+import io
+import json
+import os
+
+import numpy as np
+
+from simulation import Sensor
+
+
+# Column name -> dtype; each column is its own .npy file, memory-mapped
+COLUMNS = {
+    "x": np.float64,
+    "y": np.float64,
+    "angle": np.float64,  # Degrees
+    "range": np.float64,  # Meters
+    "fov": np.float64,  # Degrees
+    "enabled": np.bool_,
+    "priority": np.int32,
+    "name_offset": np.int64,  # Byte offset of the name in names.bin
+    "name_length": np.int32,
+}
+ROW_COLUMNS = ("x", "y", "angle", "range", "fov", "enabled", "priority")  # Columns given per sensor
+MIN_CAPACITY = 1024  # Rows allocated when a table is created
+RECT_CHUNK = 1 << 20  # Rows tested per pass when looking for the sensors in a rectangle
+
+
+class SensorTable:
+    def __init__(self, path, capacity=MIN_CAPACITY):
+        # Columnar sensor table in a directory: one memory-mapped .npy per column, the names
+        # as UTF-8 in names.bin and the row count in table.json. Columns are allocated with
+        # spare capacity and only rows [0, count) are valid. Detection reads the columns
+        # in place; Sensor objects are only built for the rows somebody asks for.
+        # With path None the table lives in memory instead, e.g. for a loaded scene file.
+        self.path = path
+        if path is None:
+            self.count = 0
+            self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+            self.names = io.BytesIO()
+        else:
+            with open(os.path.join(path, "table.json")) as f:
+                self.count = json.load(f)["count"]
+            self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+") for name in COLUMNS}
+            self.names = open(os.path.join(path, "names.bin"), "r+b")
+            self.names.seek(0, os.SEEK_END)
+        self.capacity = len(self.arrays["x"])
+        self.triggered = np.zeros(self.capacity, dtype=bool)  # Not persisted
+        self.materialised = {}  # Row -> Sensor handed out for it
+        self.rows = {}  # Sensor -> row
+        self.stored_names = {}  # Sensor -> name last written for it
+
+    @classmethod
+    def create(cls, path, sensors=(), capacity=MIN_CAPACITY):
+        # New table at path holding sensors
+        sensors = list(sensors)
+        table = cls.allocate(path, max(capacity, len(sensors)))
+        table.extend(sensors)
+        return table
+
+    @classmethod
+    def from_columns(cls, path, columns, names):
+        # New table from column arrays (x, y, angle, range, fov, enabled, priority) and a list
+        # of names, without building any Sensor objects
+        count = len(names)
+        table = cls.allocate(path, max(MIN_CAPACITY, count))
+        table.write_rows(0, columns, names)
+        table.count = count
+        table.flush()
+        return table
+
+    @classmethod
+    def allocate(cls, path, capacity):
+        if path is None:
+            return cls(None, capacity)
+        os.makedirs(path, exist_ok=True)
+        for name, dtype in COLUMNS.items():
+            np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype, shape=(capacity,)).flush()
+        open(os.path.join(path, "names.bin"), "wb").close()
+        with open(os.path.join(path, "table.json"), "w") as f:
+            json.dump({"count": 0}, f)
+        return cls(path)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, row):
+        return self.sensor(row)
+
+    def column(self, name):
+        # Zero-copy view of the valid rows of a column
+        return self.arrays[name][:self.count]
+
+    def flush(self):
+        if self.path is None:
+            return
+        for array in self.arrays.values():
+            array.flush()
+        self.names.flush()
+        with open(os.path.join(self.path, "table.json"), "w") as f:
+            json.dump({"count": self.count}, f)
+
+    def close(self):
+        self.flush()
+        self.names.close()
+        self.arrays = {}
+
+    def reserve(self, count):
+        # Grow every column to hold at least count rows, doubling the capacity
+        if count <= self.capacity:
+            return
+        capacity = max(count, 2 * self.capacity)
+        for name, dtype in COLUMNS.items():
+            old = self.arrays[name]
+            if self.path is None:
+                self.arrays[name] = np.zeros(capacity, dtype=dtype)
+                self.arrays[name][:self.count] = old[:self.count]
+                continue
+            file_name = os.path.join(self.path, f"{name}.npy")
+            grown = np.lib.format.open_memmap(file_name + ".tmp", mode="w+", dtype=dtype, shape=(capacity,))
+            grown[:self.count] = old[:self.count]
+            grown.flush()
+            del grown
+            self.arrays[name] = None
+            del old
+            os.replace(file_name + ".tmp", file_name)
+            self.arrays[name] = np.load(file_name, mmap_mode="r+")
+        triggered = np.zeros(capacity, dtype=bool)
+        triggered[:self.count] = self.triggered[:self.count]
+        self.triggered = triggered
+        self.capacity = capacity
+
+    def write_rows(self, start, columns, names):
+        end = start + len(names)
+        for name in ROW_COLUMNS:
+            self.arrays[name][start:end] = columns[name]
+        encoded = [name.encode("utf-8") for name in names]
+        lengths = np.fromiter((len(name) for name in encoded), dtype=np.int64, count=len(encoded))
+        offset = self.names.tell()
+        self.arrays["name_offset"][start:end] = offset + np.cumsum(lengths) - lengths
+        self.arrays["name_length"][start:end] = lengths
+        self.names.write(b"".join(encoded))
+
+    def extend(self, sensors):
+        # Append sensors; each one becomes the materialised Sensor of its row
+        sensors = list(sensors)
+        self.reserve(self.count + len(sensors))
+        columns = {
+            "x": [s.x for s in sensors], "y": [s.y for s in sensors], "angle": [s.angle for s in sensors],
+            "range": [s.detection_range for s in sensors], "fov": [s.detection_angle for s in sensors],
+            "enabled": [bool(s.is_enabled) for s in sensors], "priority": [s.priority for s in sensors],
+        }
+        self.write_rows(self.count, columns, [s.name for s in sensors])
+        for row, sensor in enumerate(sensors, self.count):
+            self.triggered[row] = sensor.triggered
+            self.materialised[row] = sensor
+            self.rows[sensor] = row
+            self.stored_names[sensor] = sensor.name
+        self.count += len(sensors)
+
+    def name(self, row):
+        self.names.flush()
+        offset, length = int(self.arrays["name_offset"][row]), int(self.arrays["name_length"][row])
+        position = self.names.tell()
+        self.names.seek(offset)
+        name = self.names.read(length).decode("utf-8")
+        self.names.seek(position)
+        return name
+
+    def all_names(self):
+        # Names of every row, read from the names in one go
+        self.names.flush()
+        position = self.names.tell()
+        self.names.seek(0)
+        data = self.names.read()
+        self.names.seek(position)
+        offsets, lengths = self.column("name_offset").tolist(), self.column("name_length").tolist()
+        return [data[offset:offset + length].decode("utf-8") for offset, length in zip(offsets, lengths)]
+
+    def sensor(self, row):
+        # The Sensor for a row: the materialised one if there is one, else a new one that
+        # is not tracked (e.g. for an alarm event on a sensor outside the viewport)
+        sensor = self.materialised.get(row)
+        if sensor is None:
+            sensor = self.build(row)
+        return sensor
+
+    def build(self, row):
+        arrays = self.arrays
+        sensor = Sensor(arrays["x"][row].item(), arrays["y"][row].item(), angle=arrays["angle"][row].item(),
+                        detection_angle=arrays["fov"][row].item(), is_enabled=bool(arrays["enabled"][row]),
+                        name=self.name(row))
+        sensor.detection_range = arrays["range"][row].item()  # Meters, stored as-is
+        sensor.priority = int(arrays["priority"][row])
+        sensor.triggered = bool(self.triggered[row])
+        return sensor
+
+    def store(self, sensor):
+        # Write a materialised sensor's attributes back to its row
+        row = self.rows[sensor]
+        arrays = self.arrays
+        arrays["x"][row] = sensor.x
+        arrays["y"][row] = sensor.y
+        arrays["angle"][row] = sensor.angle
+        arrays["range"][row] = sensor.detection_range
+        arrays["fov"][row] = sensor.detection_angle
+        arrays["enabled"][row] = bool(sensor.is_enabled)
+        arrays["priority"][row] = sensor.priority
+        self.store_name(sensor, row)
+
+    def store_name(self, sensor, row):
+        # Renamed sensors get their new name appended to names.bin
+        if sensor.name != self.stored_names.get(sensor):
+            encoded = sensor.name.encode("utf-8")
+            self.arrays["name_offset"][row] = self.names.tell()
+            self.arrays["name_length"][row] = len(encoded)
+            self.names.write(encoded)
+            self.stored_names[sensor] = sensor.name
+
+    def store_all(self):
+        # store() for every materialised sensor, one column at a time
+        if not self.rows:
+            return
+        sensors = list(self.rows)
+        rows = np.fromiter(self.rows.values(), dtype=np.intp, count=len(sensors))
+        arrays = self.arrays
+        arrays["x"][rows] = [s.x for s in sensors]
+        arrays["y"][rows] = [s.y for s in sensors]
+        arrays["angle"][rows] = [s.angle for s in sensors]
+        arrays["range"][rows] = [s.detection_range for s in sensors]
+        arrays["fov"][rows] = [s.detection_angle for s in sensors]
+        arrays["enabled"][rows] = [bool(s.is_enabled) for s in sensors]
+        arrays["priority"][rows] = [s.priority for s in sensors]
+        for sensor, row in zip(sensors, rows.tolist()):
+            self.store_name(sensor, row)
+
+    def remove(self, sensor):
+        # Swap-remove: the last row moves into the removed one's slot
+        row = self.rows.pop(sensor)
+        del self.materialised[row]
+        self.stored_names.pop(sensor, None)
+        last = self.count - 1
+        if row != last:
+            for name in COLUMNS:
+                self.arrays[name][row] = self.arrays[name][last]
+            self.triggered[row] = self.triggered[last]
+            moved = self.materialised.pop(last, None)
+            if moved is not None:
+                self.materialised[row] = moved
+                self.rows[moved] = row
+        self.count = last
+
+    def rows_in_rect(self, x0, y0, x1, y1):
+        # Rows whose sensor position lies in the rectangle, tested RECT_CHUNK rows at a time
+        found = []
+        xs, ys = self.column("x"), self.column("y")
+        for start in range(0, self.count, RECT_CHUNK):
+            x, y = xs[start:start + RECT_CHUNK], ys[start:start + RECT_CHUNK]
+            found.append(np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)) + start)
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.intp)
+
+    def materialise(self, rect):
+        # Make the materialised sensors exactly those in rect. Returns (sensors, added,
+        # dropped); dropped sensors are written back first.
+        keep = set(self.rows_in_rect(*rect).tolist())
+        dropped = [sensor for row, sensor in self.materialised.items() if row not in keep]
+        for sensor in dropped:
+            self.store(sensor)
+            del self.materialised[self.rows.pop(sensor)]
+            del self.stored_names[sensor]
+        added = []
+        for row in sorted(keep - self.materialised.keys()):
+            sensor = self.materialised[row] = self.build(row)
+            self.rows[sensor] = row
+            self.stored_names[sensor] = sensor.name
+            added.append(sensor)
+        return list(self.materialised.values()), added, dropped
+
+    def detection_columns(self):
+        # Columns for DetectionEngine.load_table, as views onto the mapped files
+        return {name: self.column(name) for name in ("x", "y", "angle", "range", "fov", "enabled")}
+
+
+if __name__ == "__main__":
+    import sys
+    from persistence import SceneFile
+
+    # python sensortable.py scene.npz table_dir
+    scene_file = SceneFile(sys.argv[1])
+    columns = {name: scene_file[f"sensor_{key}"] for name, key in
+               (("x", "x"), ("y", "y"), ("angle", "angle"), ("range", "range"), ("fov", "fov"),
+                ("enabled", "enabled"), ("priority", "priority"))}
+    table = SensorTable.from_columns(sys.argv[2], columns, scene_file["sensor_name"].tolist())
+    table.close()
+    print(f"Wrote {scene_file.sensor_count} sensors to {sys.argv[2]}")
@@ -0,0 +1,597 @@
+import math
+import random
+
+import numpy as np
+
+from alarms import AlarmPipeline, TRIGGERED, print_events
+from detection import DetectionEngine, INTRUDER_OFFSET, PIXELS_PER_METER
+from missions import MissionRunner
+from occupancy import OccupancyGrid
+from routing import RoutePlanner
+from spatial import UniformGrid
+from walls import WallSet
+
+
+SENSOR_SIZE = 25  # Clickable area of a sensor in pixels
+DRONE_SPEED = 5.0  # Meters per second
+
+
+class Sensor:
+    def __init__(self, x, y, angle=0, detection_range=0, detection_angle=0, is_enabled=False, name=''):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.detection_range = self.convert_meters_to_pixels(detection_range)
+        self.detection_angle = detection_angle
+        self.is_enabled = is_enabled
+        self.name = name
+        self.triggered = False  # Tracks if the sensor is triggered
+        self.priority = 0  # Drone missions for higher priority sensors pre-empt lower ones
+
+
+    def convert_meters_to_pixels(self, meters):
+        return meters * 50  # 1 meter = 50 pixels
+
+    def set_detection_range(self, range_in_meters):
+        self.detection_range = self.convert_meters_to_pixels(range_in_meters)
+
+class Panel:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Intruder:
+    def __init__(self, x, y):
+        # Stand-alone until added to an IntruderSet; from then on the coordinates live in
+        # the set's arrays and this object is a handle onto its slot
+        self.group = None
+        self.index = None
+        self.position = (x, y)
+
+    @property
+    def x(self):
+        if self.group is None:
+            return self.position[0]
+        return self.group.xs[self.index].item()
+
+    @x.setter
+    def x(self, value):
+        if self.group is None:
+            self.position = (value, self.position[1])
+        else:
+            self.group.xs[self.index] = value
+
+    @property
+    def y(self):
+        if self.group is None:
+            return self.position[1]
+        return self.group.ys[self.index].item()
+
+    @y.setter
+    def y(self, value):
+        if self.group is None:
+            self.position = (self.position[0], value)
+        else:
+            self.group.ys[self.index] = value
+
+
+class IntruderSet:
+    def __init__(self, capacity=16):
+        # Intruder coordinates as contiguous arrays so detection can run on all of them at once
+        self.xs = np.zeros(capacity)
+        self.ys = np.zeros(capacity)
+        self.handles = []  # Intruder objects, handles[i] owns slot i
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __iter__(self):
+        return iter(list(self.handles))
+
+    def __getitem__(self, index):
+        return self.handles[index]
+
+    @property
+    def x(self):
+        return self.xs[:len(self.handles)]
+
+    @property
+    def y(self):
+        return self.ys[:len(self.handles)]
+
+    def reserve(self, count):
+        if count > len(self.xs):
+            capacity = max(count, 2 * len(self.xs))
+            self.xs = np.resize(self.xs, capacity)
+            self.ys = np.resize(self.ys, capacity)
+
+    def add(self, intruder):
+        x, y = intruder.x, intruder.y
+        self.reserve(len(self.handles) + 1)
+        index = len(self.handles)
+        self.xs[index] = x
+        self.ys[index] = y
+        intruder.group = self
+        intruder.index = index
+        self.handles.append(intruder)
+        return intruder
+
+    def add_many(self, xs, ys):
+        # Bulk insert for crowds; returns the new Intruder handles
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        start = len(self.handles)
+        self.reserve(start + len(xs))
+        self.xs[start:start + len(xs)] = xs
+        self.ys[start:start + len(ys)] = ys
+        added = []
+        for index in range(start, start + len(xs)):
+            intruder = Intruder(0, 0)
+            intruder.group = self
+            intruder.index = index
+            added.append(intruder)
+        self.handles.extend(added)
+        return added
+
+    def remove(self, intruder):
+        # Swap the last intruder into the freed slot to keep the arrays contiguous
+        index = intruder.index
+        intruder.position = (intruder.x, intruder.y)
+        last = self.handles.pop()
+        if last is not intruder:
+            self.xs[index] = self.xs[last.index]
+            self.ys[index] = self.ys[last.index]
+            last.index = index
+            self.handles[index] = last
+        intruder.group = None
+        intruder.index = None
+
+    def clear(self):
+        for intruder in list(self.handles):
+            self.remove(intruder)
+
+    def find(self, x, y, width=50, height=90):
+        # Topmost (most recently added) intruder whose image box contains the point, or None
+        count = len(self.handles)
+        xs, ys = self.xs[:count], self.ys[:count]
+        hits = np.flatnonzero((xs <= x) & (x <= xs + width) & (ys <= y) & (y <= ys + height))
+        return self.handles[hits.max()] if len(hits) else None
+
+class Drone:
+    def __init__(self, x=0, y=0):
+        self.gps_points = []
+        self.current_location = (x, y)  # Set the initial location of the drone
+        self.scanning = False
+        self.speed = DRONE_SPEED
+        self.route = []  # GPS points still to visit
+        self.legs = None  # Planned waypoints for each remaining GPS point, if known
+        self.path = []  # Waypoints to the next GPS point
+        self.intruders = ()  # Scanned for at every GPS point of the route
+
+    def receive_gps_points(self, gps_points):
+        # Simulate receiving GPS points (drone acknowledges receipt)
+        print("Drone: GPS points received.")
+        self.gps_points = gps_points
+        self.scanning = True  # Enter listening mode
+
+    def fly_to_sensor(self, sensor_gps_points, intruders=()):
+        # Fly to each point associated with the triggered sensor
+        for point in sensor_gps_points:
+            self.current_location = point
+            print(f"Drone flying to: {point}")
+            self.scan_area(intruders)
+
+    def start_route(self, points, intruders=(), paths=None):
+        # Fly the points in order along obstacle-free paths, moved by advance(). paths can
+        # hold the already planned waypoints of each leg (None for an unreachable point).
+        self.route = list(points)
+        self.legs = list(paths) if paths is not None else None
+        self.path = []
+        self.intruders = intruders
+
+    def stop(self):
+        self.route = []
+        self.legs = None
+        self.path = []
+
+    @property
+    def idle(self):
+        return not self.route and not self.path
+
+    def advance(self, dt, occupancy=None):
+        # Move up to speed * dt along the current path, planning the leg to the next GPS point
+        # when the last one was reached. Without an occupancy grid the drone flies straight.
+        budget = self.speed * PIXELS_PER_METER * dt
+        while budget > 0:
+            if not self.path:
+                if not self.route:
+                    return
+                target = self.route.pop(0)
+                if self.legs:
+                    path = self.legs.pop(0)
+                else:
+                    path = occupancy.find_path(self.current_location, target) if occupancy else [tuple(target)]
+                if path is None:
+                    print(f"Drone: no path to {target}")
+                    continue
+                self.path = path
+            x, y = self.current_location
+            next_x, next_y = self.path[0]
+            distance = math.hypot(next_x - x, next_y - y)
+            if distance > budget:
+                self.current_location = (x + (next_x - x) * budget / distance, y + (next_y - y) * budget / distance)
+                return
+            self.current_location = (next_x, next_y)
+            budget -= distance
+            self.path.pop(0)
+            if not self.path:
+                print(f"Drone reached: {self.current_location}")
+                self.scan_area(self.intruders)
+
+    def scan_area(self, intruders=()):
+        # Simulate scanning in a 6-meter radius
+        radius = 6 * 50  # Convert meters to pixels (50 pixels per meter)
+        print(f"Scanning area within {radius} pixels")
+
+        # If intruder is within range, sound alarm
+        if self.detect_intruder(intruders, radius):
+            print("Intruder detected! Sounding alarm!")
+            self.change_color()  # Change color to simulate alert
+        else:
+            print("No intruder detected.")
+
+    def detect_intruder(self, intruders, scan_radius):
+        # True if any intruder is within the scan radius of the drone
+        for intruder in intruders:
+            distance_to_intruder = math.sqrt(
+                (intruder.x + INTRUDER_OFFSET[0] - self.current_location[0]) ** 2 +
+                (intruder.y + INTRUDER_OFFSET[1] - self.current_location[1]) ** 2
+            )
+            if distance_to_intruder <= scan_radius:
+                return True
+        return False  # No intruder present or outside scan range
+
+    def change_color(self):
+        # Simulate the drone changing color to signal an alert
+        print("Drone changing color to signal alarm.")
+
+
+class Scene:
+    def __init__(self, seed=None):
+        # Everything placed on the site plan; no GUI state lives here
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)  # For random placements, so a run can be reproduced
+        self.listeners = []  # Called with (change, values) on every edit, see notify()
+        self.sensors = []  # With a sensor table, only the sensors materialised from it
+        self.sensor_version = 0  # Bumped on every sensor edit, for caches of the sensor attributes
+        self.table = None  # SensorTable holding every sensor of very large scenes
+        self.viewport = None  # Rectangle the table's sensors were last materialised for
+        self.intruders = IntruderSet()
+        self.drone = None
+        self.panel = None
+        self.gps_points = {}  # Sensor name -> list of (x, y) points for the drone
+        self.sensor_index = UniformGrid()  # Sensor bounding boxes for hit-testing
+        self.walls = WallSet()  # Wall segments that block line of sight
+        self.occupancy = OccupancyGrid()  # Where the drone can fly, kept in step with the walls
+        self.occupancy.attach(self.walls)
+
+    @classmethod
+    def from_dict(cls, data):
+        # Build a scene from a setup.json style snapshot
+        scene = cls(data.get("seed"))
+        for item in data.get("sensors", []):
+            sensor = Sensor(item["x"], item["y"], angle=item.get("angle", 0),
+                            detection_angle=item.get("detection_angle", 0),
+                            is_enabled=bool(item.get("is_enabled", False)), name=item.get("name", ""))
+            sensor.detection_range = item.get("detection_range", 0)  # Stored as-is, not converted again
+            sensor.priority = item.get("priority", 0)
+            scene.add_sensor(sensor)
+        # "intruder" is the single intruder of older snapshots; "intruders" lists all of them
+        intruders = data.get("intruders") or ([data["intruder"]] if data.get("intruder") else [])
+        if intruders:
+            scene.intruders.add_many([item["x"] for item in intruders], [item["y"] for item in intruders])
+        if data.get("drone"):
+            scene.drone = Drone(data["drone"]["x"], data["drone"]["y"])
+        if data.get("panel"):
+            scene.panel = Panel(data["panel"]["x"], data["panel"]["y"])
+        for polyline in data.get("walls", []):
+            scene.walls.add_polyline([tuple(p) for p in polyline])
+        scene.gps_points.update({name: [tuple(p) for p in points] for name, points in data.get("gps_points", {}).items()})
+        return scene
+
+    def to_dict(self):
+        # setup.json style snapshot, read back by from_dict
+        data = {"sensors": [{"x": s.x, "y": s.y, "angle": s.angle, "detection_range": s.detection_range,
+                             "detection_angle": s.detection_angle, "is_enabled": s.is_enabled, "name": s.name,
+                             "triggered": s.triggered, "priority": s.priority} for s in self.all_sensors()],
+                "seed": self.seed}
+        intruders = [{"x": x, "y": y} for x, y in zip(self.intruders.x.tolist(), self.intruders.y.tolist())]
+        if intruders:
+            data["intruder"] = intruders[0]
+            data["intruders"] = intruders
+        if self.drone:
+            data["drone"] = {"x": self.drone.current_location[0], "y": self.drone.current_location[1]}
+        if self.panel:
+            data["panel"] = {"x": self.panel.x, "y": self.panel.y}
+        if len(self.walls):
+            data["walls"] = [[[x0, y0], [x1, y1]] for _, (x0, y0, x1, y1) in self.walls.segments()]
+        if self.gps_points:
+            data["gps_points"] = {name: [list(p) for p in points] for name, points in self.gps_points.items()}
+        return data
+
+    def attach_table(self, table):
+        # Keep the sensors in a SensorTable; self.sensors then only holds the ones
+        # materialised by set_viewport()
+        self.table = table
+        self.sensors = []
+        self.sensor_version += 1
+        self.sensor_index = UniformGrid()
+        self.viewport = None
+
+    def set_viewport(self, rect):
+        # Materialise the table's sensors inside rect (x0, y0, x1, y1) and drop the rest
+        if self.table is None or rect == self.viewport:
+            return
+        self.viewport = rect
+        self.sensors, added, dropped = self.table.materialise(rect)
+        self.sensor_version += 1
+        for sensor in dropped:
+            self.sensor_index.remove(sensor)
+        # The hit-test grid only ever holds the materialised sensors, bulk-loaded as they appear
+        x = np.fromiter((sensor.x for sensor in added), dtype=float, count=len(added))
+        y = np.fromiter((sensor.y for sensor in added), dtype=float, count=len(added))
+        self.sensor_index.insert_many(added, x, y, x + SENSOR_SIZE, y + SENSOR_SIZE)
+
+    def all_sensors(self):
+        # Every sensor, building the ones of a table outside the viewport on the fly
+        if self.table is None:
+            return iter(self.sensors)
+        self.table.store_all()
+        return (self.table.sensor(row) for row in range(len(self.table)))
+
+    def sensor_count(self):
+        return len(self.table) if self.table is not None else len(self.sensors)
+
+    def sensor_for_row(self, row):
+        # Sensor of a detection row, i.e. an index into self.sensors or the table
+        return self.table.sensor(row) if self.table is not None else self.sensors[row]
+
+    def notify(self, change, *values):
+        # Edits are reported with plain values (sensors and intruders by index) so that a
+        # listener like replay.EventRecorder can log them
+        for listener in self.listeners:
+            listener(change, values)
+
+    def sensor_row(self, sensor):
+        return self.table.rows[sensor] if self.table is not None else self.sensors.index(sensor)
+
+    def sensor_values(self, sensor):
+        return (sensor.x, sensor.y, sensor.angle, sensor.detection_range, sensor.detection_angle,
+                bool(sensor.is_enabled), sensor.priority, sensor.name)
+
+    def sensor_bbox(self, sensor):
+        return (sensor.x, sensor.y, sensor.x + SENSOR_SIZE, sensor.y + SENSOR_SIZE)
+
+    def add_sensor(self, sensor):
+        if self.table is not None:
+            self.table.extend([sensor])
+        self.sensors.append(sensor)
+        self.sensor_version += 1
+        self.sensor_index.insert(sensor, self.sensor_bbox(sensor))
+        if self.listeners:
+            self.notify("add_sensor", *self.sensor_values(sensor))
+        return sensor
+
+    def remove_sensor(self, sensor):
+        if self.listeners:
+            self.notify("remove_sensor", self.sensor_row(sensor))
+        if self.table is not None:
+            self.table.remove(sensor)
+        self.sensors.remove(sensor)
+        self.sensor_version += 1
+        self.sensor_index.remove(sensor)
+
+    def move_sensor(self, sensor, dx, dy):
+        sensor.x += dx
+        sensor.y += dy
+        self.sensor_version += 1
+        self.sensor_index.move(sensor, self.sensor_bbox(sensor))
+        if self.listeners:
+            self.notify("move_sensor", self.sensor_row(sensor), dx, dy)
+
+    def configure_sensor(self, sensor, **attributes):
+        # e.g. configure_sensor(sensor, angle=90, detection_range=5)
+        for name, value in attributes.items():
+            setattr(sensor, name, value)
+        self.sensor_version += 1
+        if self.listeners:
+            self.notify("configure_sensor", self.sensor_row(sensor), *self.sensor_values(sensor)[2:])
+
+    def sensor_at(self, x, y):
+        # First sensor (in scene order) under the point, or None
+        hits = self.sensor_index.query_point(x, y)
+        return hits[0] if hits else None
+
+    @property
+    def intruder(self):
+        # First intruder, for code that only deals with a single one
+        return self.intruders[0] if len(self.intruders) else None
+
+    @intruder.setter
+    def intruder(self, intruder):
+        for old in list(self.intruders):
+            self.remove_intruder(old)
+        if intruder is not None:
+            self.add_intruder(intruder)
+
+    def add_intruder(self, intruder):
+        self.intruders.add(intruder)
+        self.notify("add_intruder", intruder.x, intruder.y)
+        return intruder
+
+    def remove_intruder(self, intruder):
+        self.notify("remove_intruder", intruder.index)
+        self.intruders.remove(intruder)
+
+    def move_intruder(self, intruder, dx, dy):
+        intruder.x += dx
+        intruder.y += dy
+        self.notify("move_intruder", intruder.index, intruder.x, intruder.y)
+
+    def set_drone(self, drone):
+        self.drone = drone
+        if drone is None:
+            self.notify("remove_drone")
+        else:
+            self.notify("drone", *drone.current_location)
+
+    def move_drone(self, x, y):
+        self.drone.current_location = (x, y)
+        self.notify("drone", x, y)
+
+    def set_panel(self, panel):
+        self.panel = panel
+        if panel is None:
+            self.notify("remove_panel")
+        else:
+            self.notify("panel", panel.x, panel.y)
+
+    def move_panel(self, x, y):
+        self.panel.x, self.panel.y = x, y
+        self.notify("panel", x, y)
+
+    def set_gps_points(self, name, points):
+        self.gps_points[name] = [tuple(point) for point in points]
+        self.notify("gps_points", name, self.gps_points[name])
+
+
+class Simulator:
+    def __init__(self, scene=None):
+        self.scene = scene if scene is not None else Scene()
+        self.detection_engine = DetectionEngine()
+        self.engine_key = None  # (scene, sensor_version) the engine's arrays were built from
+        self.time = 0.0  # Simulated seconds
+        # (sensor indices, intruder indices) of every detection in the last evaluate()
+        self.hit_pairs = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        self.trajectories = {}  # Intruder -> WaypointPath/RandomWalk moving it
+        self.crowd_motions = []  # CrowdRandomWalk-style motions applied to every intruder
+        self.route_planner = RoutePlanner()  # Drone tours, cached per set of triggered sensors
+        self.alarms = AlarmPipeline()  # Trigger edges from evaluate(), delivered by alarms.dispatch()
+        self.alarms.subscribe(print_events)
+        self.alarms.subscribe(self.dispatch_drone, (TRIGGERED,))
+        self.missions = MissionRunner(self)  # Drone missions; planned off the Tk loop once attached to a root
+        self.recorder = None  # replay.EventRecorder logging this run, if any
+
+    def load(self, scene):
+        # Switch to another scene, e.g. one read by persistence.load_scene()
+        self.missions.cancel()
+        self.scene = scene
+        self.engine_key = None
+        self.trajectories.clear()
+        self.route_planner.clear()
+        if self.recorder is not None:
+            self.recorder.attach(scene)
+
+    def set_trajectory(self, intruder, trajectory):
+        if trajectory is None:
+            self.trajectories.pop(intruder, None)
+        else:
+            self.trajectories[intruder] = trajectory
+        if self.recorder is not None:
+            self.recorder.trajectory_set(intruder, trajectory)
+
+    def evaluate(self, sweep=None):
+        # Run detection for the whole scene in one batched sensors x intruders pass and
+        # queue the trigger edges; nothing reacts to them until alarms.dispatch().
+        # sweep is (xs, ys) of intruder positions passed through since the last run, e.g.
+        # during a fast drag: sensors that only saw those trigger and then clear again.
+        scene = self.scene
+        engine = self.detection_engine
+        if scene.table is not None:
+            # Only the few materialised sensors can have been edited; the table itself is
+            # read in place
+            scene.table.store_all()
+            engine.load_table(scene.table)
+            self.engine_key = None
+        elif self.engine_key != (id(scene), scene.sensor_version):
+            # The sensor arrays are only rebuilt after the scene reports a sensor edit
+            engine.load_sensors(scene.sensors)
+            self.engine_key = (id(scene), scene.sensor_version)
+        intruder_x = scene.intruders.x + INTRUDER_OFFSET[0]
+        intruder_y = scene.intruders.y + INTRUDER_OFFSET[1]
+        sensor_indices, intruder_indices = engine.hit_pairs(intruder_x, intruder_y)
+
+        # Drop detections whose line of sight crosses a wall
+        if len(scene.walls) and len(sensor_indices):
+            sensor_x, sensor_y = engine.points(sensor_indices)
+            clear = scene.walls.line_of_sight(sensor_x, sensor_y, intruder_x[intruder_indices], intruder_y[intruder_indices])
+            sensor_indices, intruder_indices = sensor_indices[clear], intruder_indices[clear]
+        self.hit_pairs = (sensor_indices, intruder_indices)
+        triggered_mask = np.zeros(len(engine), dtype=bool)
+        triggered_mask[self.hit_pairs[0]] = True
+
+        edges = 0
+        if sweep is not None and len(sweep[0]):
+            edges += self.update_alarms(triggered_mask | self.swept_mask(*sweep))
+        edges += self.update_alarms(triggered_mask)
+        if self.recorder is not None:
+            self.recorder.evaluated(list(self.alarms.queue)[len(self.alarms.queue) - edges:], sweep)
+        return triggered_mask
+
+    def swept_mask(self, xs, ys):
+        # Sensors of the loaded detection engine that see any of the intruder positions
+        engine = self.detection_engine
+        point_x = np.asarray(xs, dtype=float) + INTRUDER_OFFSET[0]
+        point_y = np.asarray(ys, dtype=float) + INTRUDER_OFFSET[1]
+        sensor_indices, point_indices = engine.hit_pairs(point_x, point_y)
+        if len(self.scene.walls) and len(sensor_indices):
+            sensor_x, sensor_y = engine.points(sensor_indices)
+            sensor_indices = sensor_indices[self.scene.walls.line_of_sight(sensor_x, sensor_y, point_x[point_indices],
+                                                                           point_y[point_indices])]
+        mask = np.zeros(len(engine), dtype=bool)
+        mask[sensor_indices] = True
+        return mask
+
+    def update_alarms(self, mask):
+        scene = self.scene
+        if scene.table is not None:
+            previous = scene.table.triggered[:len(mask)]
+            edges = self.alarms.update(scene.table, mask, self.time, previous=previous.copy())
+            previous[:] = mask
+            return edges
+        return self.alarms.update(scene.sensors, mask, self.time)
+
+    def dispatch_drone(self, events):
+        # One mission over the GPS points of every sensor that just triggered, as urgent as
+        # the most urgent of them
+        scene = self.scene
+        sensors = [event.sensor for event in events if event.sensor.name in scene.gps_points]
+        if scene.drone and sensors:
+            self.missions.submit([sensor.name for sensor in sensors], max(sensor.priority for sensor in sensors))
+
+    def detections(self):
+        # Sensor -> list of intruders that tripped it in the last evaluate()
+        tripped = {}
+        scene, intruders = self.scene, self.scene.intruders
+        for sensor_index, intruder_index in zip(*(indices.tolist() for indices in self.hit_pairs)):
+            tripped.setdefault(scene.sensor_for_row(sensor_index), []).append(intruders[intruder_index])
+        return tripped
+
+    def step(self, dt=0.0):
+        # Move the intruders along their trajectories and the drone along its route, advance
+        # simulated time by dt seconds and re-evaluate detection
+        if self.recorder is not None:
+            self.recorder.stepped(dt)
+        intruders = self.scene.intruders
+        for intruder, trajectory in list(self.trajectories.items()):
+            if intruder.group is not intruders:
+                del self.trajectories[intruder]  # Intruder was removed from the scene
+            else:
+                trajectory.advance(intruder, self.time, dt)
+        for motion in self.crowd_motions:
+            motion.advance_all(intruders, self.time, dt)
+        self.missions.advance(dt)
+
+        self.time += dt
+        return self.evaluate()
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+
+
+class UniformGrid:
+    def __init__(self, cell_size=50):
+        # Buckets objects by the grid cells their bounding box overlaps, so point lookups
+        # only look at the few objects in one cell instead of every object in the scene
+        self.cell_size = cell_size
+        self.cells = {}  # (col, row) -> {obj: None}, insertion ordered
+        self.entries = {}  # obj -> (bbox, cells, insertion order)
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, obj):
+        return obj in self.entries
+
+    def cell_range(self, bbox):
+        x0, y0, x1, y1 = bbox
+        size = self.cell_size
+        return [(col, row)
+                for col in range(math.floor(x0 / size), math.floor(x1 / size) + 1)
+                for row in range(math.floor(y0 / size), math.floor(y1 / size) + 1)]
+
+    def insert(self, obj, bbox):
+        if obj in self.entries:
+            self.remove(obj)
+        cells = self.cell_range(bbox)
+        for cell in cells:
+            self.cells.setdefault(cell, {})[obj] = None
+        self.entries[obj] = (bbox, cells, self.counter)
+        self.counter += 1
+
+    def insert_many(self, objects, x0, y0, x1, y1):
+        # Bulk insert of objects that aren't in the grid yet, bounding boxes given as arrays.
+        # Cells are worked out for every box at once and filled one bucket at a time; the
+        # entries leave their cell list to be recomputed from the box when it's needed.
+        objects = list(objects)
+        if not objects:
+            return
+        size = self.cell_size
+        col0, row0 = np.floor(np.asarray(x0) / size).astype(np.int64), np.floor(np.asarray(y0) / size).astype(np.int64)
+        col1, row1 = np.floor(np.asarray(x1) / size).astype(np.int64), np.floor(np.asarray(y1) / size).astype(np.int64)
+        owners, cols, rows = [], [], []
+        for dc in range(int((col1 - col0).max()) + 1):
+            for dr in range(int((row1 - row0).max()) + 1):
+                index = np.flatnonzero((col0 + dc <= col1) & (row0 + dr <= row1))
+                owners.append(index)
+                cols.append(col0[index] + dc)
+                rows.append(row0[index] + dr)
+        owners, cols, rows = np.concatenate(owners), np.concatenate(cols), np.concatenate(rows)
+        order = np.lexsort((rows, cols))
+        owners, cols, rows = owners[order], cols[order], rows[order]
+        starts = np.flatnonzero(np.r_[True, (cols[1:] != cols[:-1]) | (rows[1:] != rows[:-1])])
+        ends = np.r_[starts[1:], len(owners)]
+
+        owned = [objects[owner] for owner in owners.tolist()]
+        for start, end, col, row in zip(starts.tolist(), ends.tolist(), cols[starts].tolist(), rows[starts].tolist()):
+            bucket = self.cells.get((col, row))
+            if bucket is None:
+                self.cells[(col, row)] = dict.fromkeys(owned[start:end])
+            else:
+                bucket.update(dict.fromkeys(owned[start:end]))
+        bboxes = zip(np.asarray(x0).tolist(), np.asarray(y0).tolist(), np.asarray(x1).tolist(), np.asarray(y1).tolist())
+        self.entries.update(zip(objects, ((bbox, None, order) for order, bbox in enumerate(bboxes, self.counter))))
+        self.counter += len(objects)
+
+    def entry_cells(self, entry):
+        return entry[1] if entry[1] is not None else self.cell_range(entry[0])
+
+    def remove(self, obj):
+        entry = self.entries.pop(obj, None)
+        if entry is None:
+            return
+        for cell in self.entry_cells(entry):
+            bucket = self.cells[cell]
+            del bucket[obj]
+            if not bucket:
+                del self.cells[cell]
+
+    def move(self, obj, bbox):
+        # Keeps the original insertion order so lookups stay stable while dragging
+        entry = self.entries.get(obj)
+        if entry is None:
+            self.insert(obj, bbox)
+            return
+        old_cells, order = self.entry_cells(entry), entry[2]
+        cells = self.cell_range(bbox)
+        if cells != old_cells:
+            self.remove(obj)
+            for cell in cells:
+                self.cells.setdefault(cell, {})[obj] = None
+        self.entries[obj] = (bbox, cells, order)
+
+    def query_point(self, x, y):
+        # Objects whose bounding box contains the point, in insertion order
+        size = self.cell_size
+        bucket = self.cells.get((math.floor(x / size), math.floor(y / size)), ())
+        hits = []
+        for obj in bucket:
+            bbox, _, order = self.entries[obj]
+            if bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]:
+                hits.append((order, obj))
+        hits.sort(key=lambda hit: hit[0])
+        return [obj for _, obj in hits]
+
+    def query_rect(self, bbox):
+        # Objects whose bounding box overlaps the rectangle, in insertion order
+        seen = {}
+        for cell in self.cell_range(bbox):
+            for obj in self.cells.get(cell, ()):
+                if obj in seen:
+                    continue
+                box, _, order = self.entries[obj]
+                if box[0] <= bbox[2] and bbox[0] <= box[2] and box[1] <= bbox[3] and bbox[1] <= box[3]:
+                    seen[obj] = order
+        return sorted(seen, key=seen.get)
@@ -14,6 +14,69 @@ let sensors = [];
 let offsetX, offsetY; // For dragging offset
 let selectedSensor = null; // Sensor currently selected
 
+// Uniform grid over sensor bounding boxes so hit-testing doesn't scan every sensor
+const sensorCells = new Map(); // "col,row" -> Set of sensors
+const sensorCellKeys = new Map(); // sensor -> cell keys it was added to
+const sensorOrder = new Map(); // sensor -> insertion number, keeps overlapping hits stable
+let sensorCounter = 0;
+
+function sensorCellRange(sensor) {
+    const keys = [];
+    for (let col = Math.floor(sensor.x / gridSize); col <= Math.floor((sensor.x + sensorSize) / gridSize); col++) {
+        for (let row = Math.floor(sensor.y / gridSize); row <= Math.floor((sensor.y + sensorSize) / gridSize); row++) {
+            keys.push(col + ',' + row);
+        }
+    }
+    return keys;
+}
+
+function indexSensor(sensor) {
+    unindexSensor(sensor);
+    const keys = sensorCellRange(sensor);
+    keys.forEach((key) => {
+        if (!sensorCells.has(key)) sensorCells.set(key, new Set());
+        sensorCells.get(key).add(sensor);
+    });
+    sensorCellKeys.set(sensor, keys);
+    if (!sensorOrder.has(sensor)) sensorOrder.set(sensor, sensorCounter++);
+}
+
+function unindexSensor(sensor) {
+    const keys = sensorCellKeys.get(sensor);
+    if (!keys) return;
+    keys.forEach((key) => {
+        const cell = sensorCells.get(key);
+        cell.delete(sensor);
+        if (cell.size === 0) sensorCells.delete(key);
+    });
+    sensorCellKeys.delete(sensor);
+}
+
+function removeSensorFromIndex(sensor) {
+    unindexSensor(sensor);
+    sensorOrder.delete(sensor);
+}
+
+function rebuildSensorIndex() {
+    sensorCells.clear();
+    sensorCellKeys.clear();
+    sensorOrder.clear();
+    sensors.forEach(indexSensor);
+}
+
+// First sensor (in insertion order) under the point, or undefined
+function sensorAt(x, y) {
+    const cell = sensorCells.get(Math.floor(x / gridSize) + ',' + Math.floor(y / gridSize));
+    if (!cell) return undefined;
+    let best;
+    cell.forEach((sensor) => {
+        if (isSensorClicked(sensor, x, y) && (best === undefined || sensorOrder.get(sensor) < sensorOrder.get(best))) {
+            best = sensor;
+        }
+    });
+    return best;
+}
+
 // Draw grid function
 function drawGrid() {
     ctx.strokeStyle = 'lightgrey';
@@ -121,6 +184,7 @@ function addSensor() {
         body: JSON.stringify(newSensor)
     }).then(() => {
         sensors.push(newSensor); // Add sensor locally
+        indexSensor(newSensor);
         redrawCanvas(); // Redraw canvas with new sensor
     });
 }
@@ -168,26 +232,20 @@ canvas.addEventListener('mousedown', (event) => {
     const mouseX = event.clientX - rect.left;
     const mouseY = event.clientY - rect.top;
 
-    sensors.forEach((sensor) => {
-        if (
-            mouseX >= sensor.x &&
-            mouseX <= sensor.x + sensorSize &&
-            mouseY >= sensor.y &&
-            mouseY <= sensor.y + sensorSize
-        ) {
-            if (selectedSensor === sensor) {
-                showSensorConfig(sensor); // Open config if sensor is clicked again
-            } else {
-                selectedSensor = sensor; // Select this sensor
-            }
-
-            offsetX = mouseX - sensor.x; // Calculate offset for dragging
-            offsetY = mouseY - sensor.y;
-            draggingSensor = sensor; // Set dragging state
-
-            redrawCanvas();
+    const sensor = sensorAt(mouseX, mouseY);
+    if (sensor) {
+        if (selectedSensor === sensor) {
+            showSensorConfig(sensor); // Open config if sensor is clicked again
+        } else {
+            selectedSensor = sensor; // Select this sensor
         }
-    });
+
+        offsetX = mouseX - sensor.x; // Calculate offset for dragging
+        offsetY = mouseY - sensor.y;
+        draggingSensor = sensor; // Set dragging state
+
+        redrawCanvas();
+    }
 });
 
 // Mouse move event for dragging sensors
@@ -199,6 +257,7 @@ canvas.addEventListener('mousemove', (event) => {
 
         draggingSensor.x = mouseX - offsetX;
         draggingSensor.y = mouseY - offsetY;
+        indexSensor(draggingSensor);
 
         redrawCanvas();
     }
@@ -225,6 +284,7 @@ document.addEventListener('keydown', (event) => {
             body: JSON.stringify(selectedSensor)
         }).then(() => {
             sensors = sensors.filter(sensor => sensor !== selectedSensor); // Remove from local array
+            removeSensorFromIndex(selectedSensor);
             selectedSensor = null; // Clear selection
             redrawCanvas();
         });
@@ -237,6 +297,7 @@ function loadSensors() {
         .then(response => response.json())
         .then(data => {
             sensors = data; // Load sensors into the local array
+            rebuildSensorIndex();
             redrawCanvas(); // Redraw the canvas with the loaded sensors
         });
 }
@@ -268,6 +329,7 @@ function addSensor() {
         body: JSON.stringify(newSensor)
     }).then(() => {
         sensors.push(newSensor); // Add sensor to local array
+        indexSensor(newSensor);
         redrawCanvas();          // Redraw canvas with the new sensor
     });
 }
@@ -333,7 +395,7 @@ function drawFieldOfView(sensor) {
 
 // Function to handle double-click on sensor to open configuration popup
 canvas.addEventListener('dblclick', function(event) {
-    const clickedSensor = sensors.find(sensor => isSensorClicked(sensor, event.offsetX, event.offsetY));
+    const clickedSensor = sensorAt(event.offsetX, event.offsetY);
     if (clickedSensor) {
         openSensorConfig(clickedSensor);
     }
@@ -389,13 +451,14 @@ function openSensorConfig(sensor) {
 // Function to handle dragging sensors
 let draggingSensor = null;
 canvas.addEventListener('mousedown', function(event) {
-    draggingSensor = sensors.find(sensor => isSensorClicked(sensor, event.offsetX, event.offsetY));
+    draggingSensor = sensorAt(event.offsetX, event.offsetY);
 });
 
 canvas.addEventListener('mousemove', function(event) {
     if (draggingSensor) {
         draggingSensor.x = event.offsetX - sensorSize / 2;
         draggingSensor.y = event.offsetY - sensorSize / 2;
+        indexSensor(draggingSensor);
         redrawCanvas();
     }
 });
@@ -0,0 +1,90 @@
+import time
+
+from missions import CANCELLED, FLYING
+from simulation import Drone, Scene, Sensor, Simulator
+
+
+class FakeRoot:
+    def __init__(self):
+        # Stands in for the Tk root: after() queues the call and run() works through the queue
+        self.calls = []
+
+    def after(self, ms, callback, *args):
+        self.calls.append((callback, args))
+
+    def run(self, timeout=10):
+        # True once nothing is scheduled any more, i.e. the runner stopped polling
+        deadline = time.monotonic() + timeout
+        while self.calls and time.monotonic() < deadline:
+            callback, args = self.calls.pop(0)
+            time.sleep(0.001)
+            callback(*args)
+        return not self.calls
+
+
+def mission_simulator(root=None):
+    scene = Scene()
+    for index in range(3):
+        scene.add_sensor(Sensor(100 * index, 100, name=f"s{index}"))
+        scene.set_gps_points(f"s{index}", [(100 + 50 * index, 200), (400, 300)])
+    scene.set_drone(Drone(5, 5))
+    simulator = Simulator(scene)
+    if root is not None:
+        simulator.missions.attach(root)
+    return simulator
+
+
+def test_without_a_root_missions_fly_at_once():
+    simulator = mission_simulator()
+    mission = simulator.missions.submit(["s0", "s1"])
+    assert mission.state == FLYING
+    assert simulator.missions.current is mission
+
+
+def test_cancel_drops_planned_and_queued_missions():
+    root = FakeRoot()
+    simulator = mission_simulator(root)
+    runner = simulator.missions
+    first, second = runner.submit(["s0"]), runner.submit(["s1"])
+    runner.cancel()
+    assert root.run()
+    assert first.state == second.state == CANCELLED
+    assert runner.current is None and not runner.pending
+    assert simulator.scene.drone.idle
+
+
+def test_drone_deleted_while_planning_cancels_and_stops_polling():
+    root = FakeRoot()
+    simulator = mission_simulator(root)
+    runner = simulator.missions
+    first, second = runner.submit(["s0"]), runner.submit(["s1"])
+    simulator.scene.set_drone(None)
+    assert root.run()
+    assert first.state == second.state == CANCELLED
+    assert runner.current is None and not runner.pending
+
+
+def test_drone_replaced_while_planning_plans_again():
+    root = FakeRoot()
+    simulator = mission_simulator(root)
+    runner = simulator.missions
+    first = runner.submit(["s0", "s1"])
+    simulator.scene.set_drone(Drone(600, 600))
+    assert root.run()
+    assert first.state == CANCELLED
+    assert runner.current.state == FLYING
+    assert runner.current.drone is simulator.scene.drone
+    assert runner.current.sensor_names == ["s0", "s1"]
+
+
+def test_higher_priority_preempts_and_requeues():
+    root = FakeRoot()
+    simulator = mission_simulator(root)
+    runner = simulator.missions
+    low = runner.submit(["s0"], priority=0)
+    high = runner.submit(["s1"], priority=5)
+    assert low.state == CANCELLED
+    assert runner.current is high
+    assert [mission.sensor_names for mission in runner.pending] == [["s0"]]
+    assert root.run()
+    assert high.state == FLYING
@@ -0,0 +1,107 @@
+import numpy as np
+
+import persistence
+from persistence import load_scene, save_scene
+from sensortable import MIN_CAPACITY, SensorTable
+from simulation import Scene, Sensor
+
+
+def make_sensors(count):
+    sensors = []
+    for index in range(count):
+        sensor = Sensor(index * 3.0, index * 2.0, angle=index % 360, detection_angle=90, is_enabled=index % 3 != 0,
+                        name=f"sensor {index} ü")
+        sensor.detection_range = 1 + index % 7  # Meters
+        sensor.priority = index % 4
+        sensors.append(sensor)
+    return sensors
+
+
+def snapshot(sensor):
+    return (sensor.x, sensor.y, sensor.angle, sensor.detection_range, sensor.detection_angle,
+            bool(sensor.is_enabled), sensor.priority, sensor.name)
+
+
+def test_create_and_reopen(tmp_path):
+    path = str(tmp_path / "table")
+    sensors = make_sensors(MIN_CAPACITY + 10)  # Grows past the first allocation
+    table = SensorTable.create(path, sensors[:20])
+    table.extend(sensors[20:])
+    table.close()
+
+    reopened = SensorTable(path)
+    assert len(reopened) == len(sensors)
+    assert [snapshot(reopened.build(row)) for row in range(len(reopened))] == [snapshot(s) for s in sensors]
+
+
+def test_in_memory_table_matches_columns():
+    sensors = make_sensors(MIN_CAPACITY * 2 + 1)
+    table = SensorTable.create(None, sensors[:5])
+    table.extend(sensors[5:])
+    assert table.path is None
+    assert table.all_names() == [s.name for s in sensors]
+    assert np.array_equal(table.column("x"), [s.x for s in sensors])
+    assert [snapshot(table.build(row)) for row in range(len(table))] == [snapshot(s) for s in sensors]
+
+
+def test_store_writes_back_edits_and_renames(tmp_path):
+    path = str(tmp_path / "table")
+    table = SensorTable.create(path, make_sensors(10))
+    sensor = table.sensor(4)
+    sensor.x, sensor.name = 123.5, "renamed"
+    table.store_all()
+    table.close()
+    reopened = SensorTable(path)
+    assert reopened.build(4).x == 123.5
+    assert reopened.name(4) == "renamed"
+    assert reopened.all_names()[5] == "sensor 5 ü"
+
+
+def test_remove_moves_the_last_row():
+    sensors = make_sensors(5)
+    table = SensorTable.create(None, sensors)
+    table.remove(sensors[1])
+    assert len(table) == 4
+    assert table.rows[sensors[4]] == 1
+    assert [table.name(row) for row in range(4)] == ["sensor 0 ü", "sensor 4 ü", "sensor 2 ü", "sensor 3 ü"]
+
+
+def test_materialise_only_builds_rows_in_the_rectangle():
+    table = SensorTable.from_columns(None, {"x": np.arange(10.0), "y": np.zeros(10), "angle": np.zeros(10),
+                                            "range": np.ones(10), "fov": np.full(10, 90.0),
+                                            "enabled": np.ones(10, dtype=bool), "priority": np.zeros(10, dtype=np.int32)},
+                                     [str(i) for i in range(10)])
+    sensors, added, dropped = table.materialise((2, -1, 4, 1))
+    assert sorted(s.name for s in sensors) == ["2", "3", "4"]
+    assert len(added) == 3 and not dropped
+    sensors, added, dropped = table.materialise((3, -1, 5, 1))
+    assert sorted(s.name for s in sensors) == ["3", "4", "5"]
+    assert [s.name for s in added] == ["5"] and [s.name for s in dropped] == ["2"]
+
+
+def test_scene_round_trips_through_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistence, "TABLE_MIN_SENSORS", 50)
+    for count in (10, 200):  # Sensor objects, then an in-memory table
+        scene = Scene(seed=7)
+        for sensor in make_sensors(count):
+            scene.add_sensor(sensor)
+        scene.walls.add_segment(0, 0, 100, 50)
+        expected = scene.to_dict()
+        for name in ("scene.npz", "scene.json"):
+            path = str(tmp_path / f"{count}-{name}")
+            save_scene(path, scene)
+            loaded, _ = load_scene(path)
+            assert (loaded.table is not None) == (count >= 50)
+            assert loaded.to_dict() == expected
+            save_scene(path + ".again.npz", loaded)
+            assert load_scene(path + ".again.npz")[0].to_dict() == expected
+
+
+def test_table_directory_loads_as_a_scene(tmp_path):
+    path = str(tmp_path / "table")
+    sensors = make_sensors(30)
+    SensorTable.create(path, sensors).close()
+    for given in (path, str(tmp_path / "table" / "table.json")):
+        scene, blueprint = load_scene(given)
+        assert blueprint is None
+        assert [snapshot(s) for s in scene.all_sensors()] == [snapshot(s) for s in sensors]
@@ -0,0 +1,55 @@
+import math
+
+from trajectories import WaypointPath
+
+
+class Walker:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def walk(path, walker, steps, dt=0.1):
+    positions = []
+    for step in range(steps):
+        path.advance(walker, step * dt, dt)
+        positions.append((walker.x, walker.y))
+    return positions
+
+
+def test_walks_to_the_end_and_stops():
+    path = WaypointPath([(100, 0), (100, 100)], speed=10)
+    walker = Walker(0, 0)
+    walk(path, walker, 100)
+    assert path.finished
+    assert (walker.x, walker.y) == (100, 100)
+
+
+def test_no_waypoints_is_finished():
+    path = WaypointPath([], loop=True)
+    walker = Walker(5, 5)
+    walk(path, walker, 3)
+    assert path.finished and (walker.x, walker.y) == (5, 5)
+
+
+def test_loop_on_the_intruders_own_position_does_not_hang():
+    path = WaypointPath([(5, 5)], loop=True)
+    walker = Walker(5, 5)
+    assert walk(path, walker, 3) == [(5, 5)] * 3
+
+
+def test_zero_length_lap_does_not_hang():
+    path = WaypointPath([(20, 0), (20, 0), (20, 0)], speed=100, loop=True)
+    walker = Walker(0, 0)
+    walk(path, walker, 10)
+    assert (walker.x, walker.y) == (20, 0)
+    assert path.lap_length == 0
+
+
+def test_two_point_loop_goes_back_and_forth():
+    # 1 m/s is 50 px/s, so a 100 px leg takes 2 s
+    path = WaypointPath([(100, 0), (0, 0)], speed=1, loop=True)
+    walker = Walker(0, 0)
+    xs = [x for x, _ in walk(path, walker, 80)]  # xs[i] is where the walker is after (i + 1) / 10 s
+    assert math.isclose(xs[19], 100) and math.isclose(xs[39], 0, abs_tol=1e-9)
+    assert math.isclose(xs[59], 100) and math.isclose(xs[79], 0, abs_tol=1e-9)
+    assert not path.finished
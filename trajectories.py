@@ -0,0 +1,121 @@
+import bisect
+import math
+import random
+
+import numpy as np
+
+from detection import PIXELS_PER_METER
+
+
+WALKING_SPEED = 1.4  # Meters per second
+
+
+class SpeedProfile:
+    def __init__(self, keyframes):
+        # Piecewise-linear speed in m/s over simulated time, from (time, speed) keyframes;
+        # a plain number means constant speed
+        if isinstance(keyframes, (int, float)):
+            keyframes = [(0.0, float(keyframes))]
+        self.times = [t for t, _ in keyframes]
+        self.speeds = [s for _, s in keyframes]
+
+    def speed_at(self, time):
+        index = bisect.bisect_right(self.times, time)
+        if index == 0:
+            return self.speeds[0]
+        if index == len(self.times):
+            return self.speeds[-1]
+        t0, t1 = self.times[index - 1], self.times[index]
+        s0, s1 = self.speeds[index - 1], self.speeds[index]
+        return s0 + (s1 - s0) * (time - t0) / (t1 - t0)
+
+
+class WaypointPath:
+    def __init__(self, waypoints, speed=WALKING_SPEED, loop=False):
+        # Walks through the (x, y) pixel waypoints in order
+        self.waypoints = list(waypoints)
+        self.speed = speed if isinstance(speed, SpeedProfile) else SpeedProfile(speed)
+        self.loop = loop
+        self.target = 0  # Index of the waypoint being walked to
+        self.finished = not self.waypoints
+        # Length of one lap of a looping path; a zero-length lap is never walked again
+        closed = self.waypoints[1:] + self.waypoints[:1]
+        self.lap_length = sum(math.hypot(bx - ax, by - ay) for (ax, ay), (bx, by) in zip(self.waypoints, closed))
+
+    def advance(self, intruder, time, dt):
+        distance = self.speed.speed_at(time) * PIXELS_PER_METER * dt
+        x, y = intruder.x, intruder.y
+        while distance > 0 and not self.finished:
+            target_x, target_y = self.waypoints[self.target]
+            remaining = math.hypot(target_x - x, target_y - y)
+            if remaining > distance:
+                x += (target_x - x) * distance / remaining
+                y += (target_y - y) * distance / remaining
+                break
+            x, y = target_x, target_y
+            distance -= remaining
+            self.target += 1
+            if self.target == len(self.waypoints):
+                if self.loop:
+                    self.target = 0
+                    if self.lap_length == 0:
+                        break  # Every waypoint is where the intruder stands
+                else:
+                    self.finished = True
+        intruder.x, intruder.y = x, y
+
+
+class RandomWalk:
+    def __init__(self, speed=WALKING_SPEED, turn_rate=math.pi, bounds=(0, 0, 1980, 1080), rng=None):
+        # Heading drifts randomly (radians per sqrt second); bounces off the bounds
+        self.speed = speed if isinstance(speed, SpeedProfile) else SpeedProfile(speed)
+        self.turn_rate = turn_rate
+        self.bounds = bounds
+        self.rng = rng if rng is not None else random.Random()
+        self.heading = self.rng.uniform(0, 2 * math.pi)
+
+    def advance(self, intruder, time, dt):
+        self.heading += self.rng.gauss(0, self.turn_rate * math.sqrt(dt))
+        distance = self.speed.speed_at(time) * PIXELS_PER_METER * dt
+        x = intruder.x + distance * math.cos(self.heading)
+        y = intruder.y + distance * math.sin(self.heading)
+
+        x0, y0, x1, y1 = self.bounds
+        if not x0 <= x <= x1:
+            self.heading = math.pi - self.heading
+            x = min(max(x, x0), x1)
+        if not y0 <= y <= y1:
+            self.heading = -self.heading
+            y = min(max(y, y0), y1)
+        intruder.x, intruder.y = x, y
+
+
+class CrowdRandomWalk:
+    def __init__(self, speed=WALKING_SPEED, turn_rate=math.pi, bounds=(0, 0, 1980, 1080), seed=None):
+        # Vectorized random walk for every intruder in an IntruderSet, for large crowds
+        self.speed = speed if isinstance(speed, SpeedProfile) else SpeedProfile(speed)
+        self.turn_rate = turn_rate
+        self.bounds = bounds
+        self.rng = np.random.default_rng(seed)
+        self.headings = np.zeros(0)
+
+    def advance_all(self, intruders, time, dt):
+        count = len(intruders)
+        if len(self.headings) < count:
+            extra = self.rng.uniform(0, 2 * math.pi, count - len(self.headings))
+            self.headings = np.concatenate([self.headings, extra])
+        headings = self.headings[:count]
+        headings += self.rng.normal(0, self.turn_rate * math.sqrt(dt), count)
+
+        distance = self.speed.speed_at(time) * PIXELS_PER_METER * dt
+        xs, ys = intruders.x, intruders.y
+        xs += distance * np.cos(headings)
+        ys += distance * np.sin(headings)
+
+        x0, y0, x1, y1 = self.bounds
+        out_x = (xs < x0) | (xs > x1)
+        out_y = (ys < y0) | (ys > y1)
+        headings[out_x] = math.pi - headings[out_x]
+        headings[out_y] = -headings[out_y]
+        np.clip(xs, x0, x1, out=xs)
+        np.clip(ys, y0, y1, out=ys)
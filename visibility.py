@@ -0,0 +1,186 @@
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+from detection import PIXELS_PER_METER, SENSOR_OFFSET
+from geometry import circle_segments, fov_key, fov_polygon
+from walls import ray_segment_distance, segment_distance
+
+
+def ray_distance(piece, cx, cy, angle):
+    # Distance from (cx, cy) along the ray at angle to the line through a wall piece
+    _, _, x0, y0, dx, dy = piece
+    ray_x, ray_y = math.cos(angle), math.sin(angle)
+    denominator = ray_x * dy - ray_y * dx
+    if denominator == 0:
+        return math.inf
+    return max(0.0, ((x0 - cx) * dy - (y0 - cy) * dx) / denominator)
+
+
+def circle_crossings(cx, cy, radius, x0, y0, dx, dy):
+    # Angles at which the segment crosses the range circle
+    fx, fy = x0 - cx, y0 - cy
+    a = dx * dx + dy * dy
+    b = 2 * (fx * dx + fy * dy)
+    c = fx * fx + fy * fy - radius * radius
+    discriminant = b * b - 4 * a * c
+    if a == 0 or discriminant < 0:
+        return []
+    root = math.sqrt(discriminant)
+    angles = []
+    for u in ((-b - root) / (2 * a), (-b + root) / (2 * a)):
+        if 0 <= u <= 1:
+            angles.append(math.atan2(fy + u * dy, fx + u * dx))
+    return angles
+
+
+def split_crossings(x0, y0, x1, y1):
+    # Cut the segments where they cross each other, so the pieces only ever meet at their ends
+    t = ray_segment_distance(x0[:, None], y0[:, None], x1[:, None], y1[:, None],
+                             x0[None, :], y0[None, :], x1[None, :], y1[None, :])
+    cut = (t > 0) & (t < 1)
+    if not cut.any():
+        return x0, y0, x1, y1
+    pieces = []
+    for index, row in enumerate(t.tolist()):
+        cuts = sorted({0.0, 1.0, *(value for value, crossed in zip(row, cut[index].tolist()) if crossed)})
+        dx, dy = x1[index] - x0[index], y1[index] - y0[index]
+        for start, end in zip(cuts, cuts[1:]):
+            pieces.append((x0[index] + start * dx, y0[index] + start * dy, x0[index] + end * dx, y0[index] + end * dy))
+    x0, y0, x1, y1 = np.array(pieces).T
+    return x0, y0, x1, y1
+
+
+def visibility_polygon(cx, cy, radius, start_angle, end_angle, walls):
+    # The part of the wedge (cx, cy, radius, start_angle..end_angle) visible from its center,
+    # as a flat [x0, y0, x1, y1, ...] list like wedge_polygon. Angular sweep: walls in range
+    # become angular intervals, the event angles are sorted once, and the walls under the
+    # sweep ray are kept ordered nearest first so the visible one is always active[0].
+    # Crossing walls are split where they cross first, since the ordering assumes no crossings.
+    span = end_angle - start_angle
+    full_turn = 2 * math.pi
+    pieces = []  # (lo, hi, x0, y0, dx, dy), lo/hi relative to start_angle
+    events = {0.0, span}
+
+    ids = walls.segments_in_rect(cx - radius, cy - radius, cx + radius, cy + radius)
+    if ids:
+        ids = np.fromiter(ids, dtype=np.intp, count=len(ids))
+        x0, y0, x1, y1 = walls.x0[ids], walls.y0[ids], walls.x1[ids], walls.y1[ids]
+        near = segment_distance(cx, cy, x0, y0, x1, y1) < radius
+        x0, y0, x1, y1 = split_crossings(x0[near], y0[near], x1[near], y1[near])
+        a0 = (np.arctan2(y0 - cy, x0 - cx) - start_angle) % full_turn
+        a1 = (np.arctan2(y1 - cy, x1 - cx) - start_angle) % full_turn
+        for sx, sy, ex, ey, angle0, angle1 in zip(x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist(),
+                                                  a0.tolist(), a1.tolist()):
+            lo, hi = min(angle0, angle1), max(angle0, angle1)
+            if lo == hi:
+                continue  # Edge-on to the center
+            # A segment subtends less than half a turn, so a wider interval wraps past start_angle
+            intervals = [(hi, full_turn), (0.0, lo)] if hi - lo > math.pi else [(lo, hi)]
+            for lo, hi in intervals:
+                lo, hi = max(lo, 0.0), min(hi, span)
+                if lo < hi:
+                    pieces.append((lo, hi, sx, sy, ex - sx, ey - sy))
+                    events.update((lo, hi))
+            for angle in circle_crossings(cx, cy, radius, sx, sy, ex - sx, ey - sy):
+                events.add((angle - start_angle) % full_turn)
+
+    # Arc vertices at the same unit-circle angles wedge_polygon uses
+    step = full_turn / circle_segments(radius)
+    first = math.floor(start_angle / step) + 1
+    last = math.ceil(end_angle / step) - 1
+    events.update(k * step - start_angle for k in range(first, last + 1))
+    events = sorted(angle for angle in events if 0 <= angle <= span)
+
+    def distance(piece, angle):
+        return ray_distance(piece, cx, cy, start_angle + angle)
+
+    def nearer(a, b, angle):
+        # Pieces don't cross, so comparing at any angle both cover is enough
+        middle = (angle + min(a[1], b[1])) / 2
+        return distance(a, middle) < distance(b, middle)
+
+    starts = sorted(pieces, key=lambda piece: piece[0])
+    ends = sorted(pieces, key=lambda piece: piece[1])
+    start_keys = [piece[0] for piece in starts]
+    next_start = next_end = 0
+    active = []
+    points = [cx, cy]
+
+    def emit(angle, length):
+        points.append(cx + length * math.cos(start_angle + angle))
+        points.append(cy + length * math.sin(start_angle + angle))
+
+    for angle in events:
+        before = min(radius, distance(active[0], angle)) if active else radius
+
+        while next_end < len(ends) and ends[next_end][1] <= angle:
+            active.remove(ends[next_end])
+            next_end += 1
+        stop = bisect_right(start_keys, angle)
+        while next_start < stop:
+            piece = starts[next_start]
+            next_start += 1
+            lo, hi = 0, len(active)
+            while lo < hi:
+                middle = (lo + hi) // 2
+                if nearer(active[middle], piece, angle):
+                    lo = middle + 1
+                else:
+                    hi = middle
+            active.insert(lo, piece)
+        after = min(radius, distance(active[0], angle)) if active else radius
+
+        if angle > 0:
+            emit(angle, before)
+        if angle < span and (angle == 0 or abs(after - before) > 1e-9):
+            emit(angle, after)
+    return points
+
+
+class VisibilityCache:
+    def __init__(self):
+        # Sensor FOV polygons clipped by the walls, cached per sensor. Sensors are only
+        # recomputed when they move, or when an edited wall lies within their range.
+        self.entries = {}  # Sensor -> (fov_key, polygon)
+        self.walls = None
+
+    def attach(self, walls):
+        if self.walls is not None:
+            self.walls.listeners.remove(self.wall_changed)
+        self.walls = walls
+        self.entries.clear()
+        if walls is not None:
+            walls.listeners.append(self.wall_changed)
+
+    def polygon(self, sensor, walls=None):
+        if walls is not self.walls:
+            self.attach(walls)
+        key = fov_key(sensor)
+        entry = self.entries.get(sensor)
+        if entry is None or entry[0] != key:
+            entry = self.entries[sensor] = (key, self.compute(sensor))
+        return entry[1]
+
+    def compute(self, sensor):
+        if self.walls is None or not len(self.walls):
+            return fov_polygon(sensor)
+        angle_rad = math.radians(sensor.angle)
+        half_angle = math.radians(sensor.detection_angle / 2)
+        return visibility_polygon(sensor.x + SENSOR_OFFSET[0], sensor.y + SENSOR_OFFSET[1],
+                                  sensor.detection_range * PIXELS_PER_METER,
+                                  angle_rad - half_angle, angle_rad + half_angle, self.walls)
+
+    def wall_changed(self, segment_id, segment, added):
+        # Drop only the sensors whose range circle reaches the edited wall
+        for sensor, (key, _) in list(self.entries.items()):
+            x, y, _, detection_range, _ = key
+            if segment_distance(x + SENSOR_OFFSET[0], y + SENSOR_OFFSET[1], *segment) <= detection_range * PIXELS_PER_METER:
+                del self.entries[sensor]
+
+    def discard(self, sensor):
+        self.entries.pop(sensor, None)
+
+    def clear(self):
+        self.entries.clear()
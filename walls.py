@@ -0,0 +1,269 @@
+import math
+
+import numpy as np
+
+
+CELL_KEY = 1 << 32  # Grid cell (col, row) -> col * CELL_KEY + row in the sorted cell index
+SIGHT_CHUNK = 4096  # Point pairs tested at a time by line_of_sight
+
+
+class WallSet:
+    def __init__(self, cell_size=100, capacity=16):
+        # Wall segments in flat arrays indexed by segment id (grown by doubling, only the first
+        # count slots are used), plus a uniform grid of the cells each segment passes through
+        # so rays are only tested against nearby walls
+        self.cell_size = cell_size
+        self.count = 0
+        self.x0 = np.zeros(capacity)
+        self.y0 = np.zeros(capacity)
+        self.x1 = np.zeros(capacity)
+        self.y1 = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.cells = {}  # (col, row) -> set of segment ids
+        self.segment_cells = {}  # segment id -> list of cells
+        self.version = 0  # Bumped on every edit, for caches keyed on the wall layout
+        self.listeners = []  # Called with (segment id, (x0, y0, x1, y1), added) on every edit
+        self.index = None  # (version, cell keys, segment ids) from cell_index()
+
+    def __len__(self):
+        return len(self.segment_cells)
+
+    def segment(self, segment_id):
+        return (self.x0[segment_id].item(), self.y0[segment_id].item(),
+                self.x1[segment_id].item(), self.y1[segment_id].item())
+
+    def segments(self):
+        # (id, (x0, y0, x1, y1)) of every wall
+        return [(segment_id, self.segment(segment_id)) for segment_id in self.segment_cells]
+
+    def copy(self):
+        # Independent copy of the layout without the listeners, e.g. for a worker thread
+        walls = WallSet(self.cell_size)
+        walls.count = self.count
+        walls.x0, walls.y0, walls.x1, walls.y1 = self.x0.copy(), self.y0.copy(), self.x1.copy(), self.y1.copy()
+        walls.alive = self.alive.copy()
+        walls.cells = {cell: set(ids) for cell, ids in self.cells.items()}
+        walls.segment_cells = dict(self.segment_cells)
+        walls.version = self.version
+        return walls
+
+    def reserve(self, count):
+        if count > len(self.x0):
+            capacity = max(count, 2 * len(self.x0))
+            self.x0 = np.resize(self.x0, capacity)
+            self.y0 = np.resize(self.y0, capacity)
+            self.x1 = np.resize(self.x1, capacity)
+            self.y1 = np.resize(self.y1, capacity)
+            self.alive = np.resize(self.alive, capacity)
+
+    def add_segment(self, x0, y0, x1, y1):
+        segment_id = self.count
+        self.reserve(segment_id + 1)
+        self.count += 1
+        self.x0[segment_id] = x0
+        self.y0[segment_id] = y0
+        self.x1[segment_id] = x1
+        self.y1[segment_id] = y1
+        self.alive[segment_id] = True
+
+        cells = self.traverse(x0, y0, x1, y1)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(segment_id)
+        self.segment_cells[segment_id] = cells
+        self.changed(segment_id, True)
+        return segment_id
+
+    def add_polyline(self, points):
+        # Consecutive points of a polyline, like DrawingApp.walls
+        return [self.add_segment(*p, *q) for p, q in zip(points, points[1:])]
+
+    def remove_segment(self, segment_id):
+        for cell in self.segment_cells.pop(segment_id):
+            bucket = self.cells[cell]
+            bucket.discard(segment_id)
+            if not bucket:
+                del self.cells[cell]
+        self.alive[segment_id] = False
+        self.changed(segment_id, False)
+
+    def clear(self):
+        for segment_id in list(self.segment_cells):
+            self.remove_segment(segment_id)
+
+    def changed(self, segment_id, added):
+        self.version += 1
+        for listener in self.listeners:
+            listener(segment_id, self.segment(segment_id), added)
+
+    def traverse(self, x0, y0, x1, y1):
+        # Grid cells crossed by the segment (Amanatides-Woo walk). Where it passes exactly
+        # through a grid corner, the cell beside the corner it doesn't step into is included
+        # too, since the corner point touches it.
+        size = self.cell_size
+        col, row = math.floor(x0 / size), math.floor(y0 / size)
+        end_col, end_row = math.floor(x1 / size), math.floor(y1 / size)
+        cells = [(col, row)]
+        dx, dy = x1 - x0, y1 - y0
+        step_col = 1 if dx > 0 else -1
+        step_row = 1 if dy > 0 else -1
+        t_delta_x = abs(size / dx) if dx else math.inf
+        t_delta_y = abs(size / dy) if dy else math.inf
+        t_max_x = ((col + (step_col > 0)) * size - x0) / dx if dx else math.inf
+        t_max_y = ((row + (step_row > 0)) * size - y0) / dy if dy else math.inf
+        while (col, row) != (end_col, end_row):
+            if t_max_x < t_max_y:
+                if t_max_x > 1:
+                    break
+                col += step_col
+                t_max_x += t_delta_x
+            else:
+                if t_max_y > 1:
+                    break
+                if t_max_x == t_max_y:
+                    cells.append((col + step_col, row))
+                row += step_row
+                t_max_y += t_delta_y
+            cells.append((col, row))
+        return cells
+
+    def segments_in_rect(self, x0, y0, x1, y1):
+        # Ids of the walls in the grid cells overlapping the rectangle
+        size = self.cell_size
+        found = set()
+        for col in range(math.floor(x0 / size), math.floor(x1 / size) + 1):
+            for row in range(math.floor(y0 / size), math.floor(y1 / size) + 1):
+                bucket = self.cells.get((col, row))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def cell_index(self):
+        # The grid as flat arrays for vectorised lookups, rebuilt after edits: sorted cell keys
+        # with one entry per (cell, segment id)
+        if self.index is None or self.index[0] != self.version:
+            keys = [col * CELL_KEY + row for (col, row), bucket in self.cells.items() for _ in bucket]
+            ids = [segment_id for bucket in self.cells.values() for segment_id in bucket]
+            keys = np.array(keys, dtype=np.int64)
+            ids = np.array(ids, dtype=np.intp)
+            order = np.argsort(keys, kind="stable")
+            self.index = (self.version, keys[order], ids[order])
+        return self.index[1], self.index[2]
+
+    def candidate_pairs(self, ax, ay, bx, by):
+        # (pair index, segment id) of every wall in a grid cell crossed by each pair's segment
+        # a-b; a wall may be listed more than once for a pair. The cells are the ones
+        # traverse() walks, found for all pairs at once from the grid lines they cross.
+        keys, ids = self.cell_index()
+        size = self.cell_size
+        count = len(ax)
+        col0, row0 = np.floor(ax / size).astype(np.int64), np.floor(ay / size).astype(np.int64)
+        col_steps = np.floor(bx / size).astype(np.int64) - col0
+        row_steps = np.floor(by / size).astype(np.int64) - row0
+        step_col, step_row = np.sign(col_steps), np.sign(row_steps)
+
+        # Every grid line crossed, as (pair, t along a-b, is a row line), in walking order;
+        # like traverse(), a row line is taken first where both are crossed at once
+        crossings = []
+        for steps, step, start, a, b in ((col_steps, step_col, col0, ax, bx), (row_steps, step_row, row0, ay, by)):
+            lines = np.abs(steps)
+            pair = np.repeat(np.arange(count), lines)
+            k = np.arange(len(pair)) - np.repeat(np.cumsum(lines) - lines, lines)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = ((start[pair] + step[pair] * k + (step[pair] > 0)) * size - a[pair]) / (b - a)[pair]
+            crossings.append((pair, t))
+        (col_pair, col_t), (row_pair, row_t) = crossings
+        pair = np.concatenate((col_pair, row_pair))
+        is_row = np.r_[np.zeros(len(col_pair), dtype=bool), np.ones(len(row_pair), dtype=bool)]
+        t = np.concatenate((col_t, row_t))
+        order = np.lexsort((~is_row, t, pair))
+        pair, is_row, t = pair[order], is_row[order], t[order]
+
+        # The cell after each crossing: the start cell plus the steps taken so far
+        lines = np.abs(col_steps) + np.abs(row_steps)
+        first = np.cumsum(lines) - lines
+        cols = np.cumsum(np.where(is_row, 0, step_col[pair]))
+        rows = np.cumsum(np.where(is_row, step_row[pair], 0))
+        cols -= np.repeat(np.r_[0, cols][first], lines)
+        rows -= np.repeat(np.r_[0, rows][first], lines)
+        cols += col0[pair]
+        rows += row0[pair]
+
+        # Through a grid corner (a row line then a column line at the same t), the cell
+        # beside the corner, as in traverse()
+        corner = np.flatnonzero((pair[:-1] == pair[1:]) & (t[:-1] == t[1:]) & is_row[:-1] & ~is_row[1:])
+        beside = pair[corner]
+        cols = np.concatenate((col0, cols, cols[corner + 1]))
+        rows = np.concatenate((row0, rows, rows[corner] - step_row[beside]))
+        pair = np.concatenate((np.arange(count), pair, beside))
+        cell_keys = cols * CELL_KEY + rows
+
+        # Every (pair, wall) in those cells
+        lo = np.searchsorted(keys, cell_keys, side="left")
+        wall_counts = np.searchsorted(keys, cell_keys, side="right") - lo
+        pair = np.repeat(pair, wall_counts)
+        entry = np.repeat(lo - np.cumsum(wall_counts) + wall_counts, wall_counts) + np.arange(len(pair))
+        return pair, ids[entry]
+
+    def line_of_sight(self, ax, ay, bx, by):
+        # Vectorized over pairs of points: True where nothing blocks the line between them.
+        # All the (pair, wall) candidates of a chunk of pairs are tested in one
+        # segments_cross call.
+        ax, ay, bx, by = (np.asarray(v, dtype=float) for v in (ax, ay, bx, by))
+        clear = np.ones(len(ax), dtype=bool)
+        if not self.segment_cells:
+            return clear
+        for start in range(0, len(ax), SIGHT_CHUNK):
+            part = slice(start, start + SIGHT_CHUNK)
+            pax, pay, pbx, pby = ax[part], ay[part], bx[part], by[part]
+            pair, wall = self.candidate_pairs(pax, pay, pbx, pby)
+            hit = segments_cross(pax[pair], pay[pair], pbx[pair], pby[pair],
+                                 self.x0[wall], self.y0[wall], self.x1[wall], self.y1[wall])
+            clear[start + pair[hit]] = False
+        return clear
+
+    def ray_hits(self, cx, cy, xs, ys):
+        # For rays from (cx, cy) to each (xs[i], ys[i]), the fraction of the way along the
+        # ray where it first hits a wall, or inf if none does; a wall touching the end point
+        # counts as a hit, as in segments_cross. Rays go SIGHT_CHUNK
+        # at a time against the walls in their own grid cells, so memory stays flat however
+        # many walls there are.
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        t = np.full(len(xs), np.inf)
+        if not self.segment_cells or not len(xs):
+            return t
+        for start in range(0, len(xs), SIGHT_CHUNK):
+            part = slice(start, start + SIGHT_CHUNK)
+            px, py = xs[part], ys[part]
+            pcx, pcy = np.full(len(px), float(cx)), np.full(len(px), float(cy))
+            pair, wall = self.candidate_pairs(pcx, pcy, px, py)
+            hits = ray_segment_distance(cx, cy, px[pair], py[pair],
+                                        self.x0[wall], self.y0[wall], self.x1[wall], self.y1[wall])
+            np.minimum.at(t, start + pair, hits)
+        return t
+
+def segments_cross(ax, ay, bx, by, cx, cy, dx, dy):
+    # Segment a-b against segments c-d; touching counts as crossing, parallel doesn't
+    return np.isfinite(ray_segment_distance(ax, ay, bx, by, cx, cy, dx, dy))
+
+
+def segment_distance(px, py, x0, y0, x1, y1):
+    # Shortest distance from point p to segments x0,y0-x1,y1 (broadcasts)
+    dx, dy = x1 - x0, y1 - y0
+    length = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = np.clip(((px - x0) * dx + (py - y0) * dy) / length, 0, 1)
+    u = np.where(length > 0, u, 0)
+    return np.hypot(x0 + u * dx - px, y0 + u * dy - py)
+
+
+def ray_segment_distance(ax, ay, bx, by, cx, cy, dx, dy):
+    # Fraction along a-b where it crosses c-d, or inf where it doesn't (broadcasts)
+    rx, ry = bx - ax, by - ay
+    sx, sy = dx - cx, dy - cy
+    denominator = rx * sy - ry * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = ((cx - ax) * sy - (cy - ay) * sx) / denominator
+        u = ((cx - ax) * ry - (cy - ay) * rx) / denominator
+    hit = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return np.where(hit, t, np.inf)